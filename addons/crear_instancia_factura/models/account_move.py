@@ -53,6 +53,27 @@ class AccountMove(models.Model):
         if not self.partner_id:
             raise UserError(_('La factura debe tener un cliente asignado.'))
         
+        # Si el plan facturado tiene plantilla con pool precalentado
+        # (microsaas_subscription + micro_saas_mejora), se asigna una
+        # instancia ya iniciada y se abre directamente.
+        plantilla = self._get_plantilla_instancia()
+        Instancia = self.env['odoo.docker.instance']
+        if plantilla and hasattr(Instancia, '_claim_pool_instance'):
+            instancia = Instancia.sudo()._claim_pool_instance(plantilla, {
+                'name': f'Instancia - {self.partner_id.name} - {self.name}',
+                'partner_id': self.partner_id.id,
+                'factura_id': self.id,
+            })
+            if instancia:
+                return {
+                    'type': 'ir.actions.act_window',
+                    'name': _('Instancia - %s') % self.partner_id.name,
+                    'res_model': 'odoo.docker.instance',
+                    'res_id': instancia.id,
+                    'view_mode': 'form',
+                    'target': 'current',
+                }
+
         # Redirige al formulario de creación de instancia Docker.
         # Usa el contexto 'default_*' para precargar campos automáticamente:
         # - default_partner_id: asigna el cliente de la factura
@@ -67,8 +88,23 @@ class AccountMove(models.Model):
             'context': {
                 'default_partner_id': self.partner_id.id,
                 'default_factura_id': self.id,
-                'default_name': f'Instancia - {self.partner_id.name} - {self.name}',            },
+                'default_name': f'Instancia - {self.partner_id.name} - {self.name}',
+                'default_template_id': plantilla.id,
+            },
         }
+
+    def _get_plantilla_instancia(self):
+        """
+        Plantilla Docker del plan facturado (campo plantilla_instancia_id de
+        microsaas_subscription), o un recordset vacío si el módulo no está
+        instalado o el producto no la tiene.
+        """
+        self.ensure_one()
+        for linea in self.invoice_line_ids:
+            producto = linea.product_id.product_tmpl_id
+            if 'plantilla_instancia_id' in producto._fields and producto.plantilla_instancia_id:
+                return producto.plantilla_instancia_id
+        return self.env['docker.compose.template']
     
     def action_ver_instancias(self):
         """
@@ -10,6 +10,7 @@
         - Enviar al cliente su URL de acceso, usuario y contraseña inicial
         - Registrar si el correo ya fue enviado para evitar duplicados
         - Plantilla de correo HTML profesional y personalizable
+        - Envío automático del correo de bienvenida cuando la instancia responde (estado "Ready")
         - Envío automático de aviso de vencimiento de suscripción
         - Vista de historial de correos de aviso enviados
     """,
@@ -23,6 +24,7 @@
         "micro_saas",
         "crear_instancia_factura",
         "microsaas_subscription",  # ← agregar esto
+        "micro_saas_mejora",  # estado 'ready' y hook _on_instance_ready
     ],
 
     "data": [
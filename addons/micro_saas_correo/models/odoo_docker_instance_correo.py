@@ -27,6 +27,27 @@ class OdooDockerInstanceCorreo(models.Model):
         help='Fecha y hora en que se envió el correo de bienvenida.',
     )
 
+    # ─────────────────────────────────────────────
+    # ENVÍO AUTOMÁTICO AL QUEDAR LISTA
+    # ─────────────────────────────────────────────
+    def _on_instance_ready(self):
+        """
+        Cuando la instancia responde por primera vez (estado 'ready'), envía
+        el correo de bienvenida si aún no se envió y el cliente tiene email.
+        Un fallo de envío queda en el log y no afecta a la instancia.
+        """
+        super()._on_instance_ready()
+        pendientes = self.filtered(
+            lambda i: not i.correo_bienvenida_enviado and i.partner_id.email and i.instance_url
+        )
+        for instance in pendientes:
+            try:
+                with self.env.cr.savepoint():
+                    instance.action_enviar_correo_bienvenida()
+                instance.add_to_log(f"[INFO] 📧 Correo de bienvenida enviado a {instance.partner_id.email}")
+            except Exception as e:
+                instance.add_to_log(f"[WARN] ⚠️ No se pudo enviar el correo de bienvenida: {str(e)}")
+
     # ─────────────────────────────────────────────
     # ACCIÓN: ENVIAR CORREO DE BIENVENIDA
     # ─────────────────────────────────────────────
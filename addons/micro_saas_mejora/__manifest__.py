@@ -21,6 +21,34 @@
         - Limpieza completa al eliminar instancia (cualquier estado)
         - Mensajes de log claros con emojis y diagnóstico automático
         - Mejor manejo de errores con soluciones sugeridas
+        - Start/Stop/Restart en cola de trabajos en segundo plano (no bloquea workers HTTP)
+        - Acciones masivas Iniciar/Detener/Reiniciar con concurrencia acotada y reporte por lote
+        - Clonado de repositorios en paralelo, con opción de clonado superficial
+        - Stop/Restart por el Docker Engine API (socket unix) con docker-compose como respaldo
+        - Stop por API conserva contenedores y red detenidos (inicio rápido); se borran al eliminar la instancia
+        - Conciliación periódica del estado de las instancias con Docker (un solo listado por ejecución)
+        - Caché local de mirrors bare por repositorio (checkouts sin red)
+        - Actualización incremental de repositorios al reiniciar (fetch solo si cambió el commit)
+        - Log de instancia estructurado (una fila por entrada, con nivel y fase) escrito en lote
+        - Salida de docker pull / docker-compose up / git en vivo en el log, con límites de tiempo y cancelación
+        - Asignación de puertos en la base (columnas indexadas, par HTTP/Longpolling atómico y sin carreras)
+        - Disponibilidad de puertos desde /proc/net/tcp y el API de Docker (sin un bind por puerto)
+        - Puertos reservados una sola vez (al crear o al primer inicio); el formulario solo muestra una vista previa
+        - Render de plantillas compilado y en una sola pasada, sin log por variable
+        - Plantillas compiladas en caché LRU por contenido (sin recompilar el mismo cuerpo)
+        - Índice persistido de placeholders por plantilla (solo se reanaliza el cuerpo que cambió)
+        - Render por lotes de docker-compose / odoo.conf / postgresql.conf para muchas instancias (render_files; en la instancia, el mismo contenido que escribe el inicio)
+        - Arranque mínimo: docker-compose.yml / odoo.conf se reescriben solo si cambian y sin down salvo tras un error
+        - Sonda de disponibilidad HTTP (/web/health, /web/login) con espera exponencial (el trabajo se reprograma entre intentos, sin ocupar un hilo de la cola): estados Starting / Ready y tiempo hasta lista
+        - La sonda llega a los puertos publicados por el gateway de la red Docker cuando el maestro corre en un contenedor; la conciliación la encola en vez de esperar respuestas HTTP
+        - Límites de CPU / memoria / procesos / workers del plan (microsaas_subscription) en docker-compose.yml y odoo.conf
+        - Modo cluster Postgres compartido por plantilla: rol y base por instancia creados/eliminados en su ciclo de vida; la base se borra después del commit y la contraseña solo va a los archivos generados
+        - Runtime Odoo compartido por plantilla para planes chicos: una base por instancia elegida por subdominio (dbfilter), sin contenedores ni puertos propios
+        - Proxy inverso nginx por nombre de host (micro_saas.proxy_*): red docker compartida, una ruta por instancia regenerada solo si cambia, sin puertos publicados
+        - Hibernación de instancias sin uso (micro_saas.hibernate_*): se detienen tras N minutos sin pedidos al proxy y despiertan con el siguiente pedido (nginx firma el aviso con un secreto compartido)
+        - Pool de instancias precalentadas por plantilla: la factura o la suscripción toma una ya iniciada (con su base creada), le da un subdominio con el nombre del cliente y la reinicia con los límites del plan antes del correo de bienvenida; un cron repone el pool y la carpeta de datos no cambia al renombrar
+        - Base modelo por plantilla en el cluster compartido: las bases nuevas se copian con CREATE DATABASE ... TEMPLATE en vez de correr odoo -i; se reconstruye al cambiar imagen, repositorios o módulos
+        - Cola de trabajos, lotes, runtimes compartidos y bases modelo: solo lectura para usuarios internos, gestión para administradores
     """,
     "author": "Marco-Adolfo-Ribentek",
     "license": "LGPL-3",
@@ -28,11 +56,24 @@
     "depends": ["base", "micro_saas"],
     "data": [
         "security/ir.model.access.csv",
+        "data/cron.xml",
+        "data/docker_compose_template_shared.xml",
         "views/prueba.xml",
         "views/wizard_puertos_disponibles.xml",
         "views/odoo_docker_instance_mejora.xml",
         "views/docker_instance_views.xml",
+        "views/instance_job_views.xml",
+        "views/repository_repo_views.xml",
+        "views/instance_log_views.xml",
+        "views/docker_compose_template_views.xml",
+        "views/shared_runtime_views.xml",
+        "views/golden_snapshot_views.xml",
     ],
+    "assets": {
+        "web.assets_backend": [
+            "micro_saas_mejora/static/src/js/instance_log_service.js",
+        ],
+    },
     "installable": True,
     "application": False,
     "auto_install": True,
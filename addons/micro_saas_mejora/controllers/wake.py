@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import hmac
+import html
+
+from odoo import http
+from odoo.http import request
+
+from ..tools import proxy as proxy_tools
+
+# Segundos entre recargas de la página mientras la instancia arranca.
+_REFRESH_SECONDS = 5
+
+_PAGE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8"/>
+%(refresh)s<meta name="viewport" content="width=device-width, initial-scale=1"/>
+<title>%(title)s</title>
+<style>
+body { font-family: sans-serif; background: #f7f7f9; color: #333; display: flex;
+       align-items: center; justify-content: center; height: 100vh; margin: 0; }
+div { text-align: center; max-width: 32em; padding: 2em; }
+h1 { font-size: 1.5em; }
+</style>
+</head>
+<body><div><h1>%(title)s</h1><p>%(message)s</p></div></body>
+</html>
+"""
+
+
+class MicroSaasWake(http.Controller):
+    """
+    Página que muestra el proxy inverso cuando la instancia de un host no
+    responde. Si la instancia está hibernada encola su inicio; la página
+    se recarga sola hasta que la ruta vuelve a llegar a Odoo. Solo se
+    atienden pedidos que traen el secreto que nginx agrega a la ruta: sin
+    él cualquiera podría despertar instancias eligiendo el host.
+    """
+
+    @http.route('/micro_saas/wake', type='http', auth='public', csrf=False, methods=['GET', 'POST', 'HEAD'])
+    def wake(self, **kwargs):
+        headers = request.httprequest.headers
+        host = headers.get(proxy_tools.WAKE_HOST_HEADER, '')
+        Instance = request.env['odoo.docker.instance'].sudo()
+        token = Instance._get_wake_token(create=False)
+        received = headers.get(proxy_tools.WAKE_TOKEN_HEADER, '')
+        if token and hmac.compare_digest(received.encode(), token.encode()):
+            instance = Instance._wake_by_host(host)
+        else:
+            instance = Instance.browse()
+        if instance and instance.state in ('hibernated', 'starting', 'running', 'ready'):
+            title = 'Despertando tu instancia…'
+            message = ('Estuvo un tiempo sin uso y se está iniciando de nuevo. '
+                       'Esta página se actualizará sola en unos segundos.')
+            refresh = f'<meta http-equiv="refresh" content="{_REFRESH_SECONDS}"/>\n'
+        else:
+            title = 'Instancia no disponible'
+            message = f'{html.escape(host or "Este sitio")} no está disponible en este momento.'
+            refresh = ''
+        body = _PAGE % {'title': title, 'message': message, 'refresh': refresh}
+        response_headers = [
+            ('Content-Type', 'text/html; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+        ]
+        if refresh:
+            response_headers.append(('Retry-After', str(_REFRESH_SECONDS)))
+        return request.make_response(body, headers=response_headers, status=503)
@@ -1,3 +1,9 @@
 from . import odoo_docker_instance_mejora
 from . import docker_compose_template_mejora
 from . import puerto_usado
+from . import instance_job
+from . import repository_repo_mejora
+from . import instance_log_line
+from . import shared_runtime
+from . import golden_snapshot
+from . import ir_config_parameter
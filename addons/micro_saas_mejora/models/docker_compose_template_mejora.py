@@ -1,11 +1,55 @@
 # -*- coding: utf-8 -*-
 import logging
-import re
+from functools import reduce
 
-from odoo import models, api, Command
+from odoo import models, fields, api, Command
+from odoo.exceptions import AccessError
+
+from ..tools import template as template_tools
 
 _logger = logging.getLogger(__name__)
 
+# Cuerpos de la plantilla que aportan placeholders: clave del índice -> campo.
+_PLACEHOLDER_SOURCES = (
+    ('dc', 'template_dc_body'),
+    ('odoo_conf', 'template_odoo_conf'),
+    ('postgres_conf', 'template_postgres_conf'),
+)
+
+# Archivo generado por cada cuerpo en el render por lotes.
+_RENDERED_FILES = (
+    ('docker-compose.yml', 'template_dc_body'),
+    ('odoo.conf', 'template_odoo_conf'),
+    ('postgresql.conf', 'template_postgres_conf'),
+)
+
+# Campos de la plantilla que cambian el contenido de su base modelo.
+_GOLDEN_SOURCE_FIELDS = {
+    'template_dc_body', 'template_odoo_conf', 'variable_ids', 'repository_line', 'db_init_modules',
+}
+
+
+def _field_chain_value(record, field_chain):
+    """
+    Valor de una cadena de campos ('partner_id.email') como texto, o None si
+    la cadena no existe en el modelo del registro. Los registros relacionales
+    se muestran por display_name, como _find_value_from_field_chain.
+
+    Igual que _find_value_from_field_chain, la cadena se recorre sin sudo
+    (record.sudo(False)): un campo que el usuario no puede leer lanza
+    AccessError en lugar de filtrarse al archivo generado.
+    """
+    value = record.sudo(False)
+    for field_name in field_chain.split('.'):
+        if not isinstance(value, models.BaseModel) or field_name not in value._fields:
+            return None
+        value = value[field_name] if len(value) <= 1 else value.mapped(field_name)
+    if isinstance(value, models.BaseModel):
+        return ' '.join(value.mapped('display_name'))
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value if item)
+    return str(value) if value or value == 0 else ''
+
 
 class DockerComposeTemplateMejora(models.Model):
     """
@@ -31,45 +75,175 @@ class DockerComposeTemplateMejora(models.Model):
         odoo_conf_content += "db_port = 5432\n"
         return odoo_conf_content
 
+    db_mode = fields.Selection([
+        ('dedicated', 'Contenedor Postgres propio'),
+        ('shared', 'Cluster Postgres compartido'),
+    ], string='Base de datos', default='dedicated',
+        help='Con el cluster compartido el docker-compose no levanta Postgres: cada instancia '
+             'recibe un rol y una base propios en el Postgres del host (micro_saas.shared_pg_*), '
+             'a los que apuntan las variables {{DB_HOST}}, {{DB_PORT}}, {{DB_USER}}, '
+             '{{DB_PASSWORD}} y {{DB_NAME}}.')
+    provisioning_mode = fields.Selection([
+        ('container', 'Contenedor por cliente'),
+        ('shared_runtime', 'Runtime Odoo compartido'),
+    ], string='Aprovisionamiento', default='container',
+        help='Con el runtime compartido las instancias no levantan contenedores: un único Odoo '
+             'por plantilla (micro.saas.shared.runtime) sirve una base por cliente en el cluster '
+             'Postgres compartido, elegida por subdominio (dbfilter = ^%d$) bajo micro_saas.base_domain.')
+    warm_pool_size = fields.Integer(
+        string='Instancias precalentadas',
+        default=0,
+        help='Instancias ya creadas, clonadas, con la imagen descargada e iniciadas que esperan '
+             'cliente. Al crear la instancia desde una factura o suscripción se toma una del pool '
+             '(segundos en vez de minutos) y el cron lo repone. 0 = sin pool.',
+    )
+    db_init_modules = fields.Char(
+        string='Módulos iniciales',
+        default='base',
+        help='Módulos (separados por comas) que se instalan en la base nueva de cada instancia '
+             'del cluster compartido.',
+    )
+    use_golden_snapshot = fields.Boolean(
+        string='Base modelo',
+        default=True,
+        help='Los módulos iniciales se instalan una sola vez en una base modelo de la plantilla '
+             'y cada instancia nueva recibe una copia hecha por Postgres (segundos en vez de '
+             'minutos). Se reconstruye sola al cambiar la imagen, los repositorios o los módulos.',
+    )
+    placeholder_index = fields.Json(
+        string='Índice de placeholders',
+        compute='_compute_placeholder_index',
+        store=True,
+        copy=False,
+        readonly=True,
+        help='Placeholders de cada cuerpo de la plantilla con el hash del contenido '
+             'del que se extrajeron; solo se recalcula cuando cambia alguno de los cuerpos.',
+    )
+
+    def write(self, vals):
+        """Marca desactualizada la base modelo si cambia lo que determina su contenido."""
+        res = super().write(vals)
+        if self._name == 'docker.compose.template' and _GOLDEN_SOURCE_FIELDS & vals.keys():
+            self.env['micro.saas.golden.snapshot'].sudo().search([
+                ('template_id', 'in', self.ids),
+                ('state', '=', 'ready'),
+            ]).write({'state': 'outdated'})
+        return res
+
+    def unlink(self):
+        """Elimina del cluster las bases modelo de las plantillas (el cascade no pasa por su unlink)."""
+        if self._name == 'docker.compose.template':
+            self.env['micro.saas.golden.snapshot'].sudo().search([('template_id', 'in', self.ids)]).unlink()
+        return super().unlink()
+
     @api.depends('template_dc_body', 'template_odoo_conf', 'template_postgres_conf')
+    def _compute_placeholder_index(self):
+        """
+        Índice {cuerpo: {'hash', 'names'}} de los placeholders de cada
+        cuerpo. Las plantillas compiladas se cachean por contenido, así que
+        un cuerpo que no cambió no se vuelve a analizar.
+        """
+        for tmpl in self:
+            index = {}
+            for key, field_name in _PLACEHOLDER_SOURCES:
+                body = tmpl[field_name] or ''
+                index[key] = {
+                    'hash': template_tools.content_hash(body),
+                    'names': sorted(template_tools.compile_template(body).placeholders),
+                }
+            tmpl.placeholder_index = index
+
+    @api.depends('placeholder_index')
     def _compute_variable_ids(self):
         """
         Override: compute template variables según los placeholders.
         Corrige el bug donde al borrar una instancia, se eliminaban las variables
         del template padre.
+        Los placeholders salen del índice persistido (placeholder_index) y la
+        diferencia con variable_ids se aplica en una sola lista de comandos.
         """
         for tmpl in self:
-            # Extraer todas las variables de las 3 plantillas
-            body_variables = set(re.findall(r'{{[^{}]+}}', tmpl.template_dc_body or ''))
-            body_variables = body_variables.union(
-                set(re.findall(r'{{[^{}]+}}', tmpl.template_odoo_conf or ''))
-            )
-            body_variables = body_variables.union(
-                set(re.findall(r'{{[^{}]+}}', tmpl.template_postgres_conf or ''))
-            )
+            index = tmpl.placeholder_index or {}
+            body_variables = set()
+            for key, _field_name in _PLACEHOLDER_SOURCES:
+                body_variables.update((index.get(key) or {}).get('names', ()))
 
             # Variables existentes indexadas por nombre
             existing_vars = {var.name: var for var in tmpl.variable_ids}
 
-            # Variables nuevas
-            new_var_names = [
-                var_name for var_name in body_variables
-                if var_name not in existing_vars
+            # Comandos de actualización: eliminar las que ya no aparecen (solo
+            # las que pertenecen a ESTE registro) y crear las nuevas
+            update_commands = [
+                Command.delete(var.id)
+                for name, var in existing_vars.items()
+                if name not in body_variables and var.id
+            ]
+            update_commands += [
+                Command.create({'name': var_name})
+                for var_name in sorted(body_variables - set(existing_vars))
             ]
-
-            # Variables a eliminar (solo las que ya no aparecen y pertenecen a ESTE registro)
-            vars_to_delete = []
-            for name, var in existing_vars.items():
-                if name not in body_variables:
-                    if var.id:
-                        vars_to_delete.append(var.id)
-
-            # Comandos de actualización
-            update_commands = []
-            for del_id in vars_to_delete:
-                update_commands.append(Command.delete(del_id))
-            for var_name in set(new_var_names):
-                update_commands.append(Command.create({'name': var_name}))
 
             if update_commands:
                 tmpl.variable_ids = update_commands
+
+    def _get_formatted_body(self, template_body='', demo_fallback=False, variable_values=None):
+        """
+        Override: render en una sola pasada con la plantilla compilada y
+        cacheada por contenido (tools.template), sin un str.replace ni un log por
+        variable. Si hay nombres repetidos gana el primero, como antes. Las
+        variables de tipo 'field' usan su valor de ejemplo, como el original:
+        los result_* calculados no cambian ni dependen de permisos de lectura.
+        """
+        self.ensure_one()
+        return template_tools.render_variables(template_body, self._get_variable_values(demo_fallback))
+
+    def _get_variable_values(self, demo_fallback=False, resolve_fields=False):
+        """
+        Valor de cada placeholder para este registro: el valor de ejemplo
+        (o ' ' sin demo_fallback). Con resolve_fields, las variables de tipo
+        'field' toman el valor de su cadena de campos cuando existe en el
+        modelo; un campo que el usuario no puede leer lanza AccessError.
+        """
+        self.ensure_one()
+        values = {}
+        for var in self.variable_ids:
+            if var.name in values:
+                continue
+            if resolve_fields and var.field_type == 'field' and var.field_name:
+                value = _field_chain_value(self, var.field_name)
+                if value is not None:
+                    values[var.name] = value
+                    continue
+            values[var.name] = (var.demo_value or '') if demo_fallback else ' '
+        return values
+
+    def render_files(self, demo_fallback=True):
+        """
+        API por lotes: renderiza docker-compose.yml, odoo.conf y
+        postgresql.conf de todos los registros en una llamada y devuelve
+        {id: {nombre_archivo: contenido}}.
+
+        A diferencia de _get_formatted_body, las variables de tipo 'field' se
+        resuelven con su cadena de campos (AccessError si el usuario no puede
+        leer alguno). Las variables y las cadenas se leen para todo el
+        recordset de una vez (mapped), así que regenerar muchos registros no
+        hace una ronda de consultas por cada uno. odoo.docker.instance lo
+        sobrescribe con los archivos que escribe al iniciar.
+        """
+        variables = self.mapped('variable_ids')
+        variables.mapped('demo_value')
+        field_chains = set(variables.filtered(lambda v: v.field_type == 'field' and v.field_name).mapped('field_name'))
+        for field_chain in field_chains:
+            try:
+                reduce(lambda records, field_name: records.mapped(field_name), field_chain.split('.'), self.sudo(False))
+            except (KeyError, AccessError):
+                continue  # se resuelve (o se ignora) por registro en _get_variable_values
+
+        files = {}
+        for record in self:
+            values = record._get_variable_values(demo_fallback, resolve_fields=True)
+            files[record.id] = {
+                file_name: template_tools.render_variables(record[field_name], values)
+                for file_name, field_name in _RENDERED_FILES
+            }
+        return files
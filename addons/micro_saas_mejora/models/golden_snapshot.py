@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import models, fields, api, SUPERUSER_ID
+
+from ..tools import postgres as pg_tools
+from ..tools import resources
+from ..tools import template as template_tools
+
+_logger = logging.getLogger(__name__)
+
+# Una construcción que sigue en 'building' pasado este tiempo se da por
+# abandonada (el trabajo que la hacía murió) y otro inicio puede retomarla.
+_BUILD_STALE_MINUTES = 45
+
+
+class GoldenSnapshot(models.Model):
+    """
+    Base modelo por plantilla en el cluster Postgres compartido: una base
+    de Odoo con los módulos iniciales de la plantilla ya instalados, usada
+    como TEMPLATE de CREATE DATABASE. La base de una instancia nueva es una
+    copia hecha por Postgres (segundos) en lugar de un odoo -i (minutos).
+
+    Se construye sola en el primer inicio que la necesita, con el
+    contenedor de esa instancia (o del runtime compartido), y se vuelve a
+    construir cuando cambia lo que determina su contenido: imagen de Odoo,
+    repositorios o módulos (source_hash) o la plantilla (estado
+    'Desactualizada'). Los adjuntos que Odoo dejó en el filestore al
+    instalar pasan a la base (db_datas): cada copia queda completa sin
+    copiar archivos.
+
+    La base modelo no admite conexiones y es del rol de administración;
+    sus objetos son del rol ms_golden_<plantilla>, que en cada copia se
+    reasignan al rol de la instancia (o del runtime).
+    """
+    _name = 'micro.saas.golden.snapshot'
+    _description = 'Base modelo de plantilla'
+    _order = 'template_id'
+
+    name = fields.Char(string='Nombre', required=True)
+    template_id = fields.Many2one(
+        'docker.compose.template',
+        string='Plantilla',
+        required=True,
+        ondelete='cascade',
+    )
+    state = fields.Selection([
+        ('building', 'Construyendo'),
+        ('ready', 'Lista'),
+        ('outdated', 'Desactualizada'),
+        ('error', 'Error'),
+    ], string='Estado', default='building', readonly=True, copy=False)
+    db_name = fields.Char(string='Base modelo', readonly=True, copy=False)
+    db_user = fields.Char(string='Rol de los objetos', readonly=True, copy=False)
+    modules = fields.Char(string='Módulos', readonly=True, copy=False)
+    source_hash = fields.Char(string='Hash de origen', readonly=True, copy=False)
+    build_started_at = fields.Datetime(string='Construcción iniciada', readonly=True, copy=False)
+    built_at = fields.Datetime(string='Construida', readonly=True, copy=False)
+    build_seconds = fields.Float(string='Duración de la construcción (s)', readonly=True, copy=False)
+    clone_count = fields.Integer(string='Copias', default=0, readonly=True, copy=False)
+    last_error = fields.Text(string='Último error', readonly=True, copy=False)
+
+    _sql_constraints = [
+        ('template_uniq', 'unique(template_id)', 'Ya existe una base modelo para esta plantilla.'),
+    ]
+
+    def unlink(self):
+        """Elimina la base modelo y su rol del cluster compartido."""
+        Instance = self.env['odoo.docker.instance']
+        for snapshot in self.filtered('db_user'):
+            try:
+                with Instance._shared_pg_connection() as conn:
+                    if snapshot.db_name:
+                        pg_tools.drop_database(conn, snapshot.db_name)
+                    pg_tools.drop_role(conn, snapshot.db_user)
+            except psycopg2.Error as e:
+                _logger.warning("[MEJORA] No se pudo eliminar la base modelo %s: %s", snapshot.name, e)
+        return super().unlink()
+
+    def action_mark_outdated(self):
+        """Fuerza la reconstrucción en el próximo inicio de una instancia nueva."""
+        self.filtered(lambda s: s.state != 'building').write({'state': 'outdated'})
+
+    @staticmethod
+    def _source_hash(compose_content, modules, repositories=()):
+        """
+        Hash de lo que determina el contenido de la base modelo: imágenes de
+        Odoo del docker-compose, repositorios (nombre@rama) y módulos, todo
+        de la plantilla: lo propio de cada instancia no entra, o dos
+        instancias de la misma plantilla la reconstruirían una a la otra.
+        """
+        images = sorted(resources.service_images(compose_content, resources.is_odoo_service))
+        parts = images + sorted(repositories) + [f"modules={modules}"]
+        return template_tools.content_hash('\n'.join(parts))
+
+    # ==========================================
+    #  COPIA Y CONSTRUCCIÓN
+    # ==========================================
+
+    @api.model
+    def _provision(self, instance, dbname, owner, source_hash, modules, build):
+        """
+        Reemplaza `dbname` (vacía o a medio inicializar, de `owner`) por una
+        copia de la base modelo de la plantilla de `instance`; si la base
+        modelo falta o no coincide con `source_hash`, la construye antes.
+        build(base, rol, contraseña) corre odoo -i en la base modelo y
+        devuelve la carpeta del filestore de esa base, o None si falló.
+        Devuelve True si `dbname` quedó copiada; con False el llamador sigue
+        con la inicialización normal.
+        """
+        snapshot = self._acquire(instance.template_id, source_hash, modules)
+        if snapshot is None:
+            instance.add_to_log("[INFO] 📸 Otro inicio está construyendo la base modelo de la plantilla; "
+                                "esta base se inicializa de cero.")
+            return False
+        if snapshot['state'] != 'ready':
+            snapshot = self._build(instance, snapshot, build)
+            if not snapshot:
+                return False
+        return self._clone(instance, snapshot, dbname, owner)
+
+    @api.model
+    def _acquire(self, template, source_hash, modules):
+        """
+        En un cursor propio (lo ven al instante los demás inicios): devuelve
+        la base modelo lista y al día, o la marca 'building' para que la
+        construya este inicio. None si otro inicio la está construyendo.
+        """
+        now = fields.Datetime.now()
+        try:
+            with self.pool.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                cr.execute("SELECT id FROM micro_saas_golden_snapshot WHERE template_id = %s FOR UPDATE",
+                           [template.id])
+                row = cr.fetchone()
+                if row:
+                    snapshot = env[self._name].browse(row[0])
+                    if snapshot.state == 'ready' and snapshot.source_hash == source_hash:
+                        return {'id': snapshot.id, 'state': 'ready',
+                                'db_name': snapshot.db_name, 'db_user': snapshot.db_user}
+                    stale = now - timedelta(minutes=_BUILD_STALE_MINUTES)
+                    if snapshot.state == 'building' and snapshot.build_started_at and snapshot.build_started_at > stale:
+                        return None
+                    previous_db = snapshot.db_name
+                    snapshot.write({
+                        'state': 'building',
+                        'source_hash': source_hash,
+                        'modules': modules,
+                        'build_started_at': now,
+                        'last_error': False,
+                    })
+                else:
+                    previous_db = False
+                    snapshot = env[self._name].create({
+                        'name': f"Base modelo - {template.name}",
+                        'template_id': template.id,
+                        'db_user': pg_tools.identifier(f"golden_{template.id}"),
+                        'source_hash': source_hash,
+                        'modules': modules,
+                        'build_started_at': now,
+                    })
+                values = {'id': snapshot.id, 'state': 'building', 'template_id': template.id,
+                          'db_user': snapshot.db_user, 'source_hash': source_hash,
+                          'previous_db': previous_db}
+        except psycopg2.IntegrityError:
+            # Otro inicio creó el registro a la vez.
+            return None
+        return values
+
+    @api.model
+    def _update(self, snapshot_id, vals):
+        """Escribe en la base modelo desde un cursor propio."""
+        with self.pool.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env[self._name].browse(snapshot_id).write(vals)
+
+    @api.model
+    def _build(self, instance, snapshot, build):
+        """
+        Construye la base modelo: base vacía del rol de la plantilla, odoo -i
+        con el contenedor de `instance`, adjuntos del filestore a la base,
+        dueño al rol de administración y conexiones bloqueadas. Devuelve los
+        datos de la base lista, o None si falló (queda en 'error').
+        """
+        Instance = self.env['odoo.docker.instance']
+        role = snapshot['db_user']
+        golden_db = pg_tools.identifier(f"golden_{snapshot['template_id']}_{snapshot['source_hash'][:8]}")
+        instance.add_to_log(f"[INFO] 📸 Construyendo la base modelo '{golden_db}' de la plantilla "
+                            f"(solo la primera vez; las próximas instancias la copian)...")
+        password = pg_tools.new_password()
+        started = time.monotonic()
+        error = False
+        try:
+            with Instance._shared_pg_connection() as conn:
+                pg_tools.ensure_role(conn, role, password)
+                pg_tools.drop_database(conn, golden_db)
+                pg_tools.ensure_database(conn, golden_db, role)
+            filestore_dir = build(golden_db, role, password)
+            if filestore_dir is None:
+                error = "Falló la inicialización de Odoo en la base modelo."
+            else:
+                with Instance._shared_pg_connection(golden_db) as conn:
+                    moved, missing = pg_tools.internalize_attachments(conn, filestore_dir)
+                if missing:
+                    instance.add_to_log(f"[WARN] ⚠️ {missing} adjunto(s) de la base modelo no están en "
+                                        f"{filestore_dir}; las copias los regenerarán al usarlos.")
+                with Instance._shared_pg_connection() as conn:
+                    pg_tools.set_owner(conn, golden_db)
+                    pg_tools.set_allow_connections(conn, golden_db, False)
+                    # La contraseña quedó en el odoo.conf temporal de la construcción: se descarta.
+                    pg_tools.ensure_role(conn, role, pg_tools.new_password())
+                    if snapshot['previous_db'] and snapshot['previous_db'] != golden_db:
+                        pg_tools.drop_database(conn, snapshot['previous_db'])
+        except psycopg2.Error as e:
+            error = str(e)
+        except Exception as e:
+            self._update(snapshot['id'], {'state': 'error', 'last_error': str(e)})
+            raise
+        if error:
+            self._update(snapshot['id'], {'state': 'error', 'last_error': error})
+            instance.add_to_log(f"[WARN] ⚠️ No se pudo construir la base modelo: {error}")
+            try:
+                with Instance._shared_pg_connection() as conn:
+                    pg_tools.drop_database(conn, golden_db)
+            except psycopg2.Error as e:
+                _logger.warning("[MEJORA] No se pudo eliminar la base modelo fallida %s: %s", golden_db, e)
+            return None
+        elapsed = time.monotonic() - started
+        self._update(snapshot['id'], {
+            'state': 'ready',
+            'db_name': golden_db,
+            'built_at': fields.Datetime.now(),
+            'build_seconds': elapsed,
+        })
+        instance.add_to_log(f"[INFO] ✅ Base modelo '{golden_db}' lista en {elapsed:.0f} s "
+                            f"({moved} adjunto(s) incorporados a la base).")
+        return {'id': snapshot['id'], 'state': 'ready', 'db_name': golden_db, 'db_user': role}
+
+    @api.model
+    def _clone(self, instance, snapshot, dbname, owner):
+        """
+        Recrea `dbname` como copia de la base modelo, con sus objetos a
+        nombre de `owner` e identidad propia (uuid, secret). Si la copia
+        falla deja `dbname` vacía otra vez y devuelve False.
+        """
+        Instance = self.env['odoo.docker.instance']
+        started = time.monotonic()
+        try:
+            with Instance._shared_pg_connection() as conn:
+                pg_tools.drop_database(conn, dbname)
+                pg_tools.ensure_database(conn, dbname, owner, template=snapshot['db_name'])
+            with Instance._shared_pg_connection(dbname) as conn:
+                pg_tools.adopt_objects(conn, snapshot['db_user'], owner)
+                pg_tools.reset_odoo_identity(conn)
+        except psycopg2.Error as e:
+            instance.add_to_log(f"[WARN] ⚠️ No se pudo copiar la base modelo ({e}); "
+                                f"la base se inicializa de cero.")
+            try:
+                with Instance._shared_pg_connection() as conn:
+                    pg_tools.drop_database(conn, dbname)
+                    pg_tools.ensure_database(conn, dbname, owner)
+            except psycopg2.Error as e:
+                _logger.warning("[MEJORA] No se pudo recrear la base vacía %s: %s", dbname, e)
+            return False
+        with self.pool.cursor() as cr:
+            cr.execute("UPDATE micro_saas_golden_snapshot SET clone_count = COALESCE(clone_count, 0) + 1 WHERE id = %s",
+                       [snapshot['id']])
+        instance.add_to_log(f"[INFO] ✅ Base '{dbname}' copiada de la base modelo en "
+                            f"{time.monotonic() - started:.1f} s.")
+        return True
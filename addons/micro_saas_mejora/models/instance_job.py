@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Método de odoo.docker.instance que ejecuta cada operación y los estados
+# en los que puede quedar la instancia para considerar el trabajo exitoso
+# (None: la operación decide el estado y no se reintenta). Una operación
+# puede devolver segundos: el mismo trabajo se vuelve a ejecutar pasado ese
+# tiempo sin contar como intento fallido (la sonda de disponibilidad).
+_JOB_OPERATIONS = {
+    'start': ('_do_start_instance', ('starting', 'running', 'ready')),
+    'stop': ('_do_stop_instance', ('stopped',)),
+    'restart': ('_do_restart_instance', ('starting', 'running', 'ready')),
+    'probe': ('_do_probe_readiness', None),
+    'hibernate': ('_do_hibernate_instance', None),
+}
+
+_DEFAULT_WORKERS = 2
+_DEFAULT_MAX_ATTEMPTS = 3
+# Tiempo máximo que una ejecución del cron sigue tomando trabajos nuevos.
+# Los trabajos ya iniciados terminan; los pendientes quedan para la siguiente.
+_CRON_BUDGET_SECONDS = 600
+# Si no hay trabajos corriendo, el cron espera a los pendientes que vencen
+# dentro de este plazo (sondas reprogramadas) en vez de terminar.
+_CRON_IDLE_WAIT_SECONDS = 30
+# Cada cuánto se buscan trabajos nuevos mientras hay otros en ejecución.
+_CLAIM_POLL_SECONDS = 1
+
+
+class InstanceJobBatch(models.Model):
+    """
+    Lote de trabajos creado por una acción masiva (iniciar/detener/reiniciar
+    muchas instancias). Limita cuántos trabajos del lote corren a la vez y
+    resume el avance con los resultados por instancia.
+    """
+    _name = 'micro.saas.instance.job.batch'
+    _description = 'Lote de trabajos de instancias'
+    _order = 'id desc'
+
+    name = fields.Char(string='Lote', required=True)
+    operation = fields.Selection([
+        ('start', 'Iniciar'),
+        ('stop', 'Detener'),
+        ('restart', 'Reiniciar'),
+    ], string='Operación', required=True)
+    max_concurrency = fields.Integer(
+        string='Concurrencia máxima',
+        default=lambda self: self.env['micro.saas.instance.job']._get_worker_count(),
+        help='Cantidad máxima de trabajos de este lote ejecutándose al mismo tiempo. No puede '
+             'superar micro_saas.job_workers (los hilos de la cola, compartidos con todos los '
+             'trabajos): un valor mayor se reduce a ese número al guardar.',
+    )
+    job_ids = fields.One2many('micro.saas.instance.job', 'batch_id', string='Trabajos')
+    total_count = fields.Integer(string='Total', compute='_compute_progress')
+    pending_count = fields.Integer(string='Pendientes', compute='_compute_progress')
+    running_count = fields.Integer(string='En ejecución', compute='_compute_progress')
+    done_count = fields.Integer(string='Completados', compute='_compute_progress')
+    failed_count = fields.Integer(string='Fallidos', compute='_compute_progress')
+    progress = fields.Float(string='Progreso (%)', compute='_compute_progress')
+    state = fields.Selection([
+        ('in_progress', 'En curso'),
+        ('done', 'Terminado'),
+    ], string='Estado', compute='_compute_progress')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            self._clamp_concurrency(vals)
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self._clamp_concurrency(vals)
+        return super().write(vals)
+
+    @api.model
+    def _clamp_concurrency(self, vals):
+        """max_concurrency entre 1 y micro_saas.job_workers: más no tendría efecto."""
+        if vals.get('max_concurrency') is not None:
+            workers = self.env['micro.saas.instance.job']._get_worker_count()
+            vals['max_concurrency'] = max(1, min(int(vals['max_concurrency'] or 1), workers))
+
+    @api.depends('job_ids.state')
+    def _compute_progress(self):
+        counts = {
+            (batch.id, state): count
+            for batch, state, count in self.env['micro.saas.instance.job']._read_group(
+                [('batch_id', 'in', self.ids)], ['batch_id', 'state'], ['__count'])
+        }
+        for batch in self:
+            by_state = {state: counts.get((batch.id, state), 0)
+                        for state in ('pending', 'running', 'done', 'failed', 'cancelled')}
+            total = sum(by_state.values())
+            finished = by_state['done'] + by_state['failed'] + by_state['cancelled']
+            batch.total_count = total
+            batch.pending_count = by_state['pending']
+            batch.running_count = by_state['running']
+            batch.done_count = by_state['done']
+            batch.failed_count = by_state['failed']
+            batch.progress = 100.0 * finished / total if total else 100.0
+            batch.state = 'done' if finished == total else 'in_progress'
+
+    def get_report(self):
+        """
+        API: resumen agregado del lote y resultado por instancia.
+        Pensado para llamarse por XML-RPC/JSON-RPC.
+        """
+        self.ensure_one()
+        return {
+            'batch_id': self.id,
+            'operation': self.operation,
+            'state': self.state,
+            'progress': self.progress,
+            'total': self.total_count,
+            'pending': self.pending_count,
+            'running': self.running_count,
+            'done': self.done_count,
+            'failed': self.failed_count,
+            'results': [{
+                'instance_id': job.instance_id.id,
+                'instance': job.instance_id.name,
+                'state': job.state,
+                'attempts': job.attempts,
+                'error': job.error_message or False,
+            } for job in self.job_ids],
+        }
+
+    def action_cancel(self):
+        self.job_ids.action_cancel()
+
+    def action_retry_failed(self):
+        self.job_ids.filtered(lambda j: j.state == 'failed').action_retry()
+
+
+class InstanceJob(models.Model):
+    """
+    Cola persistente de operaciones sobre instancias Docker.
+
+    Los botones Start/Stop/Restart ya no ejecutan docker-compose dentro de
+    la petición HTTP: crean un trabajo aquí y regresan de inmediato. El cron
+    'MicroSaaS: Procesar cola de instancias' toma los trabajos pendientes y
+    los ejecuta en un pool pequeño de hilos, cada uno con su propio cursor.
+    """
+    _name = 'micro.saas.instance.job'
+    _description = 'Trabajo en cola de instancia Docker'
+    _order = 'id desc'
+
+    name = fields.Char(string='Trabajo', compute='_compute_name', store=True)
+    instance_id = fields.Many2one(
+        'odoo.docker.instance',
+        string='Instancia',
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+    operation = fields.Selection([
+        ('start', 'Iniciar'),
+        ('stop', 'Detener'),
+        ('restart', 'Reiniciar'),
+        ('probe', 'Comprobar disponibilidad'),
+        ('hibernate', 'Hibernar'),
+    ], string='Operación', required=True)
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('running', 'En ejecución'),
+        ('done', 'Completado'),
+        ('failed', 'Fallido'),
+        ('cancelled', 'Cancelado'),
+    ], string='Estado', default='pending', required=True, index=True)
+    attempts = fields.Integer(string='Intentos', default=0, readonly=True)
+    max_attempts = fields.Integer(string='Máx. intentos', default=_DEFAULT_MAX_ATTEMPTS)
+    progress = fields.Integer(string='Progreso (%)', default=0, readonly=True)
+    progress_message = fields.Char(string='Paso actual', readonly=True)
+    error_message = fields.Text(string='Error', readonly=True)
+    cancel_requested = fields.Boolean(
+        string='Cancelación solicitada',
+        readonly=True,
+        help='El trabajo en curso detiene el comando que esté ejecutando y queda cancelado.',
+    )
+    scheduled_at = fields.Datetime(
+        string='Programado para',
+        default=fields.Datetime.now,
+        index=True,
+        help='Los reintentos se programan con espera exponencial.',
+    )
+    started_at = fields.Datetime(string='Inicio', readonly=True)
+    finished_at = fields.Datetime(string='Fin', readonly=True)
+    user_id = fields.Many2one('res.users', string='Solicitado por', default=lambda self: self.env.user)
+    batch_id = fields.Many2one('micro.saas.instance.job.batch', string='Lote', index=True, ondelete='set null')
+
+    @api.depends('instance_id.name', 'operation')
+    def _compute_name(self):
+        labels = dict(self._fields['operation'].selection)
+        for job in self:
+            job.name = f"{labels.get(job.operation, '')} {job.instance_id.name or ''}".strip()
+
+    # ==========================================
+    #  ACCIONES
+    # ==========================================
+
+    def action_cancel(self):
+        """
+        Cancela los trabajos que aún no empezaron. A los que están corriendo
+        se les pide cancelar: el comando en curso (docker pull, compose up,
+        git) se detiene en la siguiente consulta del runner.
+        """
+        self.filtered(lambda j: j.state == 'pending').write({'state': 'cancelled'})
+        self.filtered(lambda j: j.state == 'running').write({'cancel_requested': True})
+
+    def action_retry(self):
+        """Vuelve a encolar trabajos fallidos o cancelados."""
+        self.filtered(lambda j: j.state in ('failed', 'cancelled')).write({
+            'state': 'pending',
+            'attempts': 0,
+            'error_message': False,
+            'progress': 0,
+            'progress_message': False,
+            'scheduled_at': fields.Datetime.now(),
+        })
+        self._trigger_worker()
+
+    # ==========================================
+    #  ENCOLADO
+    # ==========================================
+
+    @api.model
+    def _enqueue(self, instances, operation, batch=None):
+        """
+        Crea un trabajo por instancia, salvo que ya exista uno pendiente
+        o en ejecución para la misma instancia y operación. Con `batch`, los
+        trabajos (nuevos y existentes sin lote) quedan asociados al lote.
+        Los usuarios solo leen la cola: los trabajos se crean con sudo, a
+        nombre de quien los pidió (user_id).
+        """
+        existing = self.search([
+            ('instance_id', 'in', instances.ids),
+            ('operation', '=', operation),
+            ('state', 'in', ('pending', 'running')),
+        ])
+        if batch:
+            existing.filtered(lambda j: not j.batch_id).sudo().write({'batch_id': batch.id})
+        queued = existing.instance_id
+        jobs = existing | self.sudo().create([
+            {'instance_id': instance.id, 'operation': operation, 'batch_id': batch.id if batch else False}
+            for instance in instances - queued
+        ]).sudo(False)
+        if jobs:
+            self._trigger_worker()
+        return jobs
+
+    @api.model
+    def _trigger_worker(self, at=None):
+        cron = self.env.ref('micro_saas_mejora.cron_process_instance_jobs', raise_if_not_found=False)
+        if cron:
+            cron._trigger(at=at)
+
+    # ==========================================
+    #  PROCESAMIENTO (CRON)
+    # ==========================================
+
+    @api.model
+    def _get_worker_count(self):
+        param = self.env['ir.config_parameter'].sudo().get_param('micro_saas.job_workers')
+        try:
+            return max(1, int(param or _DEFAULT_WORKERS))
+        except (ValueError, TypeError):
+            return _DEFAULT_WORKERS
+
+    @api.model
+    def cron_process_jobs(self):
+        """
+        Procesa la cola con un pool de hilos. El cron de Odoo no se ejecuta
+        dos veces en paralelo, así que cualquier trabajo que siga en 'running'
+        al comenzar quedó huérfano (worker caído) y se reprograma.
+        """
+        self._requeue_orphans()
+        self.env.cr.commit()
+
+        workers = self._get_worker_count()
+        deadline = time.monotonic() + _CRON_BUDGET_SECONDS
+        active = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='micro_saas_job') as executor:
+            while True:
+                free = workers - len(active)
+                if free > 0 and time.monotonic() < deadline:
+                    busy_instances = set(active.values())
+                    for job_id, instance_id in self._claim(free, busy_instances):
+                        future = executor.submit(self._run_in_new_cursor, job_id)
+                        active[future] = instance_id
+                if not active:
+                    due_in = self._next_due_in()
+                    if due_in is None or due_in > _CRON_IDLE_WAIT_SECONDS \
+                            or time.monotonic() + due_in >= deadline:
+                        break
+                    time.sleep(max(due_in, _CLAIM_POLL_SECONDS))
+                    continue
+                # Con timeout: un trabajo reprogramado que vence mientras los
+                # demás siguen corriendo se toma sin esperar a que terminen.
+                done, _not_done = wait(list(active), timeout=_CLAIM_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    active.pop(future)
+                    if future.exception():
+                        _logger.error("[MEJORA] Worker de la cola terminó con error: %s", future.exception())
+
+        due_in = self._next_due_in()
+        if due_in is not None:
+            self._trigger_worker(at=fields.Datetime.now() + timedelta(seconds=due_in))
+
+    @api.model
+    def _next_due_in(self):
+        """Segundos hasta el próximo trabajo pendiente (0 si ya venció), o None si no hay."""
+        self.env.cr.execute("""
+            SELECT GREATEST(EXTRACT(EPOCH FROM MIN(scheduled_at) - (now() at time zone 'UTC')), 0)
+              FROM micro_saas_instance_job
+             WHERE state = 'pending'
+        """)
+        due_in = self.env.cr.fetchone()[0]
+        self.env.cr.commit()
+        return float(due_in) if due_in is not None else None
+
+    @api.model
+    def _requeue_orphans(self):
+        orphans = self.search([('state', '=', 'running')])
+        cancelled = orphans.filtered('cancel_requested')
+        cancelled.write({'state': 'cancelled', 'finished_at': fields.Datetime.now()})
+        for job in orphans - cancelled:
+            job._schedule_retry("El worker se detuvo antes de terminar el trabajo.")
+
+    @api.model
+    def _claim(self, limit, busy_instances):
+        """
+        Reserva hasta `limit` trabajos pendientes con FOR UPDATE SKIP LOCKED
+        y los marca como 'running'. Nunca toma dos trabajos de la misma
+        instancia a la vez ni supera la concurrencia máxima de cada lote.
+
+        Los dos límites se aplican en la consulta: de cada instancia solo
+        cuenta su trabajo más antiguo y de cada lote solo los primeros
+        (max_concurrency - en ejecución). Un lote grande con su cupo lleno
+        no ocupa la ventana: los trabajos sueltos y los de otros lotes
+        (sondas, inicios individuales) se toman igual.
+        """
+        self.env.cr.execute("""
+            WITH running AS (
+                SELECT instance_id, batch_id FROM micro_saas_instance_job WHERE state = 'running'
+            ), candidates AS (
+                SELECT j.id, j.batch_id,
+                       row_number() OVER (PARTITION BY j.instance_id ORDER BY j.id) AS instance_rank,
+                       row_number() OVER (PARTITION BY j.batch_id ORDER BY j.id) AS batch_rank
+                  FROM micro_saas_instance_job j
+                 WHERE j.state = 'pending'
+                   AND (j.scheduled_at IS NULL OR j.scheduled_at <= (now() at time zone 'UTC'))
+                   AND j.instance_id NOT IN (SELECT instance_id FROM running)
+                   AND NOT (j.instance_id = ANY(%(busy)s))
+            )
+            SELECT j.id, j.instance_id
+              FROM micro_saas_instance_job j
+              JOIN candidates c ON c.id = j.id
+         LEFT JOIN micro_saas_instance_job_batch b ON b.id = c.batch_id
+             WHERE c.instance_rank = 1
+               AND (c.batch_id IS NULL
+                    OR c.batch_rank <= GREATEST(COALESCE(b.max_concurrency, 1), 1)
+                                       - (SELECT COUNT(*) FROM running r WHERE r.batch_id = c.batch_id))
+             ORDER BY j.id
+             LIMIT %(limit)s
+               FOR UPDATE OF j SKIP LOCKED
+        """, {'busy': list(busy_instances), 'limit': limit})
+        claimed = self.env.cr.fetchall()
+        if claimed:
+            self.browse([job_id for job_id, _instance_id in claimed]).write({
+                'state': 'running',
+                'started_at': fields.Datetime.now(),
+                'finished_at': False,
+                'progress': 0,
+                'progress_message': False,
+                'cancel_requested': False,
+            })
+        self.env.cr.commit()
+        return claimed
+
+    def _run_in_new_cursor(self, job_id):
+        """
+        Ejecuta un trabajo en un cursor propio (se llama desde un hilo del pool).
+        La fila del trabajo solo se toca en cursores cortos separados para no
+        chocar con las actualizaciones de progreso.
+        """
+        with self.pool.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            job = env[self._name].browse(job_id)
+            operation = job.operation
+            instance = job.instance_id.with_context(micro_saas_job_id=job_id, micro_saas_log_phase=operation)
+            method, expected_states = _JOB_OPERATIONS[operation]
+            error = None
+            retry_in = None
+            try:
+                retry_in = getattr(instance, method)()
+                env.flush_all()
+                cr.commit()
+                instance.invalidate_recordset(['state'])
+                if expected_states and instance.state not in expected_states:
+                    error = f"La instancia quedó en estado '{instance.state}'. Revisa el log de la instancia."
+            except Exception as e:
+                cr.rollback()
+                error = str(e) or e.__class__.__name__
+                _logger.warning("[MEJORA] Trabajo %s (%s) falló:\n%s", job_id, operation, traceback.format_exc())
+                instance.write({'state': 'error'})
+                instance.add_to_log(f"[ERROR] ❌ {error}")
+                env.flush_all()
+                cr.commit()
+
+        with self.pool.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            job = env[self._name].browse(job_id)
+            if job.cancel_requested:
+                job.write({
+                    'state': 'cancelled',
+                    'error_message': error,
+                    'finished_at': fields.Datetime.now(),
+                })
+            elif error:
+                job._schedule_retry(error)
+            elif retry_in:
+                job._schedule_recheck(retry_in)
+            else:
+                job.write({
+                    'state': 'done',
+                    'progress': 100,
+                    'finished_at': fields.Datetime.now(),
+                    'error_message': False,
+                })
+
+    def _schedule_retry(self, error):
+        """Reprograma con espera exponencial o marca el trabajo como fallido."""
+        self.ensure_one()
+        attempts = self.attempts + 1
+        vals = {
+            'attempts': attempts,
+            'error_message': error,
+            'finished_at': fields.Datetime.now(),
+        }
+        if attempts < self.max_attempts:
+            vals.update({
+                'state': 'pending',
+                'scheduled_at': fields.Datetime.now() + timedelta(minutes=2 ** attempts),
+            })
+        else:
+            vals['state'] = 'failed'
+        self.write(vals)
+
+    def _schedule_recheck(self, seconds):
+        """
+        Vuelve a dejar pendiente el trabajo para dentro de `seconds` segundos,
+        sin contar un intento: la operación aún no terminó (p. ej. la sonda
+        espera a que Odoo responda) y el hilo queda libre mientras tanto.
+        """
+        self.ensure_one()
+        scheduled_at = fields.Datetime.now() + timedelta(seconds=seconds)
+        self.write({
+            'state': 'pending',
+            'scheduled_at': scheduled_at,
+            'error_message': False,
+        })
+        self._trigger_worker(at=scheduled_at)
+
+    @api.model
+    def _report_progress(self, job_id, progress, message):
+        """
+        Actualiza el progreso en un cursor independiente para que sea visible
+        mientras el trabajo sigue corriendo.
+        """
+        try:
+            with self.pool.cursor() as cr:
+                cr.execute(
+                    "UPDATE micro_saas_instance_job SET progress = %s, progress_message = %s WHERE id = %s",
+                    [progress, message, job_id],
+                )
+        except Exception as e:
+            _logger.debug("[MEJORA] No se pudo actualizar el progreso del trabajo %s: %s", job_id, e)
+
+    @api.model
+    def _is_cancel_requested(self, job_id):
+        """Lee la marca de cancelación en un cursor propio (la transacción del trabajo no la ve)."""
+        try:
+            with self.pool.cursor() as cr:
+                cr.execute("SELECT cancel_requested FROM micro_saas_instance_job WHERE id = %s", [job_id])
+                row = cr.fetchone()
+                return bool(row and row[0])
+        except Exception as e:
+            _logger.debug("[MEJORA] No se pudo consultar la cancelación del trabajo %s: %s", job_id, e)
+            return False
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class InstanceLogLine(models.Model):
+    """
+    Entrada del log de una instancia. Reemplaza al campo Html 'log', que se
+    reescribía completo en cada mensaje y se truncaba a 20 kB: aquí cada
+    entrada es una fila y las escrituras se agrupan en un solo create.
+    """
+    _name = 'odoo.docker.instance.log.line'
+    _description = 'Línea de log de instancia Docker'
+    # Por fecha: la salida en vivo de los comandos se guarda en un cursor
+    # propio y llega a la base antes que los mensajes de la transacción.
+    _order = 'timestamp desc, id desc'
+
+    instance_id = fields.Many2one(
+        'odoo.docker.instance',
+        string='Instancia',
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+    timestamp = fields.Datetime(string='Fecha', required=True, index=True, default=fields.Datetime.now)
+    level = fields.Selection([
+        ('debug', 'DEBUG'),
+        ('info', 'INFO'),
+        ('warn', 'WARN'),
+        ('error', 'ERROR'),
+    ], string='Nivel', default='info', required=True, index=True)
+    phase = fields.Char(string='Fase', index=True)
+    message = fields.Text(string='Mensaje')
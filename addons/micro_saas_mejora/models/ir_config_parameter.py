@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+from .odoo_docker_instance_mejora import _INSTANCE_URL_PARAMS
+
+
+class IrConfigParameter(models.Model):
+    """
+    instance_url depende de parámetros del sistema (proxy activo, esquema,
+    dominio base) que @api.depends no puede seguir: al cambiar alguno se
+    recalculan las URLs de todas las instancias.
+    """
+    _inherit = 'ir.config_parameter'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if any(vals.get('key') in _INSTANCE_URL_PARAMS for vals in vals_list):
+            self.env['odoo.docker.instance']._recompute_instance_urls()
+        return records
+
+    def write(self, vals):
+        touched = any(key in _INSTANCE_URL_PARAMS for key in self.mapped('key') + [vals.get('key')])
+        res = super().write(vals)
+        if touched:
+            self.env['odoo.docker.instance']._recompute_instance_urls()
+        return res
+
+    def unlink(self):
+        touched = any(key in _INSTANCE_URL_PARAMS for key in self.mapped('key'))
+        res = super().unlink()
+        if touched:
+            self.env['odoo.docker.instance']._recompute_instance_urls()
+        return res
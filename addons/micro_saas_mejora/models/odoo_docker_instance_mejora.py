@@ -1,20 +1,246 @@
 # -*- coding: utf-8 -*-
+import functools
 import logging
 import os
 import shutil
-import socket
 import subprocess
+import threading
 import time
+import uuid
+from datetime import timedelta
 
-from odoo import models, fields, api
+import psycopg2
+
+from odoo import models, fields, api, Command, SUPERUSER_ID
 from odoo.exceptions import UserError
 
+from ..tools import docker_api
+from ..tools import git as git_tools
+from ..tools import ports as ports_tools
+from ..tools import postgres as pg_tools
+from ..tools import process
+from ..tools import proxy as proxy_tools
+from ..tools import readiness
+from ..tools import resources
+
 _logger = logging.getLogger(__name__)
 
+# Clave del buffer de líneas de log en cr.precommit.data y niveles por prefijo.
+_LOG_BUFFER_KEY = 'micro_saas.log_lines'
+_LOG_LEVEL_PREFIXES = (
+    ('[ERROR]', 'error'),
+    ('[WARN]', 'warn'),
+    ('[INFO]', 'info'),
+    ('[DEBUG]', 'debug'),
+    ('Error', 'error'),
+)
+
+# Salida en vivo de comandos: se escribe en lotes de N líneas o cada N segundos
+# y se avisa por el bus para que el formulario abierto se recargue.
+_LIVE_LOG_FLUSH_LINES = 20
+_LIVE_LOG_FLUSH_SECONDS = 1.0
+_LIVE_LOG_CHANNEL = 'micro_saas.instance_log'
+
+# Límites de los comandos largos: tiempo total y tiempo máximo sin salida.
+_PULL_TIMEOUT = 3600
+_COMPOSE_UP_TIMEOUT = 900
+_COMMAND_IDLE_TIMEOUT = 300
+
+# Cantidad de repositorios que se clonan en paralelo por instancia.
+_DEFAULT_CLONE_WORKERS = 4
+
 # Rango de puertos para instancias hijas.
 # Empieza en 8073 para NO colisionar con el Odoo maestro (8069 HTTP, 8072 longpolling).
 _DEFAULT_PORT_START = 8073
 _DEFAULT_PORT_END = 9999
+# Puertos del Odoo maestro: nunca se asignan a instancias hijas.
+_MASTER_PORTS = (8069, 8071, 8072)
+# Tabla de una sola fila que se actualiza para serializar la asignación de
+# puertos (fuera de ir_config_parameter: no invalida su ormcache).
+_PORT_ALLOCATOR_TABLE = 'micro_saas_port_allocator'
+# Pares descartados por estar ocupados en el SO antes de rendirse.
+_PORT_PROBE_ATTEMPTS = 50
+# Clave de la foto de puertos del host en cr.cache (una por transacción).
+_PORT_SNAPSHOT_KEY = 'micro_saas.port_snapshot'
+
+# Estados con los contenedores arriba: 'starting' (esperando que Odoo
+# responda), 'running' (arriba, sin confirmar por HTTP) y 'ready'.
+_ACTIVE_STATES = ('starting', 'running', 'ready')
+# Plazo de la sonda de disponibilidad tras docker-compose up (segundos).
+_READINESS_TIMEOUT = 300
+# Plazo del único intento que hace la sonda de una instancia ya en 'running'.
+_RECHECK_PROBE_TIMEOUT = 2
+
+# Cluster Postgres compartido: host/puerto vistos desde el maestro (para
+# crear roles y bases) y desde los contenedores (para el odoo.conf).
+_SHARED_PG_DEFAULTS = {
+    'host': 'localhost',
+    'port': '5432',
+    'user': 'postgres',
+    'password': '',
+    'container_host': 'host.docker.internal',
+    'container_port': '',
+    # Conexiones por proceso de Odoo (db_maxconn) de cada instancia y runtime
+    # del cluster: instancias × procesos × db_maxconn debe caber en max_connections.
+    'db_maxconn': '8',
+}
+# db_maxconn de las instancias con Postgres propio.
+_DEDICATED_DB_MAXCONN = 64
+# Valor que muestran los campos calculados en lugar de la contraseña de la base.
+_SECRET_MASK = '********'
+# Archivos que genera render_files y el método que construye cada uno (los
+# mismos que escriben _update_docker_compose_file y _create_odoo_conf).
+_INSTANCE_FILE_BUILDERS = (
+    ('docker-compose.yml', '_get_compose_file_content'),
+    ('odoo.conf', '_get_odoo_conf_content'),
+    ('postgresql.conf', '_get_postgres_conf_content'),
+)
+# Inicialización de una base nueva del cluster (-i <módulos iniciales>).
+_DB_INIT_TIMEOUT = 1800
+# Dominio bajo el que cada base del runtime compartido tiene su subdominio
+# (dbfilter = ^%d$). *.localhost resuelve a 127.0.0.1 en los navegadores.
+_DEFAULT_BASE_DOMAIN = 'localhost'
+
+# Proxy inverso por host (nginx): parámetros micro_saas.proxy_<clave>.
+# Con el proxy activo las instancias no publican puertos: se unen a la red
+# docker `network` y nginx (contenedor `container`, rutas en `conf_dir`)
+# las publica como <subdominio>.<micro_saas.base_domain>.
+_PROXY_DEFAULTS = {
+    'enabled': 'False',
+    'network': 'micro_saas_proxy',
+    'container': 'micro_saas_proxy',
+    'conf_dir': os.path.join('~', 'odoo_docker', 'proxy', 'conf.d'),
+    'scheme': 'http',
+    # Dirección del puerto publicado de nginx vista desde el maestro; vacío:
+    # 127.0.0.1 en el host o el gateway de la red Docker dentro de un contenedor.
+    'probe_host': '',
+    'probe_port': '80',
+    # Logs de acceso por host: carpeta en el host y la misma montada en nginx.
+    'log_dir': os.path.join('~', 'odoo_docker', 'proxy', 'logs'),
+    'container_log_dir': '/var/log/nginx/micro_saas',
+    # Odoo maestro visto desde el contenedor nginx (página de "despertando"):
+    # el puerto que publica el servicio web del docker-compose del repositorio
+    # (8076:8069). En Linux nginx necesita extra_hosts: host.docker.internal:host-gateway.
+    'wake_upstream': 'host.docker.internal:8076',
+}
+# Secreto compartido con nginx para /micro_saas/wake (se genera al primer uso).
+_WAKE_TOKEN_PARAM = 'micro_saas.proxy_wake_token'
+# Marca en cr.postcommit.data: recargar nginx una sola vez tras el commit.
+_PROXY_RELOAD_KEY = 'micro_saas.proxy_reload'
+# Hosts cuyas rutas se borran tras el commit, antes de esa recarga.
+_PROXY_REMOVE_KEY = 'micro_saas.proxy_remove'
+# Parámetros de los que depende instance_url (ver ir_config_parameter.py).
+_INSTANCE_URL_PARAMS = ('micro_saas.proxy_enabled', 'micro_saas.proxy_scheme', 'micro_saas.base_domain')
+
+# Hibernación de instancias inactivas: parámetros micro_saas.hibernate_<clave>.
+# idle_minutes = 0 la desactiva. mode: 'stop' libera la memoria; 'pause'
+# congela los procesos (despierta más rápido pero no libera RAM).
+# min_bytes: tráfico de red mínimo entre dos revisiones para contar como
+# actividad cuando no hay log de acceso del proxy.
+_HIBERNATE_DEFAULTS = {
+    'idle_minutes': '0',
+    'mode': 'stop',
+    'min_bytes': '65536',
+}
+_HIBERNATE_MODES = ('stop', 'pause')
+
+
+def _data_slug(name):
+    """Carpeta de datos derivada del nombre (la regla original de micro_saas)."""
+    return name.replace('.', '_').replace(' ', '_').lower()
+
+
+def _remove_instance_files(name, data_path):
+    """Baja los contenedores (con sus volúmenes) y borra la carpeta de una instancia eliminada."""
+    modified_path = os.path.join(data_path, 'docker-compose.yml')
+    if os.path.exists(modified_path):
+        try:
+            subprocess.run(
+                ['docker-compose', '-f', modified_path, 'down', '-v', '--remove-orphans'],
+                check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60,
+            )
+        except Exception as e:
+            _logger.warning("[MEJORA] Error al detener contenedores de %s: %s", name, str(e))
+    if os.path.exists(data_path):
+        try:
+            shutil.rmtree(data_path)
+        except Exception as e:
+            _logger.warning("[MEJORA] Error al eliminar archivos de %s: %s", name, str(e))
+
+
+def _drop_database_and_role(settings, dbname, role=None):
+    """Elimina una base (y su rol, si se indica) del cluster compartido."""
+    try:
+        with pg_tools.admin_connection(settings['host'], settings['port'], settings['user'],
+                                       settings['password']) as conn:
+            pg_tools.drop_database(conn, dbname)
+            if role:
+                pg_tools.drop_role(conn, role)
+    except psycopg2.Error as e:
+        _logger.warning("[MEJORA] No se pudo eliminar la base %s del cluster compartido: %s", dbname, e)
+
+
+def _port_number(value):
+    """Puerto como entero (los campos http_port/longpolling_port son Char)."""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return 0
+
+
+class _LiveLogWriter:
+    """
+    Recibe líneas de salida de un comando (posiblemente desde varios hilos)
+    y las guarda como odoo.docker.instance.log.line en un cursor propio, en
+    lotes, para que se vean mientras la transacción del trabajo sigue abierta.
+    Cada lote se notifica por el bus (canal micro_saas.instance_log).
+    """
+
+    def __init__(self, instance, phase=None):
+        self.pool = instance.pool
+        self.instance_id = instance.id
+        self.phase = phase or instance.env.context.get('micro_saas_log_phase') or False
+        self.lock = threading.Lock()
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def on_line(self, stream, line, prefix=''):
+        level = 'warn' if stream == 'stderr' and 'error' in line.lower() else 'info'
+        with self.lock:
+            self.pending.append({
+                'instance_id': self.instance_id,
+                'timestamp': fields.Datetime.now(),
+                'level': level,
+                'phase': self.phase,
+                'message': f"{prefix}{line}",
+            })
+            due = (len(self.pending) >= _LIVE_LOG_FLUSH_LINES
+                   or time.monotonic() - self.last_flush >= _LIVE_LOG_FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+        if not rows:
+            return
+        try:
+            with self.pool.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['odoo.docker.instance.log.line'].create(rows)
+                env['bus.bus']._sendone(_LIVE_LOG_CHANNEL, 'micro_saas/instance_log', {
+                    'instance_id': self.instance_id,
+                })
+        except Exception as e:
+            _logger.warning("[MEJORA] No se pudo guardar la salida en vivo de la instancia %s: %s",
+                            self.instance_id, e)
 
 
 class OdooDockerInstanceMejora(models.Model):
@@ -43,71 +269,423 @@ class OdooDockerInstanceMejora(models.Model):
     """
     _inherit = 'odoo.docker.instance'
 
+    state = fields.Selection(
+        selection_add=[('stopped',), ('starting', 'Starting'), ('running',), ('ready', 'Ready'),
+                       ('hibernated', 'Hibernada')],
+        ondelete={'starting': 'set running', 'ready': 'set running', 'hibernated': 'set stopped'},
+    )
+    auto_hibernate = fields.Boolean(
+        string='Hibernar sin uso',
+        default=True,
+        help='Con el proxy inverso y micro_saas.hibernate_idle_minutes > 0, la instancia se '
+             'detiene tras ese tiempo sin pedidos y se vuelve a iniciar con el primer pedido.',
+    )
+    last_activity = fields.Datetime(
+        string='Última actividad',
+        readonly=True,
+        copy=False,
+        help='Última vez que se detectaron pedidos (log del proxy) o tráfico de red.',
+    )
+    activity_counter = fields.Float(
+        string='Contador de actividad',
+        readonly=True,
+        copy=False,
+        help='Tamaño del log de acceso del proxy (o bytes de red) en la última revisión.',
+    )
+    hibernated_at = fields.Datetime(string='Hibernada el', readonly=True, copy=False)
+    is_pool = fields.Boolean(
+        string='En pool',
+        copy=False,
+        readonly=True,
+        index=True,
+        help='Instancia precalentada de su plantilla, todavía sin cliente.',
+    )
+    pool_claimed_at = fields.Datetime(string='Tomada del pool el', readonly=True, copy=False)
+    data_slug = fields.Char(
+        string='Carpeta de datos',
+        copy=False,
+        readonly=True,
+        help='Nombre fijo de la carpeta de la instancia en ~/odoo_docker/data (y del proyecto '
+             'docker compose): renombrar la instancia no la mueve.',
+    )
+    starting_at = fields.Datetime(
+        string='Iniciada el',
+        readonly=True,
+        copy=False,
+        help='Momento en que los contenedores quedaron arriba en el último inicio.',
+    )
+    ready_at = fields.Datetime(
+        string='Lista el',
+        readonly=True,
+        copy=False,
+        help='Momento en que Odoo respondió por HTTP tras el último inicio.',
+    )
+    time_to_ready = fields.Float(
+        string='Tiempo hasta lista (s)',
+        readonly=True,
+        copy=False,
+        help='Segundos entre los contenedores arriba y la primera respuesta HTTP de Odoo.',
+    )
+    db_mode = fields.Selection(
+        related='template_id.db_mode',
+        store=True,
+        readonly=True,
+        required=False,
+    )
+    provisioning_mode = fields.Selection(
+        related='template_id.provisioning_mode',
+        store=True,
+        readonly=True,
+        required=False,
+    )
+    runtime_id = fields.Many2one(
+        'micro.saas.shared.runtime',
+        string='Runtime compartido',
+        copy=False,
+        readonly=True,
+        ondelete='restrict',
+        index=True,
+        help='Odoo compartido que sirve la base de esta instancia (plantillas en modo runtime compartido).',
+    )
+    subdomain = fields.Char(
+        string='Subdominio',
+        copy=False,
+        readonly=True,
+        index=True,
+        help='Etiqueta DNS fija de la instancia: con el proxy inverso se publica como '
+             '<subdominio>.<micro_saas.base_domain>.',
+    )
+    db_name = fields.Char(string='Base de datos', copy=False, readonly=True)
+    db_user = fields.Char(string='Rol de base de datos', copy=False, readonly=True)
+    db_password = fields.Char(copy=False, readonly=True, groups='base.group_system')
+    db_initialized = fields.Boolean(
+        string='Base inicializada',
+        copy=False,
+        readonly=True,
+        help='La base del cluster compartido ya tiene los módulos iniciales instalados '
+             '(por odoo -i o copiada de la base modelo de la plantilla).',
+    )
+    last_seen = fields.Datetime(
+        string='Visto por última vez',
+        readonly=True,
+        help='Última vez que la conciliación encontró los contenedores de la instancia corriendo.',
+    )
+    log_line_ids = fields.One2many('odoo.docker.instance.log.line', 'instance_id', string='Log')
+    job_ids = fields.One2many('micro.saas.instance.job', 'instance_id', string='Trabajos')
+    http_port_number = fields.Integer(
+        string='Puerto HTTP (número)',
+        compute='_compute_port_numbers',
+        store=True,
+        index=True,
+    )
+    longpolling_port_number = fields.Integer(
+        string='Puerto Longpolling (número)',
+        compute='_compute_port_numbers',
+        store=True,
+        index=True,
+    )
+    job_count = fields.Integer(string='Nº de Trabajos', compute='_compute_job_count')
+    pending_job_count = fields.Integer(string='Trabajos en curso', compute='_compute_job_count')
+
+    @api.depends('name', 'data_slug')
+    def _compute_user_path(self):
+        """
+        Override: igual que el original, pero cada instancia renderiza sus
+        propios cuerpos (el original usaba self y fallaba con varios
+        registros). Las plantillas compiladas se cachean por contenido en
+        tools.template, así que cada render es una sola pasada.
+        La carpeta sale de data_slug, fijado al crear: renombrar (p. ej. al
+        tomar una instancia del pool) no deja huérfanos los contenedores.
+        """
+        for instance in self:
+            if not instance.name:
+                continue
+            instance.user_path = os.path.expanduser('~')
+            instance.instance_data_path = os.path.join(instance.user_path, 'odoo_docker', 'data',
+                                                       instance.data_slug or _data_slug(instance.name))
+            instance.result_dc_body = instance._get_formatted_body(template_body=instance.template_dc_body,
+                                                                   demo_fallback=True)
+            instance.result_odoo_conf = instance._get_formatted_body(template_body=instance.template_odoo_conf,
+                                                                     demo_fallback=True)
+
+    @api.depends('http_port', 'runtime_id.http_port', 'db_name', 'subdomain')
+    def _compute_instance_url(self):
+        """
+        Override: con el proxy inverso la URL es el nombre de host de la
+        instancia, sin puerto. Sin proxy, las instancias del runtime
+        compartido usan el subdominio de su base en el puerto del runtime.
+        """
+        if self._is_proxy_enabled():
+            scheme = self._get_proxy_settings()['scheme']
+            routed = self.filtered(lambda i: i._get_public_host())
+            for instance in routed:
+                instance.instance_url = f"{scheme}://{instance._get_public_host()}"
+        else:
+            routed = self.filtered('runtime_id')
+            for instance in routed:
+                instance.instance_url = instance._get_tenant_url()
+        super(OdooDockerInstanceMejora, self - routed)._compute_instance_url()
+
+    @api.depends('http_port', 'longpolling_port')
+    def _compute_port_numbers(self):
+        for instance in self:
+            instance.http_port_number = _port_number(instance.http_port)
+            instance.longpolling_port_number = _port_number(instance.longpolling_port)
+
+    @api.depends('job_ids.state')
+    def _compute_job_count(self):
+        for instance in self:
+            instance.job_count = len(instance.job_ids)
+            instance.pending_job_count = len(instance.job_ids.filtered(
+                lambda j: j.state in ('pending', 'running')
+            ))
+
     # ==========================================
     #  PUERTOS
     # ==========================================
 
     def _get_available_port(self, start_port=_DEFAULT_PORT_START, end_port=_DEFAULT_PORT_END):
         """
-        Busca un puerto disponible que NO esté:
-        - Usado por otra instancia activa
-        - Registrado en el historial de puertos (micro.saas.puerto.usado)
-        - Ocupado a nivel de sistema operativo (socket bind)
+        Devuelve el puerto libre más bajo del rango (ver _find_free_ports).
+        No reserva nada: para asignar puertos a una instancia se usa
+        _allocate_port_pair bajo el lock del asignador.
         """
-        # 1. Puertos de instancias existentes en DB
-        instances = self.env['odoo.docker.instance'].search([])
-        ports_in_use = set()
-        for instance in instances:
-            for port_field in ('http_port', 'longpolling_port'):
-                val = getattr(instance, port_field, None)
-                if val:
-                    try:
-                        ports_in_use.add(int(val))
-                    except (ValueError, TypeError):
-                        pass
-
-        # 2. Puertos registrados históricamente (activos = reservados)
-        puertos_reservados = self.env['micro.saas.puerto.usado'].search([
-            ('activo', '=', True)
-        ])
-        for p in puertos_reservados:
-            ports_in_use.add(p.puerto)
-
-        # 3. Agregar los puertos del Odoo maestro (siempre reservados)
-        ports_in_use.update({8069, 8071, 8072})
+        return self._find_free_ports(1, start_port, end_port)[0]
+
+    def init(self):
+        """Crea la fila del asignador de puertos (ver _lock_port_allocator)."""
+        super().init()
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {_PORT_ALLOCATOR_TABLE} (
+                id integer PRIMARY KEY,
+                seq bigint NOT NULL DEFAULT 0
+            )
+        """)
+        self.env.cr.execute(f"INSERT INTO {_PORT_ALLOCATOR_TABLE} (id, seq) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
 
-        # 4. Buscar un puerto libre
-        for port in range(start_port, end_port + 1):
-            if port in ports_in_use:
-                continue
+    def _lock_port_allocator(self):
+        """
+        Serializa la asignación de puertos: incrementa la única fila de
+        micro_saas_port_allocator, lo que la deja bloqueada hasta el final de
+        la transacción. Con el aislamiento REPEATABLE READ de Odoo, si otra
+        transacción asignó puertos después de nuestro snapshot, PostgreSQL
+        lanza un error de serialización y Odoo reintenta la petición con
+        datos frescos (un pg_advisory_xact_lock no lo haría: esperaría y
+        seguiría con el snapshot viejo). No se toca ir_config_parameter,
+        así que su caché no se invalida en cada alta.
+        """
+        self.env.cr.execute(f"UPDATE {_PORT_ALLOCATOR_TABLE} SET seq = seq + 1 WHERE id = 1")
 
-            # Verificar a nivel de SO
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            try:
-                sock.bind(("0.0.0.0", port))
-                return port
-            except (OSError, socket.error):
-                continue
-            finally:
-                sock.close()
+    def _find_free_ports(self, count, start_port=_DEFAULT_PORT_START, end_port=_DEFAULT_PORT_END, exclude=()):
+        """
+        Primer bloque de `count` puertos consecutivos libres del rango, con una
+        sola consulta sobre las columnas indexadas: puertos de instancias,
+        reservas activas de micro.saas.puerto.usado, puertos del maestro y
+        `exclude`. Los huecos entre puertos usados se obtienen con lead().
+        """
+        self.flush_model(['http_port_number', 'longpolling_port_number'])
+        self.env['micro.saas.puerto.usado'].flush_model(['puerto', 'activo'])
+        self.env.cr.execute("""
+            WITH used AS (
+                SELECT http_port_number AS port FROM odoo_docker_instance
+                 WHERE http_port_number BETWEEN %(start)s AND %(end)s
+                UNION
+                SELECT longpolling_port_number FROM odoo_docker_instance
+                 WHERE longpolling_port_number BETWEEN %(start)s AND %(end)s
+                UNION
+                SELECT puerto FROM micro_saas_puerto_usado
+                 WHERE activo AND puerto BETWEEN %(start)s AND %(end)s
+                UNION
+                SELECT port FROM unnest(%(reserved)s::int[]) AS port
+                 WHERE port BETWEEN %(start)s AND %(end)s
+                UNION
+                SELECT %(start)s - 1
+                UNION
+                SELECT %(end)s + 1
+            ), gaps AS (
+                SELECT port, lead(port) OVER (ORDER BY port) AS next_port FROM used
+            )
+            SELECT port + 1 FROM gaps
+             WHERE next_port - port > %(count)s
+             ORDER BY port
+             LIMIT 1
+        """, {
+            'start': start_port,
+            'end': end_port,
+            'count': count,
+            'reserved': list(_MASTER_PORTS) + list(exclude),
+        })
+        row = self.env.cr.fetchone()
+        if not row:
+            raise UserError(
+                'No se encontraron puertos disponibles en el rango %d-%d. '
+                'Libera puertos desde el menú de Puertos Usados o amplía el rango.'
+                % (start_port, end_port)
+            )
+        return list(range(row[0], row[0] + count))
 
+    def _allocate_port_pair(self, exclude=(), start_port=_DEFAULT_PORT_START, end_port=_DEFAULT_PORT_END):
+        """
+        Par (HTTP, Longpolling) consecutivo y libre. Debe llamarse con el lock
+        del asignador tomado (_lock_port_allocator) y la reserva debe quedar en
+        la misma transacción. Los pares ocupados a nivel de SO se descartan.
+        """
+        exclude = set(exclude)
+        snapshot = self._get_port_snapshot()
+        for _attempt in range(_PORT_PROBE_ATTEMPTS):
+            http_port, longpolling_port = self._find_free_ports(2, start_port, end_port, exclude)
+            busy = [port for port in (http_port, longpolling_port) if not snapshot.is_free(port)]
+            if not busy:
+                return http_port, longpolling_port
+            exclude.update(busy)
         raise UserError(
-            'No se encontraron puertos disponibles en el rango %d-%d. '
-            'Libera puertos desde el menú de Puertos Usados o amplía el rango.'
+            'No se encontró un par de puertos libres a nivel de sistema operativo en el rango %d-%d.'
             % (start_port, end_port)
         )
 
+    def _ports_taken(self, ports):
+        """Puertos de `ports` ya asignados a otra instancia o reservados."""
+        self.flush_model(['http_port_number', 'longpolling_port_number'])
+        self.env['micro.saas.puerto.usado'].flush_model(['puerto', 'activo'])
+        ports = list(ports)
+        self.env.cr.execute("""
+            SELECT http_port_number FROM odoo_docker_instance WHERE http_port_number = ANY(%(ports)s)
+            UNION
+            SELECT longpolling_port_number FROM odoo_docker_instance WHERE longpolling_port_number = ANY(%(ports)s)
+            UNION
+            SELECT puerto FROM micro_saas_puerto_usado WHERE activo AND puerto = ANY(%(ports)s)
+        """, {'ports': ports})
+        return {row[0] for row in self.env.cr.fetchall()} | (set(ports) & set(_MASTER_PORTS))
+
+    def _get_reserved_ports(self, start_port=_DEFAULT_PORT_START, end_port=_DEFAULT_PORT_END):
+        """Puertos del rango asignados a instancias, reservados o del maestro (una consulta)."""
+        self.flush_model(['http_port_number', 'longpolling_port_number'])
+        self.env['micro.saas.puerto.usado'].flush_model(['puerto', 'activo'])
+        self.env.cr.execute("""
+            SELECT http_port_number FROM odoo_docker_instance
+             WHERE http_port_number BETWEEN %(start)s AND %(end)s
+            UNION
+            SELECT longpolling_port_number FROM odoo_docker_instance
+             WHERE longpolling_port_number BETWEEN %(start)s AND %(end)s
+            UNION
+            SELECT puerto FROM micro_saas_puerto_usado
+             WHERE activo AND puerto BETWEEN %(start)s AND %(end)s
+        """, {'start': start_port, 'end': end_port})
+        return {row[0] for row in self.env.cr.fetchall()} | set(_MASTER_PORTS)
+
+    def _get_port_snapshot(self):
+        """
+        Puertos en escucha del host (/proc/net/tcp{,6} más los publicados por
+        Docker), leídos una sola vez por transacción y guardados en cr.cache.
+        Sin /proc, la foto cae en pruebas de bind puerto por puerto.
+        """
+        snapshot = self.env.cr.cache.get(_PORT_SNAPSHOT_KEY)
+        if snapshot is None:
+            busy = ports_tools.listening_ports()
+            client = self._get_docker_client() if busy is not None else None
+            if client:
+                try:
+                    busy |= ports_tools.published_ports(client.list_containers(all=False))
+                except docker_api.DockerAPIError as e:
+                    _logger.debug("[MEJORA] No se pudieron leer los puertos publicados por Docker: %s", e)
+            snapshot = self.env.cr.cache[_PORT_SNAPSHOT_KEY] = ports_tools.PortSnapshot(busy)
+        return snapshot
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Reserva el par de puertos al crear, bajo el lock del asignador. Los
+        puertos que propone el onchange son solo una vista previa: si otra
+        instancia los tomó mientras tanto, se asigna un par nuevo. Las
+        instancias del runtime compartido, y todas con el proxy inverso
+        activo, no reservan puertos. Cada instancia recibe su subdominio y
+        su carpeta de datos fija.
+        """
+        for vals in vals_list:
+            if vals.get('name') and not vals.get('data_slug'):
+                vals['data_slug'] = _data_slug(vals['name'])
+        shared_templates = set(self.env['docker.compose.template'].browse(
+            {vals['template_id'] for vals in vals_list if vals.get('template_id')}
+        ).filtered(lambda t: t.provisioning_mode == 'shared_runtime').ids)
+        proxy_enabled = self._is_proxy_enabled()
+        if not proxy_enabled and any(vals.get('template_id') not in shared_templates for vals in vals_list):
+            self._lock_port_allocator()
+        taken_in_batch = set()
+        reassigned = []
+        for index, vals in enumerate(vals_list):
+            if proxy_enabled or vals.get('template_id') in shared_templates:
+                vals.update({'http_port': False, 'longpolling_port': False})
+                continue
+            ports = (_port_number(vals.get('http_port')), _port_number(vals.get('longpolling_port')))
+            if not all(ports) or ports[0] == ports[1] or self._ports_taken(ports) or taken_in_batch & set(ports):
+                ports = self._allocate_port_pair(exclude=taken_in_batch)
+                vals.update({'http_port': str(ports[0]), 'longpolling_port': str(ports[1])})
+                reassigned.append(index)
+            taken_in_batch.update(ports)
+
+        instances = super().create(vals_list)
+        for index in reassigned:
+            instances[index]._sync_port_variables()
+        for instance in instances:
+            instance._registrar_puertos()
+        instances._ensure_subdomain()
+        return instances
+
+    def write(self, vals):
+        """
+        Override: al renombrar se conserva la carpeta de datos. Las
+        instancias creadas antes de data_slug lo fijan con el nombre anterior.
+        """
+        if vals.get('name'):
+            for instance in self.filtered(lambda i: i.name and not i.data_slug):
+                super(OdooDockerInstanceMejora, instance).write({'data_slug': _data_slug(instance.name)})
+        return super().write(vals)
+
+    def _ensure_ports(self):
+        """
+        Asigna y reserva el par de puertos a las instancias que todavía no
+        tienen (creadas antes del asignador o sin puertos válidos). Se llama
+        al encolar el primer inicio; las demás ya se reservaron en create.
+        Con el proxy inverso activo no se asignan puertos.
+        """
+        if self._is_proxy_enabled():
+            return
+        missing = self.filtered(lambda i: i.provisioning_mode != 'shared_runtime'
+                                and not (i.http_port_number and i.longpolling_port_number))
+        if not missing:
+            return
+        self._lock_port_allocator()
+        for instance in missing:
+            http_port, longpolling_port = instance._allocate_port_pair()
+            instance.write({'http_port': str(http_port), 'longpolling_port': str(longpolling_port)})
+            instance._sync_port_variables()
+            instance._registrar_puertos()
+            instance.add_to_log(f"[INFO] 🔌 Puertos asignados: HTTP {http_port}, Longpolling {longpolling_port}")
+
+    def _sync_port_variables(self):
+        """Copia los puertos a las variables {{HTTP-PORT}} / {{LONGPOLLING-PORT}}."""
+        for instance in self:
+            for name, value in (('{{HTTP-PORT}}', instance.http_port),
+                                ('{{LONGPOLLING-PORT}}', instance.longpolling_port)):
+                variables = instance.variable_ids.filtered(lambda v, name=name: v.name == name)
+                if variables:
+                    variables.write({'demo_value': value})
+
     @api.onchange('name')
     def onchange_name(self):
-        """Asigna puertos al cambiar nombre. Manejo seguro contra None."""
-        if not self.name:
+        """
+        Propone un par de puertos la primera vez que se escribe el nombre
+        (vista previa, sin reservar: la reserva se hace en create o, para
+        instancias sin puertos, en el primer inicio). Si el formulario ya
+        tiene puertos no se vuelve a consultar, y renombrar una instancia
+        guardada nunca le cambia los puertos. Manejo seguro contra None.
+        """
+        if not self.name or (self.http_port and self.longpolling_port) \
+                or self.template_id.provisioning_mode == 'shared_runtime' or self._is_proxy_enabled():
             return
         try:
-            http_port = self._get_available_port()
+            http_port, longpolling_port = self._find_free_ports(2)
             self.http_port = str(http_port)
-            # Longpolling = siguiente puerto disponible
-            longpolling_port = self._get_available_port(http_port + 1)
             self.longpolling_port = str(longpolling_port)
         except Exception as e:
             _logger.warning("Error asignando puertos automáticamente: %s", str(e))
@@ -131,6 +709,10 @@ class OdooDockerInstanceMejora(models.Model):
         Al seleccionar un template, copiar variables como registros NUEVOS
         (no por referencia) para evitar borrar las del template original.
         """
+        if self.template_id.provisioning_mode == 'shared_runtime':
+            # Usa los puertos del runtime compartido: se descarta la vista previa
+            self.http_port = ''
+            self.longpolling_port = ''
         if self.template_id:
             self.template_dc_body = self.template_id.template_dc_body
             self.template_odoo_conf = self.template_id.template_odoo_conf
@@ -201,6 +783,8 @@ class OdooDockerInstanceMejora(models.Model):
                 ('puerto', '=', puerto_int),
                 ('tipo', '=', tipo),
             ], limit=1)
+            if existente.activo and existente.instancia_nombre == self.name:
+                continue  # ya reservado para esta instancia (en create)
             if not existente:
                 PuertoUsado.create({
                     'puerto': puerto_int,
@@ -227,20 +811,12 @@ class OdooDockerInstanceMejora(models.Model):
         Si están ocupados, intenta identificar qué los usa.
         """
         self.ensure_one()
+        snapshot = self._get_port_snapshot()
         for port_field, label in [('http_port', 'HTTP'), ('longpolling_port', 'Longpolling')]:
-            val = getattr(self, port_field, None)
-            if not val:
-                continue
-            try:
-                port = int(val)
-            except (ValueError, TypeError):
+            port = _port_number(getattr(self, port_field, None))
+            if not port:
                 continue
-
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            try:
-                sock.bind(("0.0.0.0", port))
-            except (OSError, socket.error):
+            if not snapshot.is_free(port):
                 raise UserError(
                     'El puerto %s (%d) ya está en uso por otro proceso en tu sistema. '
                     'Esto puede deberse a:\n'
@@ -250,8 +826,83 @@ class OdooDockerInstanceMejora(models.Model):
                     'Solución: Asigna otro puerto diferente o detén el proceso '
                     'que lo está usando.' % (label, port)
                 )
-            finally:
-                sock.close()
+
+    # ==========================================
+    #  CLONADO DE REPOSITORIOS
+    # ==========================================
+
+    def _get_clone_workers(self):
+        param = self.env['ir.config_parameter'].sudo().get_param('micro_saas.git_clone_workers')
+        try:
+            return max(1, int(param or _DEFAULT_CLONE_WORKERS))
+        except (ValueError, TypeError):
+            return _DEFAULT_CLONE_WORKERS
+
+    def _clone_repositories(self):
+        """
+        Override: sincroniza todas las líneas de la instancia en paralelo con
+        un pool acotado (micro_saas.git_clone_workers).
+
+        - Sin checkout en disco: clonado (desde el mirror local si la caché
+          está activa).
+        - Con un repositorio git ya en la carpeta (aunque is_clone no esté
+          marcado): actualización incremental. Si el commit remoto no
+          cambió no se descarga nada.
+
+        El resultado de cada línea (commit, duración y error) se escribe de
+        vuelta en repository.repo.line. Devuelve True si algún checkout cambió.
+        """
+        any_changed = False
+        for instance in self:
+            lines = instance.repository_line.filtered(lambda l: l.repository_id.name and l.name)
+            if not lines:
+                continue
+            addons_dir = os.path.join(instance.instance_data_path, "addons")
+            instance._makedirs(addons_dir)
+
+            specs = [{
+                'url': line.repository_id.name,
+                'branch': line.name,
+                'path': os.path.join(addons_dir, instance._get_repo_name(line)),
+                'shallow': line.repository_id.shallow_clone,
+                'mirror': line.repository_id._get_mirror_path(),
+            } for line in lines]
+            instance.add_to_log(f"[INFO] 📦 Sincronizando {len(specs)} repositorio(s)...")
+            with _LiveLogWriter(instance) as live:
+                for spec in specs:
+                    prefix = f"[{os.path.basename(spec['path'])}] "
+                    spec['on_line'] = lambda stream, text, prefix=prefix: live.on_line(stream, text, prefix)
+                results = git_tools.run_parallel(git_tools.sync, specs, self._get_clone_workers())
+
+            for line, spec, result in zip(lines, specs, results):
+                repo = line.repository_id
+                if result['from_mirror'] and (result['mirror_fetched'] or repo.mirror_path != spec['mirror']):
+                    repo_vals = {'mirror_path': spec['mirror'], 'mirror_error': False}
+                    if result['mirror_fetched'] or not repo.mirror_last_fetch:
+                        repo_vals['mirror_last_fetch'] = fields.Datetime.now()
+                    repo.write(repo_vals)
+                vals = {'clone_error': result['error'], 'clone_duration': result['duration']}
+                if result['ok']:
+                    vals.update({'is_clone': True, 'commit_sha': result['sha']})
+                    any_changed = any_changed or result['changed']
+                line.write(vals)
+                repo_label = f"{line.repository_id.name} (Branch: {line.name})"
+                if not result['ok']:
+                    instance.add_to_log(f"[ERROR] Error to clone repository: {repo_label}")
+                    instance.add_to_log("[ERROR]  " + result['error'])
+                elif not result['changed']:
+                    instance.add_to_log(f"[INFO] Repositorio sin cambios: {repo_label} @ {(result['sha'] or '')[:8]}")
+                elif result['updated']:
+                    instance.add_to_log(
+                        f"[INFO] Repositorio actualizado: {repo_label} @ {(result['sha'] or '')[:8]} "
+                        f"en {result['duration']}s"
+                    )
+                else:
+                    instance.add_to_log(
+                        f"[INFO] Repository cloned: {repo_label} @ {(result['sha'] or '')[:8]} "
+                        f"en {result['duration']}s"
+                    )
+        return any_changed
 
     # ==========================================
     #  PRE-PULL DE IMAGEN DOCKER
@@ -280,20 +931,23 @@ class OdooDockerInstanceMejora(models.Model):
         )
 
         try:
-            result = subprocess.run(
-                f'docker pull {image_name}',
-                shell=True,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=900  # 15 minutos máximo
-            )
-            self.add_to_log(f"[INFO] ✅ Imagen {image_name} descargada correctamente312312321321")
-        except subprocess.TimeoutExpired:
-            self.add_to_log(
-                f"[WARN] ⏰ La descarga de {image_name} tardó más de 15 minutos. "
-                f"Verifique su conexión a internet."
-            )
+            result = self._run_command_live(['docker', 'pull', image_name], timeout=_PULL_TIMEOUT)
+            if result.cancelled:
+                raise UserError("Inicio cancelado durante la descarga de la imagen.")
+            if result.ok:
+                self.add_to_log(f"[INFO] ✅ Imagen {image_name} descargada correctamente en {result.duration}s")
+            elif result.timed_out or result.idle_timed_out:
+                self.add_to_log(
+                    f"[WARN] ⏰ La descarga de {image_name} se detuvo: {result.error_text()}. "
+                    f"Verifique su conexión a internet."
+                )
+            else:
+                self.add_to_log(
+                    f"[WARN] ⚠️ No se pudo descargar {image_name} previamente: {result.error_text()[:500]}. "
+                    f"Docker compose intentará descargarla al iniciar."
+                )
+        except UserError:
+            raise
         except Exception as e:
             self.add_to_log(
                 f"[WARN] ⚠️ No se pudo descargar {image_name} previamente: {str(e)}. "
@@ -327,41 +981,1073 @@ class OdooDockerInstanceMejora(models.Model):
             _logger.warning("[MEJORA] No se pudieron limpiar contenedores previos: %s", str(e))
 
     # ==========================================
-    #  START INSTANCE (OVERRIDE COMPLETO)
+    #  COLA DE TRABAJOS
     # ==========================================
 
     def start_instance(self):
+        """
+        Override: encola el inicio en micro.saas.instance.job y regresa de
+        inmediato. El trabajo real lo hace _do_start_instance en el worker.
+        Las instancias sin puertos los reservan aquí, en una transacción
+        corta, y no dentro del trabajo (que mantendría el lock del asignador).
+        """
+        self._ensure_ports()
+        self._ensure_subdomain()
+        self._ensure_shared_runtime()
+        jobs = self.env['micro.saas.instance.job']._enqueue(self, 'start')
+        return self._job_enqueued_notification(jobs)
+
+    def stop_instance(self):
+        """Override: encola la detención de las instancias que están corriendo o hibernadas."""
+        instances = self.filtered(lambda i: i.state in _ACTIVE_STATES + ('hibernated',))
+        jobs = self.env['micro.saas.instance.job']._enqueue(instances, 'stop')
+        return self._job_enqueued_notification(jobs)
+
+    def restart_instance(self):
+        """Override: encola el reinicio de las instancias que están corriendo."""
+        instances = self.filtered(lambda i: i.state in _ACTIVE_STATES)
+        jobs = self.env['micro.saas.instance.job']._enqueue(instances, 'restart')
+        return self._job_enqueued_notification(jobs)
+
+    def _job_enqueued_notification(self, jobs):
+        if not jobs:
+            message = 'No hay instancias en un estado válido para esta operación.'
+        elif len(jobs) == 1:
+            message = f'"{jobs.name}" quedó en cola. Puedes seguir el avance en la pestaña Trabajos.'
+        else:
+            message = f'{len(jobs)} trabajos quedaron en cola.'
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Operación encolada',
+                'message': message,
+                'type': 'info' if jobs else 'warning',
+                'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
+
+    # ==========================================
+    #  ACCIONES MASIVAS
+    # ==========================================
+
+    def bulk_lifecycle(self, operation, max_concurrency=None):
+        """
+        API: encola `operation` ('start', 'stop' o 'restart') para todas las
+        instancias del recordset en un lote con concurrencia acotada.
+        Devuelve el id del lote; su avance se consulta con
+        micro.saas.instance.job.batch.get_report().
+        """
+        if operation == 'start':
+            instances = self.filtered(lambda i: i.state not in _ACTIVE_STATES)
+            instances._ensure_ports()
+            instances._ensure_subdomain()
+            instances._ensure_shared_runtime()
+        else:
+            instances = self.filtered(lambda i: i.state in _ACTIVE_STATES)
+        labels = dict(self.env['micro.saas.instance.job']._fields['operation'].selection)
+        vals = {
+            'name': f"{labels[operation]} {len(instances)} instancia(s) - {fields.Datetime.now()}",
+            'operation': operation,
+        }
+        if max_concurrency:
+            vals['max_concurrency'] = max_concurrency
+        batch = self.env['micro.saas.instance.job.batch'].sudo().create(vals).sudo(False)
+        self.env['micro.saas.instance.job']._enqueue(instances, operation, batch=batch)
+        return batch.id
+
+    def _action_bulk(self, operation):
+        batch_id = self.bulk_lifecycle(operation)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Lote de Trabajos',
+            'res_model': 'micro.saas.instance.job.batch',
+            'view_mode': 'form',
+            'res_id': batch_id,
+            'target': 'current',
+        }
+
+    def action_bulk_start(self):
+        return self._action_bulk('start')
+
+    def action_bulk_stop(self):
+        return self._action_bulk('stop')
+
+    def action_bulk_restart(self):
+        return self._action_bulk('restart')
+
+    def _set_job_progress(self, progress, message):
+        """Reporta el avance al trabajo en curso (si se ejecuta desde la cola)."""
+        job_id = self.env.context.get('micro_saas_job_id')
+        if job_id:
+            self.env['micro.saas.instance.job']._report_progress(job_id, progress, message)
+
+    def _is_job_cancel_requested(self):
+        """True si el trabajo en curso (contexto micro_saas_job_id) pidió cancelar."""
+        job_id = self.env.context.get('micro_saas_job_id')
+        return bool(job_id) and self.env['micro.saas.instance.job']._is_cancel_requested(job_id)
+
+    def _run_command_live(self, args, cwd=None, timeout=None, idle_timeout=_COMMAND_IDLE_TIMEOUT):
+        """
+        Ejecuta un comando largo mostrando su salida en el log de la instancia
+        mientras corre (ver tools.process.stream_command). Si se ejecuta desde
+        la cola, el comando se detiene cuando se cancela el trabajo.
+        Devuelve el process.CommandResult.
+        """
+        self.ensure_one()
+        should_cancel = self._is_job_cancel_requested if self.env.context.get('micro_saas_job_id') else None
+        with _LiveLogWriter(self) as live:
+            return process.stream_command(
+                args,
+                cwd=cwd,
+                on_line=live.on_line,
+                timeout=timeout,
+                idle_timeout=idle_timeout,
+                should_cancel=should_cancel,
+            )
+
+    def action_view_jobs(self):
+        """Acción para el Smart Button de Trabajos."""
+        self.ensure_one()
+        return {
+            'name': 'Trabajos de Instancia',
+            'type': 'ir.actions.act_window',
+            'res_model': 'micro.saas.instance.job',
+            'view_mode': 'tree,form',
+            'domain': [('instance_id', '=', self.id)],
+            'context': {'default_instance_id': self.id},
+        }
+
+    # ==========================================
+    #  CLUSTER POSTGRES COMPARTIDO
+    # ==========================================
+
+    def _is_shared_db(self):
+        self.ensure_one()
+        return self.db_mode == 'shared'
+
+    @api.model
+    def _get_shared_pg_settings(self):
+        """Parámetros micro_saas.shared_pg_* con sus valores por defecto."""
+        params = self.env['ir.config_parameter'].sudo()
+        settings = {
+            key: params.get_param(f'micro_saas.shared_pg_{key}') or default
+            for key, default in _SHARED_PG_DEFAULTS.items()
+        }
+        settings['container_port'] = settings['container_port'] or settings['port']
+        return settings
+
+    def _shared_pg_connection(self, dbname='postgres'):
+        settings = self._get_shared_pg_settings()
+        return pg_tools.admin_connection(settings['host'], settings['port'], settings['user'], settings['password'],
+                                         dbname=dbname)
+
+    def _ensure_shared_database(self):
+        """
+        Modo cluster compartido: crea (si faltan) el rol y la base de la
+        instancia y vuelca sus datos de conexión a las variables {{DB_*}}.
+        El nombre se fija la primera vez y no cambia al renombrar la instancia.
+        """
+        self.ensure_one()
+        instance = self.sudo()
+        vals = {}
+        if not instance.db_name:
+            vals['db_name'] = pg_tools.identifier(f"{instance.id}_{instance.name}")
+        if not instance.db_user:
+            vals['db_user'] = vals.get('db_name') or instance.db_name
+        if not instance.db_password:
+            vals['db_password'] = pg_tools.new_password()
+        if vals:
+            instance.write(vals)
+        try:
+            with self._shared_pg_connection() as conn:
+                pg_tools.ensure_role(conn, instance.db_user, instance.db_password)
+                created = pg_tools.ensure_database(conn, instance.db_name, instance.db_user)
+        except psycopg2.Error as e:
+            raise UserError(f"No se pudo preparar la base en el cluster Postgres compartido: {e}")
+        if created:
+            instance.db_initialized = False
+            self.add_to_log(f"[INFO] 🐘 Base '{instance.db_name}' y rol creados en el cluster compartido.")
+        self._scrub_db_password_variables()
+
+    def _scrub_db_password_variables(self):
+        """
+        Las versiones anteriores copiaban la contraseña del rol en el valor
+        de ejemplo de {{DB_PASSWORD}}, visible para quien lee la instancia:
+        se borra (ahora se resuelve al renderizar, ver _get_variable_values).
+        """
+        for instance in self.sudo():
+            instance.variable_ids.filtered(
+                lambda v: v.name == '{{DB_PASSWORD}}' and v.demo_value and v.demo_value == instance.db_password
+            ).write({'demo_value': False})
+
+    def _get_variable_values(self, demo_fallback=False, resolve_fields=False):
+        """
+        Override: en el cluster compartido las variables {{DB_*}} se resuelven
+        al renderizar con los datos de conexión de la instancia. La
+        contraseña (solo group_system) no se guarda en las variables: solo se
+        escribe en los archivos generados (contexto micro_saas_render_secrets)
+        y los campos calculados muestran una máscara.
+        """
+        values = super()._get_variable_values(demo_fallback, resolve_fields)
+        instance = self.sudo()
+        if instance.db_mode == 'shared' and not instance.runtime_id and instance.db_name:
+            settings = self._get_shared_pg_settings()
+            values.update({
+                '{{DB_HOST}}': settings['container_host'],
+                '{{DB_PORT}}': settings['container_port'],
+                '{{DB_USER}}': instance.db_user or '',
+                '{{DB_PASSWORD}}': (instance.db_password or '') if self.env.context.get('micro_saas_render_secrets')
+                                   else _SECRET_MASK,
+                '{{DB_NAME}}': instance.db_name,
+            })
+        return values
+
+    def _get_db_maxconn(self):
+        """
+        db_maxconn del odoo.conf: micro_saas.shared_pg_db_maxconn en el
+        cluster compartido (las conexiones de todas las instancias suman
+        contra su max_connections), 64 con Postgres propio.
+        """
+        self.ensure_one()
+        if not self._is_shared_db():
+            return _DEDICATED_DB_MAXCONN
+        try:
+            return max(2, int(self._get_shared_pg_settings()['db_maxconn']))
+        except (ValueError, TypeError):
+            return int(_SHARED_PG_DEFAULTS['db_maxconn'])
+
+    def _get_init_modules(self):
+        """Módulos de la plantilla que se instalan en una base nueva (lista separada por comas)."""
+        self.ensure_one()
+        modules = (self.template_id.db_init_modules or '').replace(' ', '').strip(',')
+        return modules or 'base'
+
+    def _run_database_init(self, modified_path, modules, db_args=(), conf=None):
+        """
+        Instala `modules` con un contenedor de un solo uso del servicio de
+        Odoo (docker-compose run --rm ... --stop-after-init). `db_args`
+        cambia la base que toma del odoo.conf; `conf` es la ruta en el
+        contenedor de un odoo.conf alternativo (p. ej. con otro rol, ver
+        resources.temporary_conf). Devuelve True si terminó bien.
+        """
+        self.ensure_one()
+        services = resources.service_names(self._get_compose_file_content(), self._is_odoo_service)
+        if not services:
+            self.add_to_log("[ERROR] ❌ El docker-compose no tiene un servicio de Odoo para inicializar la base.")
+            return False
+        run_args = ['-e', f'ODOO_RC={conf}'] if conf else []
+        result = self._run_command_live(
+            ['docker-compose', '-f', modified_path, 'run', '--rm', *run_args, services[0],
+             'odoo', *db_args, '-i', modules, '--without-demo=all', '--stop-after-init'],
+            timeout=_DB_INIT_TIMEOUT,
+        )
+        if result.cancelled:
+            raise UserError("Inicio cancelado durante la inicialización de la base.")
+        if not result.ok:
+            self.add_to_log(f"[ERROR] ❌ No se pudo inicializar la base: {result.error_text()[-1000:]}")
+            return False
+        return True
+
+    def _initialize_database(self, modified_path, db_args=()):
+        """
+        Instala los módulos iniciales de la plantilla en la base recién
+        creada con un contenedor de un solo uso. Sin esto Odoo no inicializa
+        una base vacía y list_db está desactivado.
+        Devuelve False si falló (la instancia queda en error).
+        """
+        self.ensure_one()
+        modules = self._get_init_modules()
+        self._set_job_progress(60, 'Inicializando base de datos')
+        self.add_to_log(f"[INFO] 🐘 Inicializando la base '{self.sudo().db_name}' (módulos: {modules})...")
+        if not self._run_database_init(modified_path, modules, db_args):
+            self.write({'state': 'error'})
+            return False
+        self.sudo().db_initialized = True
+        self.add_to_log("[INFO] ✅ Base inicializada.")
+        return True
+
+    def _get_pool_db_args(self):
+        """
+        Instancia del pool con Postgres propio: fija el nombre de su base y
+        devuelve los argumentos de odoo que la crean (-d crea la base si no
+        existe). Es la base que recibe el cliente; no cambia al tomarla.
+        """
+        self.ensure_one()
+        instance = self.sudo()
+        if not instance.db_name:
+            instance.db_name = pg_tools.database_label(instance.template_id.name or 'odoo', f"-{instance.id}")
+        return ('-d', instance.db_name)
+
+    def _restore_golden_snapshot(self, modified_path=None):
+        """
+        Base nueva del cluster compartido como copia de la base modelo de la
+        plantilla (micro.saas.golden.snapshot), construida aquí si falta o
+        cambió la imagen, los repositorios o los módulos de la plantilla.
+        Sirve para las instancias con contenedor propio (`modified_path`) y
+        para las del runtime compartido. La construcción corre con el rol
+        de la base modelo desde un odoo.conf temporal, no por argumentos.
+        Devuelve False si hay que inicializar la base de cero.
+        """
+        self.ensure_one()
+        if not self.template_id.use_golden_snapshot:
+            return False
+        instance = self.sudo()
+        Snapshot = self.env['micro.saas.golden.snapshot']
+        modules = self._get_init_modules()
+        runtime = instance.runtime_id
+        # Solo entradas de la plantilla: repositorios propios de una
+        # instancia no deben invalidar la base modelo de las demás.
+        repositories = [f"{line.repository_id.name}@{line.name}" for line in instance.template_id.repository_line]
+        if runtime:
+            owner = runtime.db_user
+            source_hash = Snapshot._source_hash(runtime._get_compose_content(), modules, repositories)
+
+            def build(golden_db, role, password):
+                etc_dir = os.path.join(runtime.data_path, 'etc')
+                options = {'db_user': role, 'db_password': password}
+                with resources.temporary_conf(etc_dir, runtime._get_conf_content(), options) as conf:
+                    if not runtime._initialize_database(self, golden_db, modules, conf=conf):
+                        return None
+                return os.path.join(runtime.data_path, 'data', 'filestore', golden_db)
+        else:
+            owner = instance.db_user
+            source_hash = Snapshot._source_hash(self._get_compose_file_content(), modules, repositories)
+
+            def build(golden_db, role, password):
+                etc_dir = os.path.join(self.instance_data_path, 'etc')
+                options = {'db_user': role, 'db_password': password}
+                with resources.temporary_conf(etc_dir, self._get_odoo_conf_content(), options) as conf:
+                    if not self._run_database_init(modified_path, modules, ('-d', golden_db), conf=conf):
+                        return None
+                return os.path.join(self.instance_data_path, 'data', 'filestore', golden_db)
+
+        self._set_job_progress(60, 'Copiando base modelo')
+        if not Snapshot._provision(self, instance.db_name, owner, source_hash, modules, build):
+            return False
+        instance.db_initialized = True
+        return True
+
+    def _drop_shared_database(self):
+        """
+        Programa la eliminación de la base y el rol de la instancia en el
+        cluster compartido para después del commit: si la transacción se
+        revierte, la base sigue ahí.
+        """
+        self.ensure_one()
+        instance = self.sudo()
+        if not instance.db_name:
+            return
+        self.env.cr.postcommit.add(functools.partial(
+            _drop_database_and_role, self._get_shared_pg_settings(), instance.db_name, instance.db_user,
+        ))
+
+    # ==========================================
+    #  RUNTIME ODOO COMPARTIDO (MULTI-BASE)
+    # ==========================================
+
+    def _is_runtime_tenant(self):
+        self.ensure_one()
+        return self.provisioning_mode == 'shared_runtime'
+
+    @api.model
+    def _get_base_domain(self):
+        params = self.env['ir.config_parameter'].sudo()
+        return (params.get_param('micro_saas.base_domain') or _DEFAULT_BASE_DOMAIN).strip('.')
+
+    def _get_public_host(self):
+        """
+        Nombre de host de la instancia: <subdominio>.<micro_saas.base_domain>.
+        En el runtime compartido el subdominio es el nombre de la base
+        (dbfilter = ^%d$).
+        """
+        self.ensure_one()
+        label = self.db_name if self.runtime_id else self.subdomain
+        return f"{label}.{self._get_base_domain()}" if label else False
+
+    def _get_tenant_url(self):
+        self.ensure_one()
+        host = self._get_public_host()
+        if not host or not self.runtime_id.http_port:
+            return False
+        return f"http://{host}:{self.runtime_id.http_port}"
+
+    def _ensure_shared_runtime(self):
+        """
+        Asigna el runtime de la plantilla (creándolo si falta) y el nombre de
+        la base a las instancias en modo runtime compartido. Se llama al
+        encolar el inicio, en una transacción corta, como _ensure_ports. El
+        nombre de la base es una etiqueta DNS (dbfilter la toma del
+        subdominio) y no cambia al renombrar la instancia.
+        """
+        Runtime = self.env['micro.saas.shared.runtime']
+        for instance in self.filtered(lambda i: i.provisioning_mode == 'shared_runtime'):
+            vals = {}
+            if not instance.runtime_id:
+                vals['runtime_id'] = Runtime._get_for_template(instance.template_id).id
+            if not instance.db_name:
+                vals['db_name'] = instance.subdomain or pg_tools.database_label(instance.name, f"-{instance.id}")
+            if vals:
+                instance.sudo().write(vals)
+                instance.add_to_log(
+                    f"[INFO] 🏢 Runtime compartido '{instance.runtime_id.name}', base '{instance.db_name}'."
+                )
+
+    def _ensure_tenant_database(self):
+        """
+        Crea (si falta) la base de la instancia en el cluster compartido, con
+        el rol del runtime como dueño, y le habilita las conexiones.
+        """
+        self.ensure_one()
+        instance = self.sudo()
+        try:
+            with self._shared_pg_connection() as conn:
+                created = pg_tools.ensure_database(conn, instance.db_name, instance.runtime_id.db_user)
+                pg_tools.set_allow_connections(conn, instance.db_name, True)
+        except psycopg2.Error as e:
+            raise UserError(f"No se pudo preparar la base en el cluster Postgres compartido: {e}")
+        if created:
+            instance.db_initialized = False
+            self.add_to_log(f"[INFO] 🐘 Base '{instance.db_name}' creada en el cluster compartido.")
+
+    def _set_tenant_connections(self, allow):
+        """Habilita o bloquea (cortando las sesiones abiertas) la base de la instancia."""
+        self.ensure_one()
+        try:
+            with self._shared_pg_connection() as conn:
+                pg_tools.set_allow_connections(conn, self.sudo().db_name, allow)
+        except psycopg2.Error as e:
+            raise UserError(f"No se pudo cambiar el acceso a la base '{self.sudo().db_name}': {e}")
+
+    def _restart_tenant(self):
+        """
+        Reinicio de una base del runtime compartido sin tocar el contenedor
+        (que sirve a las demás): los procesos del runtime recargan el
+        registro de esta base en su próximo pedido (señal de Odoo) y se
+        cortan sus sesiones abiertas en Postgres.
+        """
+        self.ensure_one()
+        dbname = self.sudo().db_name
+        try:
+            with self._shared_pg_connection(dbname) as conn:
+                pg_tools.signal_registry_reload(conn)
+            with self._shared_pg_connection() as conn:
+                pg_tools.terminate_connections(conn, dbname)
+        except psycopg2.Error as e:
+            raise UserError(f"No se pudo reiniciar la base '{dbname}': {e}")
+
+    def _do_start_tenant(self):
+        """
+        Inicio en modo runtime compartido: no hay contenedores propios.
+        1. Levanta el runtime de la plantilla si no corre (o si cambiaron sus archivos)
+        2. Crea la base en el cluster compartido y le habilita las conexiones
+        3. La primera vez copia la base modelo de la plantilla o, si no se
+           puede, instala los módulos iniciales con un contenedor de un solo
+           uso del runtime
+        4. Queda en 'starting' y la sonda la pasa a 'ready' pidiendo /web/login
+           con el Host de la base
+        """
+        self.ensure_one()
+        self.add_to_log("[INFO] 🚀 Iniciando instancia en el runtime compartido...")
+        self._ensure_shared_runtime()
+        runtime = self.runtime_id
+
+        self._set_job_progress(10, 'Levantando runtime compartido')
+        if not runtime._ensure_running(self):
+            self.write({'state': 'error'})
+            return
+
+        self._set_job_progress(40, 'Preparando base de datos')
+        self._rename_tenant_database()
+        self._ensure_tenant_database()
+
+        if not self.sudo().db_initialized and not self._restore_golden_snapshot():
+            self._set_job_progress(60, 'Inicializando base de datos')
+            if not runtime._initialize_database(self, self.sudo().db_name, self._get_init_modules()):
+                self.write({'state': 'error'})
+                return
+            self.sudo().db_initialized = True
+            self.add_to_log("[INFO] ✅ Base inicializada.")
+
+        self._mark_starting()
+
+    def _rename_tenant_database(self):
+        """
+        Instancia del runtime compartido tomada del pool: su host es el
+        nombre de la base (dbfilter), así que la base y su carpeta del
+        filestore pasan del nombre del pool al subdominio del cliente. Se
+        hace en el inicio (después del commit de la toma) porque ALTER
+        DATABASE no se revierte con la transacción.
+        """
+        self.ensure_one()
+        instance = self.sudo()
+        old_name, new_name = instance.db_name, instance.subdomain
+        if not (instance.pool_claimed_at and instance.db_initialized and new_name and old_name != new_name):
+            return
+        try:
+            with self._shared_pg_connection() as conn:
+                if pg_tools.database_exists(conn, old_name):
+                    pg_tools.set_allow_connections(conn, old_name, False)
+                    pg_tools.rename_database(conn, old_name, new_name)
+        except psycopg2.Error as e:
+            raise UserError(f"No se pudo renombrar la base '{old_name}' a '{new_name}': {e}")
+        filestore = os.path.join(instance.runtime_id.data_path, 'data', 'filestore')
+        if os.path.isdir(os.path.join(filestore, old_name)):
+            os.rename(os.path.join(filestore, old_name), os.path.join(filestore, new_name))
+        self._remove_proxy_route()
+        instance.db_name = new_name
+        self.add_to_log(f"[INFO] 🏷️ Base '{old_name}' renombrada a '{new_name}' (subdominio del cliente).")
+
+    def open_instance_url(self):
+        """Override: las instancias del runtime compartido no tienen http_port propio."""
+        for instance in self.filtered('runtime_id'):
+            if instance.instance_url:
+                return {
+                    'type': 'ir.actions.act_url',
+                    'url': instance.instance_url,
+                    'target': 'new',
+                }
+        return super().open_instance_url()
+
+    # ==========================================
+    #  PROXY INVERSO POR HOST (NGINX)
+    # ==========================================
+
+    @api.model
+    def _get_proxy_settings(self):
+        """Parámetros micro_saas.proxy_* con sus valores por defecto."""
+        params = self.env['ir.config_parameter'].sudo()
+        settings = {
+            key: params.get_param(f'micro_saas.proxy_{key}') or default
+            for key, default in _PROXY_DEFAULTS.items()
+        }
+        settings['enabled'] = str(settings['enabled']).lower() in ('1', 'true', 'yes')
+        settings['conf_dir'] = os.path.expanduser(settings['conf_dir'])
+        settings['log_dir'] = os.path.expanduser(settings['log_dir'])
+        settings['probe_port'] = _port_number(settings['probe_port']) or 80
+        settings['probe_host'] = settings['probe_host'] or ports_tools.published_host()
+        return settings
+
+    @api.model
+    def _get_wake_token(self, create=True):
+        """
+        Secreto que nginx envía a /micro_saas/wake: sin él el controlador no
+        confía en el host pedido. Con `create` se genera si todavía no existe.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        token = params.get_param(_WAKE_TOKEN_PARAM) or ''
+        if not token and create:
+            token = pg_tools.new_password()
+            params.set_param(_WAKE_TOKEN_PARAM, token)
+        return token
+
+    @api.model
+    def _is_proxy_enabled(self):
+        return self._get_proxy_settings()['enabled']
+
+    def _ensure_subdomain(self):
+        """
+        Asigna el subdominio a las instancias que no tienen: etiqueta DNS
+        del nombre más el id, fija aunque la instancia se renombre.
+        """
+        for instance in self.filtered(lambda i: not i.subdomain):
+            instance.subdomain = pg_tools.database_label(instance.name or 'instancia', f"-{instance.id}")
+
+    def _get_proxy_alias(self):
+        """Alias en la red del proxy al que nginx envía el tráfico de la instancia."""
+        self.ensure_one()
+        if self.runtime_id:
+            return self.runtime_id._get_proxy_alias()
+        return f"ms-{self.subdomain}"
+
+    @api.model
+    def _ensure_proxy_network(self):
+        """Crea la red docker externa del proxy si no existe (API o CLI)."""
+        network = self._get_proxy_settings()['network']
+        client = self._get_docker_client()
+        if client:
+            try:
+                if not client.network_exists(network):
+                    client.create_network(network)
+                    _logger.info("[MEJORA] Red del proxy '%s' creada", network)
+                return
+            except docker_api.DockerAPIError as e:
+                _logger.warning("[MEJORA] Docker API falló al preparar la red %s (%s); se usa la CLI", network, e)
+        inspect = subprocess.run(['docker', 'network', 'inspect', network], check=False,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+        if inspect.returncode != 0:
+            subprocess.run(['docker', 'network', 'create', network], check=True,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+
+    def _get_proxy_route(self):
+        """Bloque server de nginx de la instancia (ver tools.proxy.server_block)."""
+        self.ensure_one()
+        if self.runtime_id:
+            workers = self.runtime_id.workers
+        else:
+            workers = proxy_tools.conf_workers(self._get_odoo_conf_content())
+        settings = self._get_proxy_settings()
+        hibernation = self._get_hibernate_settings()['idle_minutes'] > 0
+        host = self._get_public_host()
+        access_log = None
+        if hibernation and os.path.isdir(settings['log_dir']):
+            access_log = f"{settings['container_log_dir'].rstrip('/')}/{host}.log"
+        return proxy_tools.server_block(
+            host, self._get_proxy_alias(),
+            longpolling=workers > 0, comment=self.name or '',
+            access_log=access_log,
+            wake_upstream=settings['wake_upstream'] if hibernation else None,
+            wake_token=self._get_wake_token() if hibernation else '',
+            hibernated=self.state == 'hibernated',
+        )
+
+    def _sync_proxy_route(self):
+        """
+        Regenera el archivo de ruta de cada instancia del recordset (solo se
+        escribe si cambió) y agenda una recarga de nginx tras el commit si
+        alguno cambió. Las demás rutas no se tocan.
+        """
+        settings = self._get_proxy_settings()
+        if not settings['enabled']:
+            return False
+        changed = False
+        for instance in self:
+            host = instance._get_public_host()
+            if not host:
+                continue
+            if proxy_tools.write_route(settings['conf_dir'], host, instance._get_proxy_route()):
+                changed = True
+                instance.add_to_log(f"[INFO] 🌐 Ruta del proxy actualizada: {host}")
+        if changed:
+            self._schedule_proxy_reload()
+        return changed
+
+    def _remove_proxy_route(self):
+        """
+        Quita la ruta de cada instancia después del commit (si la
+        transacción se revierte, la instancia sigue publicada) y recarga nginx.
+        """
+        hosts = {host for host in (instance._get_public_host() for instance in self) if host}
+        if hosts:
+            self.env.cr.postcommit.data.setdefault(_PROXY_REMOVE_KEY, set()).update(hosts)
+            self._schedule_proxy_reload()
+
+    @api.model
+    def _schedule_proxy_reload(self):
+        """Una sola recarga de nginx por transacción, después del commit."""
+        if not self.env.cr.postcommit.data.get(_PROXY_RELOAD_KEY):
+            self.env.cr.postcommit.data[_PROXY_RELOAD_KEY] = True
+            self.env.cr.postcommit.add(self._apply_proxy_changes)
+
+    @api.model
+    def _apply_proxy_changes(self):
+        """Postcommit: borra las rutas de las instancias eliminadas y recarga nginx."""
+        conf_dir = self._get_proxy_settings()['conf_dir']
+        for host in self.env.cr.postcommit.data.get(_PROXY_REMOVE_KEY) or ():
+            proxy_tools.remove_route(conf_dir, host)
+        return self._reload_proxy()
+
+    @api.model
+    def _recompute_instance_urls(self):
+        """Recalcula instance_url de todas las instancias (cambió el proxy o el dominio base)."""
+        instances = self.sudo().with_context(active_test=False).search([])
+        self.env.add_to_compute(self._fields['instance_url'], instances)
+
+    @api.model
+    def _reload_proxy(self):
+        ok, detail = proxy_tools.reload_nginx(self._get_proxy_settings()['container'])
+        if ok:
+            _logger.info("[MEJORA] Proxy: %s", detail)
+        else:
+            _logger.warning("[MEJORA] No se pudo recargar el proxy (sigue con las rutas anteriores): %s", detail)
+        return ok
+
+    @api.model
+    def cron_sync_proxy_routes(self):
+        """
+        Sincronización completa de las rutas del proxy: regenera las que
+        cambiaron, elimina las generadas para instancias que ya no existen
+        y recarga nginx una sola vez si hubo cambios. Las URLs se recalculan
+        aunque el proxy esté desactivado (vuelven al puerto publicado).
+        """
+        self._recompute_instance_urls()
+        settings = self._get_proxy_settings()
+        if not settings['enabled']:
+            return
+        self.search([('subdomain', '=', False)])._ensure_subdomain()
+        instances = self.search([('subdomain', '!=', False)])
+        changed = False
+        expected = set()
+        for instance in instances:
+            host = instance._get_public_host()
+            expected.add(host)
+            changed |= proxy_tools.write_route(settings['conf_dir'], host, instance._get_proxy_route())
+        for host in proxy_tools.generated_hosts(settings['conf_dir']) - expected:
+            changed |= proxy_tools.remove_route(settings['conf_dir'], host)
+        if changed:
+            self._reload_proxy()
+
+    # ==========================================
+    #  HIBERNACIÓN (ESCALAR A CERO)
+    # ==========================================
+
+    @api.model
+    def _get_hibernate_settings(self):
+        """Parámetros micro_saas.hibernate_* con sus valores por defecto."""
+        params = self.env['ir.config_parameter'].sudo()
+        settings = {
+            key: params.get_param(f'micro_saas.hibernate_{key}') or default
+            for key, default in _HIBERNATE_DEFAULTS.items()
+        }
+        for key in ('idle_minutes', 'min_bytes'):
+            try:
+                settings[key] = max(0, int(settings[key]))
+            except (ValueError, TypeError):
+                settings[key] = int(_HIBERNATE_DEFAULTS[key])
+        if settings['mode'] not in _HIBERNATE_MODES:
+            settings['mode'] = _HIBERNATE_DEFAULTS['mode']
+        return settings
+
+    def _read_activity_counter(self, proxy_settings):
+        """
+        (contador, fuente) de actividad de la instancia: tamaño del log de
+        acceso de su host en el proxy ('log') o, si no existe, bytes de red
+        de sus contenedores de Odoo ('network'). (None, None) si no hay
+        forma de medirla.
+        """
+        self.ensure_one()
+        host = self._get_public_host()
+        if host:
+            try:
+                return float(os.path.getsize(os.path.join(proxy_settings['log_dir'], f"{host}.log"))), 'log'
+            except OSError:
+                pass
+        containers = self._get_project_containers()
+        client = self._get_docker_client()
+        if not containers or not client:
+            return None, None
+        total = 0
+        try:
+            for container in containers:
+                labels = container.get('Labels') or {}
+                service = {
+                    'name': labels.get(docker_api.COMPOSE_SERVICE_LABEL, ''),
+                    'image': container.get('Image', ''),
+                    'command': container.get('Command', ''),
+                    'labels': labels,
+                }
+                if container.get('State') == 'running' and self._is_odoo_service(service):
+                    total += docker_api.network_bytes(client.container_stats(container['Id']))
+        except docker_api.DockerAPIError as e:
+            _logger.warning("[MEJORA] No se pudo medir el tráfico de %s: %s", self.name, e)
+            return None, None
+        return float(total), 'network'
+
+    @api.model
+    def cron_hibernate_idle(self):
+        """
+        Revisa la actividad de las instancias corriendo y encola 'hibernate'
+        para las que llevan micro_saas.hibernate_idle_minutes sin pedidos.
+        Cualquier cambio del log de acceso cuenta como actividad; con el
+        tráfico de red, solo una diferencia mayor a hibernate_min_bytes (el
+        cron de Odoo genera algo de tráfico propio). Solo con el proxy
+        inverso: es el que despierta la instancia con el siguiente pedido.
+        """
+        settings = self._get_hibernate_settings()
+        proxy_settings = self._get_proxy_settings()
+        if not settings['idle_minutes'] or not proxy_settings['enabled']:
+            return
+        busy = set(self.env['micro.saas.instance.job'].search([
+            ('state', 'in', ('pending', 'running')),
+        ]).instance_id.ids)
+        instances = self.search([
+            ('state', 'in', ('running', 'ready')),
+            ('auto_hibernate', '=', True),
+            ('is_pool', '=', False),
+            ('subdomain', '!=', False),
+            ('provisioning_mode', '!=', 'shared_runtime'),
+        ])
+        now = fields.Datetime.now()
+        idle_since = now - timedelta(minutes=settings['idle_minutes'])
+        idle = self.browse()
+        for instance in instances:
+            if instance.id in busy:
+                continue
+            counter, source = instance._read_activity_counter(proxy_settings)
+            if counter is None:
+                continue
+            delta = abs(counter - instance.activity_counter)
+            active = delta > (0 if source == 'log' else settings['min_bytes'])
+            if active or not instance.last_activity:
+                instance.write({'last_activity': now, 'activity_counter': counter})
+            elif instance.last_activity <= idle_since:
+                idle |= instance
+        if idle:
+            _logger.info("[MEJORA] 💤 %s instancia(s) sin actividad: se hibernan", len(idle))
+            self.env['micro.saas.instance.job']._enqueue(idle, 'hibernate')
+
+    def _do_hibernate_instance(self):
+        """
+        Trabajo 'hibernate': detiene (o pausa) los contenedores sin
+        eliminarlos, así el inicio siguiente es un start y no un up. La ruta
+        del proxy pasa a enviar todo a la página de "despertando", que
+        encola el inicio con el primer pedido. Si falla, la instancia sigue
+        como estaba y la próxima revisión lo intenta de nuevo.
+        """
+        settings = self._get_hibernate_settings()
+        for instance in self:
+            if instance.state not in ('running', 'ready'):
+                instance.add_to_log(f"[INFO] Hibernación omitida: la instancia está en '{instance.state}'.")
+                continue
+            mode = settings['mode']
+            instance.add_to_log(f"[INFO] 💤 Hibernando instancia sin actividad ({mode})...")
+            try:
+                if not instance._docker_api_lifecycle(mode):
+                    modified_path = os.path.join(instance.instance_data_path, 'docker-compose.yml')
+                    instance.excute_command(f'docker-compose -f "{modified_path}" {mode}', shell=True, check=True)
+            except Exception as e:
+                instance.add_to_log(f"[WARN] ⚠️ No se pudo hibernar: {str(e)}")
+                continue
+            instance.write({'state': 'hibernated', 'hibernated_at': fields.Datetime.now()})
+            instance._sync_proxy_route()
+            instance.add_to_log("[INFO] ✅ Instancia hibernada. Despierta con el próximo pedido.")
+
+    def _resume_hibernated(self):
+        """Reanuda los contenedores pausados por la hibernación en modo 'pause'."""
+        self.ensure_one()
+        containers = self._get_project_containers()
+        client = self._get_docker_client()
+        if containers is None or not client:
+            modified_path = os.path.join(self.instance_data_path, 'docker-compose.yml')
+            self._run_command_live(['docker-compose', '-f', modified_path, 'unpause'], timeout=_COMPOSE_UP_TIMEOUT)
+            return
+        paused = [c for c in containers if c.get('State') == 'paused']
+        try:
+            for container in paused:
+                client.unpause_container(container['Id'])
+        except docker_api.DockerAPIError as e:
+            self.add_to_log(f"[WARN] Docker API falló al reanudar ({e}).")
+        if paused:
+            self.add_to_log(f"[INFO] ▶️ {len(paused)} contenedor(es) reanudados tras la hibernación.")
+
+    @api.model
+    def _wake_by_host(self, host):
+        """
+        Pedido a un host del proxy cuya instancia no respondió: si está
+        hibernada y no tiene ya un inicio encolado, se encola. La página se
+        recarga cada pocos segundos, así que los pedidos siguientes no
+        escriben nada. Devuelve la instancia (o un recordset vacío si el host
+        no es de ninguna).
+        """
+        label = (host or '').split(':', 1)[0].lower()
+        base = f".{self._get_base_domain()}"
+        if not label.endswith(base):
+            return self.browse()
+        instance = self.search([('subdomain', '=', label[:-len(base)])], limit=1)
+        if instance.state != 'hibernated':
+            return instance
+        Job = self.env['micro.saas.instance.job']
+        if Job.search_count([
+            ('instance_id', '=', instance.id),
+            ('operation', '=', 'start'),
+            ('state', 'in', ('pending', 'running')),
+        ], limit=1):
+            return instance
+        instance.add_to_log(f"[INFO] ☀️ Pedido a {label}: despertando la instancia.")
+        Job._enqueue(instance, 'start')
+        return instance
+
+    # ==========================================
+    #  POOL DE INSTANCIAS PRECALENTADAS
+    # ==========================================
+
+    @api.model
+    def _prepare_pool_vals(self, template):
+        """
+        Valores de una instancia del pool de `template`: lo mismo que copia
+        onchange_template_id (variables y repositorios como registros
+        nuevos). El subdominio es neutro: al tomarla, el cliente recibe uno
+        con su nombre (ver _claim_pool_instance).
+        """
+        token = uuid.uuid4().hex[:8]
+        return {
+            'name': f"Pool - {template.name} - {token}",
+            'template_id': template.id,
+            'template_dc_body': template.template_dc_body,
+            'template_odoo_conf': template.template_odoo_conf,
+            'template_postgres_conf': template.template_postgres_conf,
+            'tag_ids': [Command.set(template.tag_ids.ids)],
+            'repository_line': [
+                Command.create({'name': line.name, 'repository_id': line.repository_id.id})
+                for line in template.repository_line
+            ],
+            'variable_ids': [
+                Command.create({
+                    'name': var.name,
+                    'demo_value': var.demo_value,
+                    'field_type': var.field_type,
+                    'field_name': var.field_name,
+                })
+                for var in template.variable_ids
+            ],
+            'subdomain': pg_tools.database_label(f"odoo-{token}"),
+            'is_pool': True,
+        }
+
+    @api.model
+    def cron_refill_warm_pools(self):
+        """
+        Repone el pool de cada plantilla con warm_pool_size > 0: crea las
+        instancias que faltan y encola su inicio (archivos, clonado, imagen
+        y base inicial quedan hechos antes de que llegue el cliente). Las
+        del pool que quedaron detenidas se vuelven a iniciar y las que
+        sobran (se achicó el pool) se eliminan. Si una plantilla acumula
+        tantas instancias en error como su pool, no se crean más.
+        """
+        Template = self.env['docker.compose.template']
+        pools = {}
+        for instance in self.search([('is_pool', '=', True)], order='id'):
+            pools.setdefault(instance.template_id.id, self.browse())
+            pools[instance.template_id.id] |= instance
+        templates = Template.search([('warm_pool_size', '>', 0)]) | Template.browse(list(pools))
+        to_start = self.browse()
+        for template in templates:
+            pool = pools.get(template.id, self.browse())
+            failed = pool.filtered(lambda i: i.state == 'error')
+            healthy = pool - failed
+            size = template.warm_pool_size if template.active else 0
+            surplus = len(healthy) - size
+            if surplus > 0:
+                # Primero las que todavía no están listas
+                extra = healthy.sorted(lambda i: (i.state == 'ready', i.id))[:surplus]
+                _logger.info("[MEJORA] 🔥 Pool de '%s': se eliminan %s instancia(s) sobrantes", template.name, surplus)
+                extra.unlink()
+                continue
+            to_start |= healthy.filtered(lambda i: i.state in ('draft', 'stopped'))
+            missing = size - len(healthy)
+            if missing <= 0:
+                continue
+            if len(failed) >= size:
+                _logger.warning("[MEJORA] Pool de '%s': %s instancia(s) en error; no se crean más hasta revisarlas",
+                                template.name, len(failed))
+                continue
+            created = self.create([self._prepare_pool_vals(template) for _index in range(missing)])
+            created.add_to_log("[INFO] 🔥 Instancia creada para el pool precalentado.")
+            _logger.info("[MEJORA] 🔥 Pool de '%s': %s instancia(s) nuevas", template.name, missing)
+            to_start |= created
+        if to_start:
+            to_start.start_instance()
+
+    @api.model
+    def _claim_pool_instance(self, template, vals):
+        """
+        Toma una instancia lista ('ready') del pool de `template` y la asigna
+        con `vals` (nombre, cliente, factura). La fila se bloquea con FOR
+        UPDATE SKIP LOCKED: dos pedidos simultáneos nunca toman la misma.
+        Recibe un subdominio con el nombre del cliente y se encola su inicio,
+        que después del commit (ya con la suscripción, si la hay) aplica el
+        subdominio y los límites del plan; el correo de bienvenida sale
+        cuando ese inicio vuelve a responder, no dentro de esta transacción.
+        Devuelve la instancia, o un recordset vacío si no hay ninguna lista.
+        """
+        if not template:
+            return self.browse()
+        self.flush_model(['is_pool', 'template_id', 'state'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM odoo_docker_instance
+             WHERE is_pool AND template_id = %s AND state = 'ready'
+             ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """, [template.id])
+        row = self.env.cr.fetchone()
+        if not row:
+            return self.browse()
+        instance = self.browse(row[0])
+        pool_name = instance.name
+        if not instance.runtime_id:
+            # La ruta del subdominio del pool se quita tras el commit; la del
+            # runtime compartido cambia con su base, en el inicio (_rename_tenant_database).
+            instance._remove_proxy_route()
+        instance.write(dict(vals, is_pool=False, pool_claimed_at=fields.Datetime.now(), subdomain=False))
+        instance._ensure_subdomain()
+        instance.add_to_log(f"[INFO] 🎯 Tomada del pool ({pool_name}) como '{instance.name}' "
+                            f"(subdominio '{instance.subdomain}'); se reinicia con los límites del plan.")
+        self.env['micro.saas.instance.job']._enqueue(instance, 'start')
+        cron = self.env.ref('micro_saas_mejora.cron_refill_warm_pools', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+        return instance
+
+    # ==========================================
+    #  START INSTANCE (OVERRIDE COMPLETO)
+    # ==========================================
+
+    def _do_start_instance(self):
         """
         Override completo del start_instance con las siguientes mejoras:
         1. Valida puertos antes de iniciar
         2. Pre-descarga la imagen Docker
-        3. Limpia contenedores previos (re-intentos)
+        3. Limpia contenedores previos (solo si la instancia quedó en error)
         4. Registra puertos en el historial
         5. Entrecomilla rutas para evitar problemas con espacios
         6. Mejor manejo de errores con mensajes claros
+        7. docker-compose.yml y odoo.conf solo se reescriben si cambiaron, y
+           se hace el arranque mínimo:
+           - nada cambió y todo corre: no se toca nada;
+           - nada cambió y hay servicios detenidos: start;
+           - cambió docker-compose.yml o no hay contenedores: up -d (compose
+             recrea solo los servicios cuya definición cambió);
+           - cambió odoo.conf o el código de los repositorios: restart de
+             los servicios que montan esas carpetas.
+        8. Con el cluster Postgres compartido (plantilla db_mode='shared')
+           crea el rol y la base de la instancia; la primera vez la copia de
+           la base modelo de la plantilla o instala los módulos iniciales
+        9. Con el runtime compartido no hay contenedores propios: ver _do_start_tenant
+        10. Una instancia hibernada en modo 'pause' reanuda sus contenedores
+            y sigue por el arranque mínimo
         """
         self.ensure_one()
+        if self._is_runtime_tenant():
+            return self._do_start_tenant()
         self.add_to_log("[INFO] 🚀 Iniciando instancia Odoo...")
-
-        # 1. Validar que los puertos estén disponibles
-        try:
-            self._validate_ports_available()
-        except UserError as e:
-            self.add_to_log(f"[ERROR] ❌ {str(e)}")
-            self.write({'state': 'error'})
-            raise
+        if self.state == 'hibernated':
+            self._resume_hibernated()
+        services = self._get_service_states()
+        own_running = bool(services) and any(state == 'running' for state in services.values())
+
+        # 1. Validar que los puertos estén disponibles (si los contenedores de
+        #    la propia instancia ya corren, los puertos son suyos)
+        self._set_job_progress(5, 'Validando puertos')
+        if not own_running:
+            try:
+                self._validate_ports_available()
+            except UserError as e:
+                self.add_to_log(f"[ERROR] ❌ {str(e)}")
+                self.write({'state': 'error'})
+                raise
 
         # 2. Registrar puertos
         self._registrar_puertos()
 
-        # 3. Generar archivos
-        self.add_to_log("[INFO] 📝 Generando archivos de configuración...")
-        self._update_docker_compose_file()
-        self._clone_repositories()
-        self._create_odoo_conf()
+        # 3. Cluster compartido: rol y base propios antes de generar archivos
+        if self._is_shared_db():
+            self._set_job_progress(8, 'Preparando base de datos')
+            self._ensure_shared_database()
 
-        # 4. Pre-descargar imagen Docker (evita bloqueo largo en docker-compose up)
-        self._pre_pull_docker_image()
+        # 4. Generar archivos (solo se escriben si cambiaron)
+        if self._is_proxy_enabled():
+            self._ensure_subdomain()
+            self._ensure_proxy_network()
+        self._set_job_progress(10, 'Generando archivos de configuración')
+        self.add_to_log("[INFO] 📝 Generando archivos de configuración...")
+        compose_changed = self._update_docker_compose_file()
+        self._set_job_progress(15, 'Clonando repositorios')
+        repos_changed = self._clone_repositories()
+        conf_changed = self._create_odoo_conf()
+        changed_dirs = [name for name, changed in (('etc', conf_changed), ('addons', repos_changed)) if changed]
 
         # 5. Ruta al docker-compose.yml generado
         modified_path = os.path.join(self.instance_data_path, 'docker-compose.yml')
@@ -371,84 +2057,306 @@ class OdooDockerInstanceMejora(models.Model):
             self.write({'state': 'error'})
             return
 
-        # 6. Limpiar contenedores de intentos previos fallidos
-        self.add_to_log("[INFO] 🧹 Limpiando contenedores previos (si existen)...")
-        self._cleanup_previous_containers(modified_path)
+        # 6. Base nueva del cluster compartido: copiar la base modelo o instalar una sola vez
+        if self._is_shared_db() and not self.sudo().db_initialized:
+            if not self._restore_golden_snapshot(modified_path) and not self._initialize_database(modified_path):
+                return
+        # Pool con Postgres propio: la base se crea antes de entregarla
+        elif self.is_pool and not self.sudo().db_initialized:
+            if not self._initialize_database(modified_path, self._get_pool_db_args()):
+                return
+
+        # 7. Contenedores existentes y definición sin cambios: arranque mínimo
+        if self.state != 'error' and services and not compose_changed:
+            self._set_job_progress(70, 'Iniciando contenedores existentes')
+            self._start_existing_services(services, changed_dirs)
+            return
+
+        # 8. Pre-descargar imagen Docker (evita bloqueo largo en docker-compose up)
+        self._set_job_progress(35, 'Descargando imagen Docker')
+        self._pre_pull_docker_image()
 
-        # 7. Iniciar con docker-compose
+        # 9. Limpiar contenedores solo si el intento anterior falló
+        if self.state == 'error':
+            self._set_job_progress(70, 'Limpiando contenedores previos')
+            self.add_to_log("[INFO] 🧹 Limpiando contenedores del intento fallido...")
+            self._cleanup_previous_containers(modified_path)
+            recreated = True
+        else:
+            recreated = not services
+
+        # 10. Iniciar con docker-compose
+        self._set_job_progress(80, 'Ejecutando docker-compose up')
         self.add_to_log("[INFO] 🐳 Ejecutando docker-compose up...")
+        self._compose_up(modified_path)
+
+        # 11. Contenedores que siguieron vivos montan archivos viejos en memoria
+        if self.state == 'starting' and changed_dirs and not recreated:
+            self._restart_services_mounting(changed_dirs)
+
+    def _start_existing_services(self, services, changed_dirs):
+        """
+        Arranque sin recrear contenedores: reinicia los servicios que montan
+        carpetas cambiadas e inicia los detenidos. Si todo corre y nada
+        cambió, no hace nada.
+        """
+        self.ensure_one()
+        stopped = [name for name, state in services.items() if state != 'running']
+        if not changed_dirs and not stopped:
+            self.add_to_log("[INFO] ✅ Sin cambios y contenedores corriendo: no se recrea nada.")
+        if changed_dirs:
+            self._restart_services_mounting(changed_dirs)
+        if stopped:
+            self.add_to_log(f"[INFO] ▶️ Iniciando servicios detenidos: {', '.join(sorted(stopped))}")
+            if not self._docker_api_lifecycle('start'):
+                modified_path = os.path.join(self.instance_data_path, 'docker-compose.yml')
+                result = self._run_command_live(['docker-compose', '-f', modified_path, 'start'],
+                                                timeout=_COMPOSE_UP_TIMEOUT)
+                if not result.ok:
+                    self.write({'state': 'error'})
+                    self.add_to_log(f"[ERROR] ❌ Error al iniciar: {result.error_text()[-1000:]}")
+                    return
+        self._mark_starting()
+
+    def _restart_services_mounting(self, subdirs):
+        """
+        Reinicia solo los contenedores que montan alguna de las carpetas
+        `subdirs` de la instancia (p. ej. 'etc' para odoo.conf, 'addons'
+        para el código). Sin API se reinicia todo el proyecto.
+        """
+        self.ensure_one()
+        sources = {os.path.normpath(os.path.join(self.instance_data_path, subdir)) for subdir in subdirs}
+        containers = self._get_project_containers()
+        client = self._get_docker_client()
+        if containers is not None and client:
+            affected = [
+                c for c in containers
+                if any(os.path.normpath(m.get('Source') or '') in sources for m in c.get('Mounts') or [])
+            ]
+            names = [c.get('Labels', {}).get(docker_api.COMPOSE_SERVICE_LABEL, c['Id'][:12]) for c in affected]
+            try:
+                for container in affected:
+                    client.restart_container(container['Id'])
+                if names:
+                    self.add_to_log(f"[INFO] 🔄 Servicios reiniciados por cambios en {', '.join(subdirs)}: "
+                                    f"{', '.join(sorted(names))}")
+                return
+            except docker_api.DockerAPIError as e:
+                self.add_to_log(f"[WARN] Docker API falló ({e}); se usa docker-compose.")
+        modified_path = os.path.join(self.instance_data_path, 'docker-compose.yml')
+        result = self._run_command_live(['docker-compose', '-f', modified_path, 'restart'],
+                                        timeout=_COMPOSE_UP_TIMEOUT)
+        if result.ok:
+            self.add_to_log(f"[INFO] 🔄 Servicios reiniciados por cambios en {', '.join(subdirs)}")
+        else:
+            self.add_to_log(f"[WARN] ⚠️ No se pudieron reiniciar los servicios: {result.error_text()[-500:]}")
+
+    def _compose_up(self, modified_path):
+        """docker-compose up -d con la salida en vivo y diagnóstico de errores."""
+        self.ensure_one()
         try:
-            cmd = f'docker-compose -f "{modified_path}" up -d'
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=300  # 5 minutos
+            result = self._run_command_live(
+                ['docker-compose', '-f', modified_path, 'up', '-d'],
+                timeout=_COMPOSE_UP_TIMEOUT,
             )
-            stdout_msg = result.stdout.decode('utf-8', errors='replace') if result.stdout else ''
-            stderr_msg = result.stderr.decode('utf-8', errors='replace') if result.stderr else ''
+            if result.cancelled:
+                raise UserError("Inicio cancelado durante docker-compose up.")
+            if result.ok:
+                self._mark_starting()
+            elif result.timed_out or result.idle_timed_out:
+                self.write({'state': 'error'})
+                self.add_to_log(
+                    f"[ERROR] ⏰ docker-compose up se detuvo: {result.error_text()}. "
+                    "Verifica la conexión a internet y el estado de Docker."
+                )
+            else:
+                self.write({'state': 'error'})
+                stderr_msg = result.error_text()
+                self.add_to_log(f"[ERROR] ❌ Error al iniciar: {stderr_msg[-1000:]}")
+
+                # Diagnóstico automático
+                if 'port is already allocated' in stderr_msg:
+                    self.add_to_log(
+                        "[ERROR] 💡 SOLUCIÓN: El puerto ya está en uso. "
+                        "Ve a la instancia, cambia los puertos HTTP y Longpolling, "
+                        "y vuelve a intentar."
+                    )
+                elif 'pull access denied' in stderr_msg or 'not found' in stderr_msg:
+                    self.add_to_log(
+                        "[ERROR] 💡 SOLUCIÓN: La imagen Docker no existe. "
+                        "Verifica que la versión de Odoo en el template sea correcta "
+                        "(ej: 17, 18). La versión 19 aún no existe en Docker Hub."
+                    )
+        except UserError:
+            raise
+        except Exception as e:
+            self.write({'state': 'error'})
+            self.add_to_log(f"[ERROR] ❌ Error inesperado: {str(e)}")
 
-            if stdout_msg:
-                self.add_to_log(f"[INFO] {stdout_msg[:500]}")
-            if stderr_msg and 'error' in stderr_msg.lower():
-                self.add_to_log(f"[WARN] {stderr_msg[:500]}")
+    # ==========================================
+    #  DISPONIBILIDAD (SONDA HTTP)
+    # ==========================================
 
-            self.write({'state': 'running'})
-            self.add_to_log(
-                f"[INFO] ✅ Instancia iniciada correctamente. "
-                f"Abrir: {self.instance_url}"
-            )
-            self.add_to_log(
-                "[INFO] ⏳ Nota: Odoo puede tardar 1-2 minutos en inicializar "
-                "la base de datos la primera vez."
+    def _mark_starting(self):
+        """
+        Contenedores arriba: la instancia queda en 'starting' y se encola la
+        sonda que la pasa a 'ready' cuando Odoo responde por HTTP. Con el
+        proxy inverso se actualiza antes su ruta en nginx.
+        """
+        now = fields.Datetime.now()
+        self.write({
+            'state': 'starting',
+            'starting_at': now,
+            'ready_at': False,
+            'last_activity': now,
+            'hibernated_at': False,
+        })
+        self._sync_proxy_route()
+        for instance in self:
+            instance.add_to_log(
+                f"[INFO] ✅ Contenedores iniciados. Esperando a que Odoo responda en {instance.instance_url}..."
             )
+        self.env['micro.saas.instance.job']._enqueue(self, 'probe')
 
-        except subprocess.TimeoutExpired:
-            self.write({'state': 'error'})
+    def _get_readiness_settings(self):
+        """
+        (host, plazo en segundos) de la sonda, desde ir.config_parameter. Sin
+        micro_saas.readiness_host se usa la dirección desde la que el maestro
+        llega a los puertos publicados: 127.0.0.1 en el host, o el gateway de
+        la red Docker si el maestro corre en un contenedor.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        try:
+            timeout = max(1, int(params.get_param('micro_saas.readiness_timeout') or _READINESS_TIMEOUT))
+        except (ValueError, TypeError):
+            timeout = _READINESS_TIMEOUT
+        return params.get_param('micro_saas.readiness_host') or ports_tools.published_host(), timeout
+
+    def _do_probe_readiness(self):
+        """
+        Trabajo 'probe': un intento corto contra /web/health (o /web/login) en
+        el puerto HTTP. Si Odoo aún no responde, devuelve los segundos hasta el
+        siguiente intento y la cola reprograma el mismo trabajo, así la sonda no
+        ocupa un hilo mientras Odoo carga. La espera crece con el tiempo desde
+        starting_at (entre readiness.INITIAL_DELAY y readiness.MAX_DELAY).
+        Si vence el plazo (micro_saas.readiness_timeout), la instancia queda en
+        'running' y la conciliación sigue comprobando: para una instancia ya
+        en 'running' la sonda hace un solo intento y no escribe en el log.
+        """
+        self.ensure_one()
+        if self.state not in ('starting', 'running'):
+            self.add_to_log(f"[INFO] Sonda omitida: la instancia está en '{self.state}'.")
+            return None
+        host, port, host_header, paths = self._get_probe_target()
+        if self.state == 'running':
+            if port and readiness.probe(host, port, paths, timeout=_RECHECK_PROBE_TIMEOUT,
+                                        host_header=host_header)[0]:
+                self._mark_ready()
+            return None
+        if not port:
+            self.add_to_log("[WARN] ⚠️ La instancia no tiene puerto HTTP; no se puede comprobar si Odoo responde.")
+            self.write({'state': 'running'})
+            return None
+        if self._is_job_cancel_requested():
+            self.write({'state': 'running'})
+            self.add_to_log("[WARN] Sonda de disponibilidad cancelada.")
+            return None
+
+        _host, timeout = self._get_readiness_settings()
+        if not self.starting_at:
+            self.starting_at = fields.Datetime.now()
+        ready, detail = readiness.probe(host, port, paths, host_header=host_header)
+        if ready:
+            self._mark_ready(detail)
+            return None
+        elapsed = (fields.Datetime.now() - self.starting_at).total_seconds()
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            self.write({'state': 'running'})
             self.add_to_log(
-                "[ERROR] ⏰ docker-compose up tardó más de 5 minutos. "
-                "Verifica la conexión a internet y el estado de Docker."
+                f"[WARN] ⏳ Odoo no respondió en {timeout}s (último intento: {detail}). "
+                f"La conciliación seguirá comprobando."
             )
-        except subprocess.CalledProcessError as e:
-            self.write({'state': 'error'})
-            stderr_msg = e.stderr.decode('utf-8', errors='replace') if e.stderr else str(e)
-            self.add_to_log(f"[ERROR] ❌ Error al iniciar: {stderr_msg[:1000]}")
+            return None
+        _logger.debug("[MEJORA] %s aún no responde tras %ss: %s", self.name, int(elapsed), detail)
+        self._set_job_progress(min(95, 5 + int(90 * elapsed / timeout)),
+                               f'Esperando a Odoo ({int(elapsed)}s de {timeout}s)')
+        return min(max(elapsed, readiness.INITIAL_DELAY), readiness.MAX_DELAY, remaining)
 
-            # Diagnóstico automático
-            if 'port is already allocated' in stderr_msg:
-                self.add_to_log(
-                    "[ERROR] 💡 SOLUCIÓN: El puerto ya está en uso. "
-                    "Ve a la instancia, cambia los puertos HTTP y Longpolling, "
-                    "y vuelve a intentar."
-                )
-            elif 'pull access denied' in stderr_msg or 'not found' in stderr_msg:
-                self.add_to_log(
-                    "[ERROR] 💡 SOLUCIÓN: La imagen Docker no existe. "
-                    "Verifica que la versión de Odoo en el template sea correcta "
-                    "(ej: 17, 18). La versión 19 aún no existe en Docker Hub."
-                )
-        except Exception as e:
-            self.write({'state': 'error'})
-            self.add_to_log(f"[ERROR] ❌ Error inesperado: {str(e)}")
+    def _get_probe_target(self):
+        """
+        (host, puerto, cabecera Host, rutas) de la sonda. En el runtime
+        compartido /web/health responde aunque la base no exista: se pide
+        /web/login con el Host de la base para que dbfilter la abra. Con el
+        proxy inverso se consulta a través de nginx con el Host de la
+        instancia (comprueba también la ruta).
+        """
+        self.ensure_one()
+        host, _timeout = self._get_readiness_settings()
+        paths = ('/web/login',) if self.runtime_id else readiness.HEALTH_PATHS
+        settings = self._get_proxy_settings()
+        if settings['enabled'] and self._get_public_host():
+            return settings['probe_host'], settings['probe_port'], self._get_public_host(), paths
+        if self.runtime_id:
+            return host, self.runtime_id.http_port, self._get_public_host(), paths
+        return host, self.http_port_number, None, paths
+
+    def _mark_ready(self, detail=None):
+        """
+        Odoo respondió: estado 'ready' y hook _on_instance_ready. Con `detail`
+        (respuesta de la sonda tras un inicio) se registra el tiempo hasta lista.
+        """
+        self.ensure_one()
+        now = fields.Datetime.now()
+        vals = {'state': 'ready', 'ready_at': now}
+        if detail and self.starting_at:
+            vals['time_to_ready'] = (now - self.starting_at).total_seconds()
+        self.write(vals)
+        suffix = f" ({detail})" if detail else ''
+        self.add_to_log(f"[INFO] 🟢 Odoo responde{suffix}. Abrir: {self.instance_url}")
+        self._on_instance_ready()
+
+    def _on_instance_ready(self):
+        """
+        Hook: la instancia acaba de responder por HTTP tras un inicio.
+        Otros módulos lo extienden (p. ej. el correo de bienvenida).
+        """
 
     # ==========================================
     #  STOP INSTANCE (OVERRIDE)
     # ==========================================
 
-    def stop_instance(self):
-        """Override: Entrecomilla rutas y libera puertos."""
+    def _do_stop_instance(self):
+        """
+        Override: detiene los contenedores por el Docker Engine API (sin
+        lanzar docker-compose). Si el API no está disponible, usa
+        docker-compose down como antes. En el runtime compartido solo se
+        bloquean las conexiones a la base de la instancia. Una instancia
+        hibernada también se puede detener (su ruta deja de despertarla).
+
+        A diferencia de `down`, el stop por API conserva los contenedores
+        (detenidos) y la red del proyecto, a propósito:
+        - el próximo inicio los arranca tal cual (_start_existing_services)
+          en segundos; si el docker-compose.yml cambió mientras tanto, el
+          inicio hace docker-compose up, que recrea los que difieren;
+        - un contenedor detenido no ocupa puertos del host, y la
+          reconciliación lo ve como 'exited' y deja la instancia en 'stopped';
+        - al eliminar la instancia, unlink hace docker-compose down -v, que
+          borra contenedores, red y volúmenes igual que antes.
+        """
         for instance in self:
-            if instance.state == 'running':
+            if instance.state in _ACTIVE_STATES + ('hibernated',):
                 instance.add_to_log("[INFO] ⏹️ Deteniendo instancia...")
-                modified_path = os.path.join(
-                    instance.instance_data_path, 'docker-compose.yml'
-                )
                 try:
-                    cmd = f'docker-compose -f "{modified_path}" down'
-                    instance.excute_command(cmd, shell=True, check=True)
+                    if instance._is_runtime_tenant():
+                        # El runtime sigue sirviendo a las demás bases
+                        instance._set_tenant_connections(False)
+                    elif not instance._docker_api_lifecycle('stop'):
+                        modified_path = os.path.join(instance.instance_data_path, 'docker-compose.yml')
+                        cmd = f'docker-compose -f "{modified_path}" down'
+                        instance.excute_command(cmd, shell=True, check=True)
                     instance.write({'state': 'stopped'})
+                    instance._sync_proxy_route()
                     instance.add_to_log("[INFO] ✅ Instancia detenida correctamente.")
                 except Exception as e:
                     instance.add_to_log(f"[ERROR] ❌ Error al detener: {str(e)}")
@@ -457,23 +2365,199 @@ class OdooDockerInstanceMejora(models.Model):
     #  RESTART INSTANCE (OVERRIDE)
     # ==========================================
 
-    def restart_instance(self):
-        """Override: Entrecomilla rutas."""
+    def _do_restart_instance(self):
+        """
+        Override: reinicia por el Docker Engine API, con docker-compose como
+        respaldo. En el runtime compartido se recarga el registro de la base
+        y se cortan sus sesiones (_restart_tenant).
+        """
         for instance in self:
-            if instance.state == 'running':
+            if instance.state in _ACTIVE_STATES:
                 instance.add_to_log("[INFO] 🔄 Reiniciando instancia...")
-                modified_path = os.path.join(
-                    instance.instance_data_path, 'docker-compose.yml'
-                )
                 try:
-                    cmd = f'docker-compose -f "{modified_path}" restart'
-                    instance.excute_command(cmd, shell=True, check=True)
-                    instance.write({'state': 'running'})
+                    if instance._is_runtime_tenant():
+                        instance._restart_tenant()
+                    elif not instance._docker_api_lifecycle('restart'):
+                        modified_path = os.path.join(instance.instance_data_path, 'docker-compose.yml')
+                        cmd = f'docker-compose -f "{modified_path}" restart'
+                        instance.excute_command(cmd, shell=True, check=True)
                     instance.add_to_log("[INFO] ✅ Instancia reiniciada correctamente.")
+                    instance._mark_starting()
                 except Exception as e:
                     instance.add_to_log(f"[ERROR] ❌ Error al reiniciar: {str(e)}")
                     instance.write({'state': 'stopped'})
 
+    # ==========================================
+    #  DOCKER ENGINE API
+    # ==========================================
+
+    @api.model
+    def _get_docker_client(self):
+        """
+        Cliente del Docker Engine API (socket unix), o None si está
+        desactivado (micro_saas.docker_api = False) o el socket no existe.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        if str(params.get_param('micro_saas.docker_api', 'True')).lower() in ('0', 'false', 'no', ''):
+            return None
+        client = docker_api.get_client(params.get_param('micro_saas.docker_socket', docker_api.DEFAULT_SOCKET))
+        return client if client.is_available() else None
+
+    def _get_compose_project(self):
+        """Proyecto docker compose de la instancia (derivado de su carpeta)."""
+        self.ensure_one()
+        return docker_api.compose_project_name(self.instance_data_path)
+
+    def _get_project_containers(self):
+        """
+        Contenedores del proyecto compose de la instancia por el API, o None
+        si el API no está disponible.
+        """
+        self.ensure_one()
+        client = self._get_docker_client()
+        if not client or not self.instance_data_path:
+            return None
+        try:
+            return client.project_containers(self._get_compose_project())
+        except docker_api.DockerAPIError as e:
+            _logger.warning("[MEJORA] Docker API no disponible para %s: %s", self.name, e)
+            return None
+
+    def _get_service_states(self):
+        """{servicio compose: estado del contenedor} por el API, o None."""
+        containers = self._get_project_containers()
+        if containers is None:
+            return None
+        return {
+            c.get('Labels', {}).get(docker_api.COMPOSE_SERVICE_LABEL, c['Id'][:12]): c.get('State')
+            for c in containers
+        }
+
+    # ==========================================
+    #  CONCILIACIÓN DE ESTADOS (CRON)
+    # ==========================================
+
+    @api.model
+    def _list_all_compose_containers(self):
+        """
+        Todos los contenedores de proyectos compose en UNA llamada: API si
+        está disponible, 'docker ps --format json' si no.
+        """
+        client = self._get_docker_client()
+        if client:
+            try:
+                return client.list_containers(all=True, filters={'label': [docker_api.COMPOSE_PROJECT_LABEL]})
+            except docker_api.DockerAPIError as e:
+                _logger.warning("[MEJORA] Docker API no disponible para conciliar: %s", e)
+        return docker_api.list_containers_cli()
+
+    @api.model
+    def _reconciled_state(self, current_state, containers):
+        """
+        Estado que corresponde a la instancia según sus contenedores. Docker
+        no sabe si Odoo responde: 'starting' y 'ready' se conservan mientras
+        los contenedores sigan corriendo.
+        """
+        if not containers:
+            return 'stopped' if current_state in _ACTIVE_STATES else current_state
+        states = [c.get('State') for c in containers]
+        if all(state == 'running' for state in states):
+            return current_state if current_state in _ACTIVE_STATES else 'running'
+        if current_state not in _ACTIVE_STATES:
+            return current_state
+        # Estaba corriendo y algún contenedor cayó: error salvo salida limpia.
+        exit_codes = [docker_api.exit_code_from_status(c.get('Status')) for c in containers
+                      if c.get('State') != 'running']
+        if all(code == 0 for code in exit_codes) and not any(state == 'running' for state in states):
+            return 'stopped'
+        return 'error'
+
+    @api.model
+    def cron_reconcile_states(self):
+        """
+        Concilia odoo.docker.instance.state con Docker usando un único listado
+        de contenedores por ejecución (O(1) llamadas a Docker). Las instancias
+        con trabajos en cola se omiten para no pisar al worker. Para las que
+        quedan en 'running' se encola una sonda (un solo intento, en la cola:
+        el cron no espera respuestas HTTP) que las pasa a 'ready' si Odoo ya
+        responde. Las instancias del runtime compartido no tienen
+        contenedores propios: solo se sondean.
+        """
+        try:
+            containers = self._list_all_compose_containers()
+        except Exception as e:
+            _logger.warning("[MEJORA] No se pudo listar contenedores para conciliar: %s", e)
+            return
+
+        by_project = {}
+        for container in containers:
+            project = (container.get('Labels') or {}).get(docker_api.COMPOSE_PROJECT_LABEL)
+            if project:
+                by_project.setdefault(project, []).append(container)
+
+        busy = set(self.env['micro.saas.instance.job'].search([
+            ('state', 'in', ('pending', 'running')),
+        ]).instance_id.ids)
+        instances = self.search([
+            ('state', 'in', _ACTIVE_STATES + ('stopped', 'error')),
+            ('instance_data_path', '!=', False),
+            ('provisioning_mode', '!=', 'shared_runtime'),
+        ])
+
+        to_write = {}
+        seen_ids = []
+        for instance in instances:
+            if instance.id in busy:
+                continue
+            project_containers = by_project.get(instance._get_compose_project(), [])
+            new_state = self._reconciled_state(instance.state, project_containers)
+            if any(c.get('State') == 'running' for c in project_containers):
+                seen_ids.append(instance.id)
+            if new_state != instance.state:
+                to_write.setdefault(new_state, []).append(instance.id)
+
+        for state, ids in to_write.items():
+            changed = self.browse(ids).with_context(micro_saas_log_phase='reconcile')
+            changed.write({'state': state})
+            changed.add_to_log(f"[WARN] 🔎 Conciliación: estado actualizado a '{state}' según Docker.")
+        if seen_ids:
+            self.browse(seen_ids).write({'last_seen': fields.Datetime.now()})
+
+        unconfirmed = self.browse(seen_ids) | self.search([
+            ('state', '=', 'running'),
+            ('provisioning_mode', '=', 'shared_runtime'),
+            ('runtime_id.state', '=', 'running'),
+        ])
+        unconfirmed = unconfirmed.filtered(lambda i: i.state == 'running' and i.id not in busy)
+        if unconfirmed:
+            self.env['micro.saas.instance.job']._enqueue(unconfirmed, 'probe')
+
+    def _docker_api_lifecycle(self, operation):
+        """
+        Ejecuta start/stop/restart/pause/unpause sobre los contenedores del proyecto por el
+        API. Devuelve False si hay que usar docker-compose (API no disponible
+        o proyecto sin contenedores creados).
+        """
+        self.ensure_one()
+        containers = self._get_project_containers()
+        if not containers:
+            return False
+        client = self._get_docker_client()
+        method = {
+            'start': client.start_container,
+            'stop': client.stop_container,
+            'restart': client.restart_container,
+            'pause': client.pause_container,
+            'unpause': client.unpause_container,
+        }[operation]
+        try:
+            for container in containers:
+                method(container['Id'])
+        except docker_api.DockerAPIError as e:
+            self.add_to_log(f"[WARN] Docker API falló ({e}); se usa docker-compose.")
+            return False
+        return True
+
     # ==========================================
     #  UNLINK (OVERRIDE)
     # ==========================================
@@ -482,40 +2566,27 @@ class OdooDockerInstanceMejora(models.Model):
         """
         Override: Limpia SIEMPRE archivos y contenedores al eliminar,
         sin importar el estado. Marca puertos como inactivos.
+        Lo que no se puede deshacer (docker-compose down -v, borrar la
+        carpeta, DROP DATABASE/ROLE) corre después del commit: si la
+        eliminación falla y se revierte, la instancia queda intacta.
         """
         for instance in self:
-            # 1. Detener contenedores (en cualquier estado)
+            # 1-2. Detener contenedores (en cualquier estado) y limpiar archivos, tras el commit
             if instance.instance_data_path:
-                modified_path = os.path.join(
-                    instance.instance_data_path, 'docker-compose.yml'
-                )
-                if os.path.exists(modified_path):
-                    try:
-                        cmd = f'docker-compose -f "{modified_path}" down -v --remove-orphans'
-                        subprocess.run(
-                            cmd, shell=True, check=False,
-                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                            timeout=60
-                        )
-                    except Exception as e:
-                        _logger.warning(
-                            "[MEJORA] Error al detener contenedores de %s: %s",
-                            instance.name, str(e)
-                        )
-
-                # 2. Limpiar archivos del filesystem
-                if os.path.exists(instance.instance_data_path):
-                    try:
-                        shutil.rmtree(instance.instance_data_path)
-                    except Exception as e:
-                        _logger.warning(
-                            "[MEJORA] Error al eliminar archivos de %s: %s",
-                            instance.name, str(e)
-                        )
+                self.env.cr.postcommit.add(functools.partial(
+                    _remove_instance_files, instance.name, instance.instance_data_path,
+                ))
 
             # 3. Marcar puertos como inactivos
             self._liberar_puertos_de_instancia(instance)
 
+            # 4. Cluster o runtime compartido: eliminar la base (y el rol propio, si tiene), tras el commit
+            if instance._is_shared_db() or instance.runtime_id:
+                instance._drop_shared_database()
+
+            # 5. Proxy inverso: quitar la ruta de la instancia
+            instance._remove_proxy_route()
+
         return super(OdooDockerInstanceMejora, self).unlink()
 
     def _liberar_puertos_de_instancia(self, instance):
@@ -542,79 +2613,220 @@ class OdooDockerInstanceMejora(models.Model):
     # ==========================================
 
     def add_to_log(self, message):
-        """Override: Limpia el log y evita el 'False' inicial."""
-        self.ensure_one()
+        """
+        Override: agrega una línea a odoo.docker.instance.log.line en lugar
+        de reescribir el campo Html 'log'. Las líneas se acumulan en un buffer
+        por transacción y se insertan con un solo create antes del commit
+        (o al llamar _flush_log). La fase se toma del contexto
+        (micro_saas_log_phase).
+        """
+        buffer = self.env.cr.precommit.data.setdefault(_LOG_BUFFER_KEY, [])
+        if not buffer:
+            self.env.cr.precommit.add(self._flush_log)
         now = fields.Datetime.now()
-        # Intentar obtener hora local del contexto
-        try:
-            timestamp = fields.Datetime.context_timestamp(self, now).strftime("%d/%m/%Y, %H:%M:%S")
-        except:
-            timestamp = now.strftime("%d/%m/%Y, %H:%M:%S")
+        message = str(message)
+        level = 'info'
+        for prefix, prefix_level in _LOG_LEVEL_PREFIXES:
+            if message.startswith(prefix):
+                level = prefix_level
+                break
+        phase = self.env.context.get('micro_saas_log_phase') or False
+        for instance in self:
+            buffer.append({
+                'instance_id': instance.id,
+                'timestamp': now,
+                'level': level,
+                'phase': phase,
+                'message': message,
+            })
+
+    def _flush_log(self):
+        """Inserta en un solo create las líneas de log acumuladas."""
+        buffer = self.env.cr.precommit.data.pop(_LOG_BUFFER_KEY, None)
+        if buffer:
+            self.env['odoo.docker.instance.log.line'].sudo().create(buffer)
+
+    def _get_resource_limits(self):
+        """
+        Límites del plan de la suscripción vinculada a la instancia
+        (microsaas_subscription), o {} si no hay suscripción o el módulo no
+        está instalado. Valores 0 = sin límite.
+        """
+        self.ensure_one()
+        if 'microsaas.subscription' not in self.env or not self.id:
+            return {}
+        subscription = self.env['microsaas.subscription'].sudo().search([
+            ('instancia_id', '=', self.id),
+            ('state', '!=', 'cancelled'),
+        ], order='id desc', limit=1)
+        plan = subscription.product_id.product_tmpl_id
+        if not plan or 'limite_memoria_mb' not in plan._fields:
+            return {}
+        return {
+            'cpus': plan.limite_cpu,
+            'memory_mb': plan.limite_memoria_mb,
+            'pids': plan.limite_procesos,
+            'workers': plan.odoo_workers,
+        }
 
-        current_log = self.log if self.log and str(self.log) != 'False' else ""
-        
-        # Limitar el tamaño del log para no degradar performance
-        if len(current_log) > 20000:
-            current_log = current_log[:10000] + "...[LOG TRUNCADO PARA AGILIDAD]..."
+    @staticmethod
+    def _is_odoo_service(service):
+        """
+        Servicio de Odoo del docker-compose (el de Postgres no lleva los
+        límites del plan): por etiqueta micro_saas.odoo, comando o imagen.
+        """
+        return resources.is_odoo_service(service)
 
-        new_entry = f"<br/>\n#{timestamp} {message}"
-        self.log = new_entry + current_log
+    def _get_compose_file_content(self):
+        """
+        Contenido de docker-compose.yml de la instancia (punto de extensión),
+        con los límites de CPU, memoria y procesos del plan en el servicio
+        de Odoo. Con el proxy inverso el servicio de Odoo no publica puertos
+        y se une a la red del proxy.
+        """
+        self.ensure_one()
+        content = self.with_context(micro_saas_render_secrets=True)._get_formatted_body(
+            template_body=self.template_dc_body, demo_fallback=True)
+        limits = self._get_resource_limits()
+        options = resources.compose_limits(limits.get('cpus'), limits.get('memory_mb'), limits.get('pids'))
+        content = resources.set_service_options(content, options, self._is_odoo_service)
+        settings = self._get_proxy_settings()
+        if settings['enabled'] and self.subdomain:
+            content = proxy_tools.attach_to_network(content, settings['network'], self._get_proxy_alias(),
+                                                    self._is_odoo_service)
+        return content
+
+    def _get_odoo_conf_content(self):
+        """
+        Contenido de odoo.conf a partir del template, optimizado para evitar
+        errores de estilos (proxy_mode) y crasheos (logfile). Punto de
+        extensión para agregar opciones.
+        """
+        self.ensure_one()
+        content = self.with_context(micro_saas_render_secrets=True)._get_formatted_body(
+            template_body=self.template_odoo_conf, demo_fallback=True)
+
+        lines = content.split('\n')
+        new_lines = []
+        has_proxy_mode = False
+        has_options_header = False
+
+        for line in lines:
+            clean_line = line.strip()
+            # 1. Eliminar logfile (causa crash en Docker oficial)
+            if clean_line.startswith('logfile'):
+                continue
+            # 2. Corregir addons_path para incluir los módulos base de Odoo
+            if clean_line.startswith('addons_path'):
+                path_val = line.split('=', 1)[1].strip()
+                base_path = "/usr/lib/python3/dist-packages/odoo/addons"
+                if base_path not in path_val:
+                    line = f"addons_path = {base_path},{path_val}"
+
+            # 3. Detectar si ya tiene proxy_mode
+            if clean_line.startswith('proxy_mode'):
+                has_proxy_mode = True
+            if clean_line == '[options]':
+                has_options_header = True
+
+            new_lines.append(line)
+
+        # 3. Forzar configuraciones críticas para SaaS
+        if not has_options_header:
+            new_lines.insert(0, '[options]')
+            has_options_header = True
+
+        if not has_proxy_mode:
+            # Insertar proxy_mode justo debajo de [options]
+            idx = new_lines.index('[options]')
+            new_lines.insert(idx + 1, "proxy_mode = True")
+
+        # 4. Conexiones por proceso (en el cluster compartido, acotadas) y
+        #    workers / límites de memoria del plan
+        options = {'db_maxconn': self._get_db_maxconn()}
+        limits = self._get_resource_limits()
+        if limits.get('workers'):
+            options.update(resources.conf_limits(limits.get('memory_mb'), limits['workers']))
+        return resources.set_conf_options('\n'.join(new_lines), options)
+
+    def _get_postgres_conf_content(self):
+        """Contenido de postgresql.conf a partir del template (con los secretos)."""
+        self.ensure_one()
+        return self.with_context(micro_saas_render_secrets=True)._get_formatted_body(
+            template_body=self.template_postgres_conf, demo_fallback=True)
+
+    def render_files(self, demo_fallback=True, file_names=None):
+        """
+        Override: los archivos de cada instancia salen de los mismos
+        constructores que usa el inicio (_INSTANCE_FILE_BUILDERS), con los
+        límites del plan, el proxy inverso y los secretos; el resultado es
+        byte a byte lo que se escribe en disco. Las variables de tipo 'field'
+        usan su valor de ejemplo, como _get_formatted_body, y demo_fallback
+        se ignora (los archivos generados siempre lo usan).
+
+        `file_names` limita los archivos generados (por defecto, todos).
+        """
+        builders = [(name, method) for name, method in _INSTANCE_FILE_BUILDERS
+                    if file_names is None or name in file_names]
+        self.mapped('variable_ids').mapped('demo_value')
+        return {
+            instance.id: {name: getattr(instance, method)() for name, method in builders}
+            for instance in self
+        }
+
+    def _write_file_if_changed(self, path, content):
+        """
+        Escribe `content` en `path` solo si difiere de lo que ya hay en disco.
+        Devuelve True si el archivo se escribió (nuevo o modificado). Se
+        escribe en UTF-8, igual que se compara (create_file usa la
+        codificación del locale), y un error de escritura se propaga en
+        lugar de dejar el inicio seguir con el archivo viejo.
+        """
+        data = (content or '').encode('utf-8')
+        try:
+            with open(path, 'rb') as current:
+                if current.read() == data:
+                    return False
+        except OSError:
+            pass
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.write(data)
+        except OSError as e:
+            self.add_to_log(f"[ERROR] ❌ No se pudo escribir {path}: {e}")
+            raise UserError(f"No se pudo escribir {path}: {e}")
+        return True
+
+    def _update_docker_compose_file(self):
+        """
+        Override: escribe docker-compose.yml solo si cambió. Devuelve True si
+        se escribió.
+        """
+        self.ensure_one()
+        modified_path = os.path.join(self.instance_data_path, 'docker-compose.yml')
+        content = self.render_files(file_names=('docker-compose.yml',))[self.id]['docker-compose.yml']
+        return self._write_file_if_changed(modified_path, content)
 
     def _create_odoo_conf(self):
         """
-        Override: Optimiza odoo.conf para evitar errores de estilos (proxy_mode)
-        y crasheos (logfile).
+        Override: genera odoo.conf con render_files (_get_odoo_conf_content) y
+        lo escribe solo si cambió. Devuelve True si alguna instancia lo reescribió.
         """
+        changed = False
         for instance in self:
             odoo_conf_path = os.path.join(instance.instance_data_path, "etc", 'odoo.conf')
-            instance._makedirs(os.path.dirname(odoo_conf_path))
             try:
-                # Obtenemos el contenido del template
-                content = instance.result_odoo_conf or ""
-                
-                lines = content.split('\n')
-                new_lines = []
-                has_proxy_mode = False
-                has_options_header = False
-                
-                for line in lines:
-                    clean_line = line.strip()
-                    # 1. Eliminar logfile (causa crash en Docker oficial)
-                    if clean_line.startswith('logfile'):
-                        continue
-                    # 2. Corregir addons_path para incluir los módulos base de Odoo
-                    if clean_line.startswith('addons_path'):
-                        path_val = line.split('=', 1)[1].strip()
-                        base_path = "/usr/lib/python3/dist-packages/odoo/addons"
-                        if base_path not in path_val:
-                            line = f"addons_path = {base_path},{path_val}"
-                    
-                    # 3. Detectar si ya tiene proxy_mode
-                    if clean_line.startswith('proxy_mode'):
-                        has_proxy_mode = True
-                    if clean_line == '[options]':
-                        has_options_header = True
-                    
-                    new_lines.append(line)
-                
-                # 3. Forzar configuraciones críticas para SaaS
-                if not has_options_header:
-                    new_lines.insert(0, '[options]')
-                    has_options_header = True
-                
-                if not has_proxy_mode:
-                    # Insertar proxy_mode justo debajo de [options]
-                    idx = new_lines.index('[options]')
-                    new_lines.insert(idx + 1, "proxy_mode = True")
-                    new_lines.insert(idx + 1, "db_maxconn = 64") # Mejora estabilidad
-                
-                final_content = '\n'.join(new_lines)
-                instance.create_file(odoo_conf_path, final_content)
-                instance.add_to_log(f"[INFO] Configuración odoo.conf generada correctamente (proxy_mode=ON)")
-                
+                content = instance.render_files(file_names=('odoo.conf',))[instance.id]['odoo.conf']
+                if instance._write_file_if_changed(odoo_conf_path, content):
+                    changed = True
+                    instance.add_to_log(f"[INFO] Configuración odoo.conf generada correctamente (proxy_mode=ON)")
+                else:
+                    instance.add_to_log("[INFO] odoo.conf sin cambios")
             except Exception as e:
                 instance.add_to_log(f"[ERROR] No se pudo generar odoo.conf: {str(e)}")
                 raise UserError(f"Error al crear configuración: {str(e)}")
+        return changed
 
     def action_view_instance_ports(self):
         """Acción para el Smart Button de Puertos."""
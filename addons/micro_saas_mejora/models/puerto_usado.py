@@ -56,7 +56,7 @@ class PuertoUsado(models.Model):
                 # Verificar si hay una instancia corriendo con este nombre
                 instancia = self.env['odoo.docker.instance'].search([
                     ('name', '=', record.instancia_nombre),
-                    ('state', '=', 'running'),
+                    ('state', 'in', ('starting', 'running', 'ready')),
                 ], limit=1)
 
                 if instancia:
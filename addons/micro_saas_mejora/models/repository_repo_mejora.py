@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+from odoo import models, fields, api
+
+from ..tools import git as git_tools
+
+_logger = logging.getLogger(__name__)
+
+_DEFAULT_MIRROR_WORKERS = 4
+
+
+class RepositoryRepoMejora(models.Model):
+    """
+    Agrega opciones de clonado por repositorio y una caché local de mirrors
+    bare en el host. Los checkouts de cada instancia se hacen desde el mirror
+    (git clone --shared), así que no hay clonado por red ni objetos duplicados
+    en disco entre instancias que siguen las mismas ramas.
+    """
+    _inherit = 'repository.repo'
+
+    shallow_clone = fields.Boolean(
+        string='Clonado superficial',
+        default=False,
+        help='Clona solo el último commit de la rama (--depth 1 --single-branch). '
+             'Mucho más rápido para repositorios con historial grande. '
+             'No aplica cuando se usa la caché de mirrors.',
+    )
+    mirror_path = fields.Char(string='Mirror local', readonly=True)
+    mirror_last_fetch = fields.Datetime(string='Último fetch del mirror', readonly=True)
+    mirror_error = fields.Text(string='Error del mirror', readonly=True)
+
+    @api.model
+    def _mirror_cache_enabled(self):
+        param = self.env['ir.config_parameter'].sudo().get_param('micro_saas.git_mirror_cache', 'True')
+        return str(param).lower() not in ('0', 'false', 'no', '')
+
+    @api.model
+    def _get_mirror_dir(self):
+        return self.env['ir.config_parameter'].sudo().get_param(
+            'micro_saas.git_mirror_dir',
+            os.path.join(os.path.expanduser('~'), 'odoo_docker', 'mirrors'),
+        )
+
+    def _get_mirror_path(self):
+        """Ruta del mirror bare de este repositorio (o False si la caché está apagada)."""
+        self.ensure_one()
+        if not self.name or not self._mirror_cache_enabled():
+            return False
+        return os.path.join(self._get_mirror_dir(), git_tools.mirror_name(self.id, self.name))
+
+    @api.model
+    def cron_refresh_mirrors(self):
+        """Actualiza con git fetch todos los mirrors existentes, en paralelo."""
+        repos = self.search([('mirror_path', '!=', False)])
+        repos = repos.filtered(lambda r: os.path.isdir(r.mirror_path))
+        if not repos:
+            return
+        results = git_tools.run_parallel(git_tools.refresh_mirror, repos.mapped('mirror_path'),
+                                         _DEFAULT_MIRROR_WORKERS)
+        now = fields.Datetime.now()
+        for repo, result in zip(repos, results):
+            if result['ok']:
+                repo.write({'mirror_last_fetch': now, 'mirror_error': False})
+            else:
+                _logger.warning("[MEJORA] No se pudo actualizar el mirror %s: %s", repo.mirror_path, result['error'])
+                repo.write({'mirror_error': result['error']})
+
+
+class RepositoryRepoLineMejora(models.Model):
+    """Registra el resultado del último clonado de cada línea."""
+    _inherit = 'repository.repo.line'
+
+    clone_error = fields.Text(string='Error de Clonado', readonly=True)
+    clone_duration = fields.Float(string='Duración (s)', readonly=True, digits=(16, 2))
+    commit_sha = fields.Char(string='Commit', readonly=True, help='Commit actualmente desplegado en el checkout.')
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+import functools
+import logging
+import os
+import subprocess
+import threading
+
+import psycopg2
+
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.exceptions import UserError
+
+from ..tools import docker_api
+from ..tools import postgres as pg_tools
+from ..tools import proxy as proxy_tools
+from ..tools import resources
+from ..tools import template as template_tools
+
+_logger = logging.getLogger(__name__)
+
+# Límites de los comandos del runtime (segundos).
+_RUNTIME_UP_TIMEOUT = 900
+_TENANT_INIT_TIMEOUT = 1800
+# Un runtime recibe pedidos de inicio de muchos inquilinos a la vez: sus
+# archivos y su docker-compose up se serializan por runtime en el proceso.
+_RUNTIME_LOCKS = {}
+_RUNTIME_LOCKS_GUARD = threading.Lock()
+
+
+def _runtime_lock(runtime_id):
+    with _RUNTIME_LOCKS_GUARD:
+        return _RUNTIME_LOCKS.setdefault(runtime_id, threading.Lock())
+
+
+def _remove_runtime(name, compose_path, pg_settings, role):
+    """Baja el contenedor de un runtime eliminado y borra su rol del cluster."""
+    if os.path.exists(compose_path):
+        try:
+            subprocess.run(
+                ['docker-compose', '-f', compose_path, 'down', '--remove-orphans'],
+                check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60,
+            )
+        except Exception as e:
+            _logger.warning("[MEJORA] No se pudo bajar el runtime %s: %s", name, e)
+    if not role:
+        return
+    try:
+        with pg_tools.admin_connection(pg_settings['host'], pg_settings['port'], pg_settings['user'],
+                                       pg_settings['password']) as conn:
+            pg_tools.drop_role(conn, role)
+    except psycopg2.Error as e:
+        _logger.warning("[MEJORA] No se pudo eliminar el rol del runtime %s: %s", name, e)
+
+
+class SharedRuntime(models.Model):
+    """
+    Runtime Odoo compartido: un solo contenedor Odoo por plantilla (y por
+    lo tanto por versión) que sirve a muchas instancias pequeñas, una base
+    cada una en el cluster Postgres compartido. dbfilter = ^%d$ elige la
+    base por el subdominio (<base>.<micro_saas.base_domain>) y todas las
+    instancias comparten el par de puertos del runtime.
+
+    Los puertos se reservan con el mismo asignador que las instancias y
+    quedan en micro.saas.puerto.usado a nombre del runtime. Con el proxy
+    inverso activo el runtime no publica puertos: nginx llega a él por la
+    red del proxy.
+    """
+    _name = 'micro.saas.shared.runtime'
+    _description = 'Runtime Odoo compartido (multi-base)'
+    _order = 'name'
+
+    name = fields.Char(string='Nombre', required=True)
+    template_id = fields.Many2one(
+        'docker.compose.template',
+        string='Plantilla',
+        required=True,
+        ondelete='restrict',
+        domain=[('provisioning_mode', '=', 'shared_runtime')],
+    )
+    state = fields.Selection([
+        ('stopped', 'Detenido'),
+        ('running', 'Corriendo'),
+        ('error', 'Error'),
+    ], string='Estado', default='stopped', readonly=True, copy=False)
+    http_port = fields.Integer(string='Puerto HTTP', readonly=True, copy=False)
+    longpolling_port = fields.Integer(string='Puerto Longpolling', readonly=True, copy=False)
+    data_path = fields.Char(string='Carpeta', readonly=True, copy=False)
+    db_user = fields.Char(string='Rol de base de datos', readonly=True, copy=False)
+    db_password = fields.Char(readonly=True, copy=False, groups='base.group_system')
+    workers = fields.Integer(
+        string='Workers',
+        default=4,
+        help='Procesos de Odoo del runtime, compartidos por todas sus instancias.',
+    )
+    memory_mb = fields.Integer(
+        string='Memoria (MB)',
+        default=0,
+        help='Límite de memoria del contenedor (mem_limit, tope de RSS de todos los workers). '
+             'limit_memory_* de Odoo mide memoria virtual y queda en sus valores por defecto. '
+             '0 = sin límite.',
+    )
+    last_error = fields.Text(string='Último error', readonly=True, copy=False)
+    instance_ids = fields.One2many('odoo.docker.instance', 'runtime_id', string='Instancias')
+    instance_count = fields.Integer(string='Nº de Instancias', compute='_compute_instance_count')
+
+    _sql_constraints = [
+        ('template_uniq', 'unique(template_id)', 'Ya existe un runtime compartido para esta plantilla.'),
+    ]
+
+    @api.depends('instance_ids')
+    def _compute_instance_count(self):
+        for runtime in self:
+            runtime.instance_count = len(runtime.instance_ids)
+
+    # ==========================================
+    #  ALTA (PUERTOS, ROL Y CARPETA)
+    # ==========================================
+
+    @api.model
+    def _get_for_template(self, template):
+        """
+        Runtime de la plantilla, creado si no existe. Debe llamarse en una
+        transacción corta (al encolar el inicio): reserva puertos con el
+        lock del asignador, que también serializa dos altas simultáneas
+        (por eso se toma aun con el proxy activo: pasa una sola vez por
+        plantilla).
+        """
+        runtime = self.sudo().search([('template_id', '=', template.id)], limit=1)
+        if runtime:
+            return runtime
+        Instance = self.env['odoo.docker.instance']
+        Instance._lock_port_allocator()
+        runtime = self.sudo().search([('template_id', '=', template.id)], limit=1)
+        if runtime:
+            return runtime
+        if Instance._is_proxy_enabled():
+            http_port, longpolling_port = 0, 0
+        else:
+            http_port, longpolling_port = Instance._allocate_port_pair()
+        slug = pg_tools.identifier(f"{template.id}_{template.name}", prefix='')
+        runtime = self.sudo().create({
+            'name': f"Runtime - {template.name}",
+            'template_id': template.id,
+            'http_port': http_port,
+            'longpolling_port': longpolling_port,
+            'data_path': os.path.join(os.path.expanduser('~'), 'odoo_docker', 'runtimes', slug),
+            'db_user': pg_tools.identifier(f"runtime_{slug}"),
+            'db_password': pg_tools.new_password(),
+        })
+        runtime._registrar_puertos()
+        _logger.info("[MEJORA] Runtime compartido '%s' creado en los puertos %s/%s",
+                     runtime.name, http_port, longpolling_port)
+        return runtime
+
+    def _registrar_puertos(self):
+        """Reserva los puertos del runtime en micro.saas.puerto.usado."""
+        PuertoUsado = self.env['micro.saas.puerto.usado'].sudo()
+        for runtime in self:
+            for port, tipo in ((runtime.http_port, 'http'), (runtime.longpolling_port, 'longpolling')):
+                if not port:
+                    continue
+                existente = PuertoUsado.search([('puerto', '=', port), ('tipo', '=', tipo)], limit=1)
+                vals = {
+                    'activo': True,
+                    'instancia_nombre': runtime.name,
+                    'fecha_asignacion': fields.Datetime.now(),
+                    'fecha_liberacion': False,
+                }
+                if existente:
+                    existente.write(vals)
+                else:
+                    PuertoUsado.create(dict(vals, puerto=port, tipo=tipo))
+
+    def unlink(self):
+        """
+        Libera los puertos y, después del commit (si la eliminación se
+        revierte, el runtime sigue funcionando), baja el contenedor y
+        elimina el rol del runtime.
+        """
+        pg_settings = self.env['odoo.docker.instance']._get_shared_pg_settings()
+        for runtime in self:
+            if runtime.instance_ids:
+                raise UserError(f"El runtime '{runtime.name}' todavía tiene instancias.")
+            self.env['micro.saas.puerto.usado'].sudo().search([
+                ('puerto', 'in', [runtime.http_port, runtime.longpolling_port]),
+                ('activo', '=', True),
+            ]).write({'activo': False, 'fecha_liberacion': fields.Datetime.now()})
+            self.env.cr.postcommit.add(functools.partial(
+                _remove_runtime, runtime.name, runtime._get_compose_path(), pg_settings, runtime.db_user,
+            ))
+        return super().unlink()
+
+    # ==========================================
+    #  ARCHIVOS DEL RUNTIME
+    # ==========================================
+
+    def _get_compose_path(self):
+        self.ensure_one()
+        return os.path.join(self.data_path or '', 'docker-compose.yml')
+
+    def _get_render_values(self):
+        """Variables de la plantilla con los puertos y la conexión del runtime."""
+        self.ensure_one()
+        runtime = self.sudo()
+        settings = self.env['odoo.docker.instance']._get_shared_pg_settings()
+        values = runtime.template_id._get_variable_values(demo_fallback=True)
+        values.update({
+            '{{HTTP-PORT}}': str(runtime.http_port),
+            '{{LONGPOLLING-PORT}}': str(runtime.longpolling_port),
+            '{{DB_HOST}}': settings['container_host'],
+            '{{DB_PORT}}': settings['container_port'],
+            '{{DB_USER}}': runtime.db_user,
+            '{{DB_PASSWORD}}': runtime.db_password,
+        })
+        return values
+
+    def _get_compose_content(self):
+        self.ensure_one()
+        content = template_tools.render_variables(self.template_id.template_dc_body or '', self._get_render_values())
+        options = resources.compose_limits(memory_mb=self.memory_mb)
+        content = resources.set_service_options(content, options, self._is_odoo_service)
+        settings = self.env['odoo.docker.instance']._get_proxy_settings()
+        if settings['enabled']:
+            content = proxy_tools.attach_to_network(content, settings['network'], self._get_proxy_alias(),
+                                                    self._is_odoo_service)
+        return content
+
+    def _get_proxy_alias(self):
+        """Alias del runtime en la red del proxy (el mismo para todas sus bases)."""
+        self.ensure_one()
+        return f"ms-runtime-{self.id}"
+
+    def _get_conf_content(self):
+        """odoo.conf multi-base: una base por subdominio y sin selector de bases."""
+        self.ensure_one()
+        content = template_tools.render_variables(self.template_id.template_odoo_conf or '', self._get_render_values())
+        options = {
+            'dbfilter': '^%d$',
+            'list_db': False,
+            'proxy_mode': True,
+            'db_maxconn': self.env['odoo.docker.instance']._get_shared_pg_settings()['db_maxconn'],
+        }
+        options.update(resources.conf_limits(self.memory_mb, self.workers))
+        return resources.set_conf_options(content, options)
+
+    @staticmethod
+    def _is_odoo_service(service):
+        return resources.is_odoo_service(service)
+
+    @staticmethod
+    def _write_if_changed(path, content):
+        """Escribe `content` en `path` solo si cambió. Devuelve True si lo escribió."""
+        data = (content or '').encode('utf-8')
+        try:
+            with open(path, 'rb') as current:
+                if current.read() == data:
+                    return False
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as handle:
+            handle.write(data)
+        return True
+
+    # ==========================================
+    #  CICLO DE VIDA
+    # ==========================================
+
+    def _get_containers(self):
+        """Contenedores del proyecto compose del runtime por el API, o None."""
+        self.ensure_one()
+        client = self.env['odoo.docker.instance']._get_docker_client()
+        if not client:
+            return None
+        try:
+            return client.project_containers(docker_api.compose_project_name(self.data_path))
+        except docker_api.DockerAPIError as e:
+            _logger.warning("[MEJORA] Docker API no disponible para el runtime %s: %s", self.name, e)
+            return None
+
+    def _set_state(self, state, error=False):
+        """
+        Estado del runtime en un cursor propio: varios trabajos de inicio lo
+        consultan a la vez y no deben chocar por escribir la misma fila.
+        """
+        self.ensure_one()
+        if self.state == state and not error:
+            return
+        with self.pool.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env[self._name].browse(self.id).write({'state': state, 'last_error': error})
+        self.invalidate_recordset(['state', 'last_error'])
+
+    def _ensure_role(self):
+        """Rol del runtime en el cluster compartido: dueño de las bases de sus instancias."""
+        self.ensure_one()
+        runtime = self.sudo()
+        try:
+            with self.env['odoo.docker.instance']._shared_pg_connection() as conn:
+                pg_tools.ensure_role(conn, runtime.db_user, runtime.db_password)
+        except psycopg2.Error as e:
+            raise UserError(f"No se pudo preparar el rol del runtime en el cluster Postgres compartido: {e}")
+
+    def _ensure_running(self, instance):
+        """
+        Deja el runtime corriendo con sus archivos al día. Si ya corre y nada
+        cambió no hace nada; si solo cambió odoo.conf lo reinicia, y si no,
+        docker-compose up -d. La salida va al log de `instance`, la que
+        pidió el inicio. Devuelve False si falló.
+        """
+        self.ensure_one()
+        with _runtime_lock(self.id):
+            self._ensure_role()
+            Instance = self.env['odoo.docker.instance']
+            if Instance._is_proxy_enabled():
+                Instance._ensure_proxy_network()
+            compose_path = self._get_compose_path()
+            compose_changed = self._write_if_changed(compose_path, self._get_compose_content())
+            conf_changed = self._write_if_changed(os.path.join(self.data_path, 'etc', 'odoo.conf'),
+                                                  self._get_conf_content())
+            containers = self._get_containers()
+            running = bool(containers) and all(c.get('State') == 'running' for c in containers)
+            if running and not compose_changed and not conf_changed:
+                self._set_state('running')
+                return True
+            command = 'restart' if running and not compose_changed else 'up'
+            instance.add_to_log(f"[INFO] 🏢 Runtime compartido '{self.name}': docker-compose {command}...")
+            args = ['docker-compose', '-f', compose_path, command] + (['-d'] if command == 'up' else [])
+            result = instance._run_command_live(args, timeout=_RUNTIME_UP_TIMEOUT)
+            if result.cancelled:
+                raise UserError("Inicio cancelado mientras se levantaba el runtime compartido.")
+            if not result.ok:
+                error = result.error_text()[-1000:]
+                self._set_state('error', error)
+                instance.add_to_log(f"[ERROR] ❌ No se pudo levantar el runtime compartido: {error}")
+                return False
+            self._set_state('running')
+            return True
+
+    def _initialize_database(self, instance, dbname, modules='base', conf=None):
+        """
+        Instala `modules` en la base nueva de una instancia con un contenedor
+        de un solo uso del runtime (docker-compose run --rm ... -d <base>).
+        `conf` es la ruta en el contenedor de un odoo.conf alternativo (p. ej.
+        con el rol de la base modelo, ver resources.temporary_conf).
+        Devuelve False si falló.
+        """
+        self.ensure_one()
+        services = resources.service_names(self._get_compose_content(), self._is_odoo_service)
+        if not services:
+            instance.add_to_log("[ERROR] ❌ La plantilla del runtime no tiene un servicio de Odoo.")
+            return False
+        instance.add_to_log(f"[INFO] 🐘 Inicializando la base '{dbname}' en el runtime compartido "
+                            f"(módulos: {modules})...")
+        run_args = ['-e', f'ODOO_RC={conf}'] if conf else []
+        result = instance._run_command_live(
+            ['docker-compose', '-f', self._get_compose_path(), 'run', '--rm', *run_args, services[0],
+             'odoo', '-d', dbname, '-i', modules, '--without-demo=all', '--stop-after-init'],
+            timeout=_TENANT_INIT_TIMEOUT,
+        )
+        if result.cancelled:
+            raise UserError("Inicio cancelado durante la inicialización de la base.")
+        if not result.ok:
+            instance.add_to_log(f"[ERROR] ❌ No se pudo inicializar la base: {result.error_text()[-1000:]}")
+            return False
+        return True
+
+    def action_view_instances(self):
+        self.ensure_one()
+        return {
+            'name': f'Instancias de {self.name}',
+            'type': 'ir.actions.act_window',
+            'res_model': 'odoo.docker.instance',
+            'view_mode': 'tree,form',
+            'domain': [('runtime_id', '=', self.id)],
+        }
@@ -0,0 +1,43 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+
+/**
+ * Recarga el formulario de una instancia cuando llegan líneas nuevas de su
+ * log (salida en vivo de docker pull / docker-compose up / git).
+ * El servidor publica en el canal "micro_saas.instance_log" un aviso
+ * { instance_id } por cada lote de líneas guardado.
+ */
+const RELOAD_DELAY = 1500;
+
+export const instanceLogService = {
+    dependencies: ["bus_service", "action"],
+
+    start(env, { bus_service, action }) {
+        let timer = null;
+
+        const isShowingInstance = (instanceId) => {
+            const controller = action.currentController;
+            return (
+                controller &&
+                controller.props.resModel === "odoo.docker.instance" &&
+                controller.props.resId === instanceId
+            );
+        };
+
+        bus_service.addChannel("micro_saas.instance_log");
+        bus_service.subscribe("micro_saas/instance_log", ({ instance_id }) => {
+            if (timer || !isShowingInstance(instance_id)) {
+                return;
+            }
+            timer = setTimeout(() => {
+                timer = null;
+                if (isShowingInstance(instance_id)) {
+                    action.doAction("soft_reload");
+                }
+            }, RELOAD_DELAY);
+        });
+    },
+};
+
+registry.category("services").add("micro_saas_instance_log", instanceLogService);
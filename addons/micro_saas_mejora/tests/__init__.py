@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from . import test_docker_api
+from . import test_git
+from . import test_golden_snapshot
+from . import test_instance_job
+from . import test_placeholder_index
+from . import test_port_allocator
+from . import test_ports
+from . import test_postgres
+from . import test_process
+from . import test_proxy
+from . import test_readiness
+from . import test_render_files
+from . import test_resources
+from . import test_template
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+from odoo.tests import BaseCase, tagged
+
+from ..tools import docker_api
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _StubDocker(BaseHTTPRequestHandler):
+    """
+    Daemon Docker de prueba: responde según server.routes
+    {(método, ruta): (status, cuerpo)} y registra cada pedido.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.requests.append((self.command, url.path, parse_qs(url.query), body))
+        status, payload = self.server.routes.get((self.command, url.path), (404, {'message': 'no existe'}))
+        data = b'' if payload is None else (payload if isinstance(payload, bytes) else json.dumps(payload).encode())
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestDockerAPI(BaseCase):
+    """Cliente del Docker Engine API contra un socket unix local."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp(prefix='micro_saas_docker_')
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.socket_path = os.path.join(directory, 'docker.sock')
+        self.server = _UnixHTTPServer(self.socket_path, _StubDocker)
+        self.server.routes = {}
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = docker_api.DockerClient(self.socket_path, timeout=5)
+        self.addCleanup(self.client._reset_connection)
+
+    def _route(self, method, path, status=200, payload=None):
+        self.server.routes[(method, f'/{docker_api.API_VERSION}{path}')] = (status, payload)
+
+    def test_ping_and_keep_alive(self):
+        self._route('GET', '/_ping', payload=b'OK')
+        self.assertTrue(self.client.is_available())
+        self.assertTrue(self.client.ping())
+        connection = self.client._connection()
+        self.assertTrue(self.client.ping())
+        self.assertIs(self.client._connection(), connection)
+
+    def test_project_containers(self):
+        containers = [{'Id': 'abc', 'State': 'running', 'Labels': {docker_api.COMPOSE_PROJECT_LABEL: 'cliente'}}]
+        self._route('GET', '/containers/json', payload=containers)
+        self.assertEqual(self.client.project_containers('cliente'), containers)
+        _method, _path, query, _body = self.server.requests[-1]
+        self.assertEqual(query['all'], ['true'])
+        self.assertEqual(json.loads(query['filters'][0]),
+                         {'label': [f'{docker_api.COMPOSE_PROJECT_LABEL}=cliente']})
+
+    def test_error_status(self):
+        self._route('POST', '/containers/abc/restart', status=500, payload={'message': 'falló'})
+        with self.assertRaises(docker_api.DockerAPIError) as error:
+            self.client.restart_container('abc')
+        self.assertEqual(error.exception.status, 500)
+        self.assertEqual(str(error.exception), 'falló')
+
+    def test_start_already_started(self):
+        # 304 = el contenedor ya estaba iniciado.
+        self._route('POST', '/containers/abc/start', status=304)
+        self.client.start_container('abc')
+
+    def test_network_exists(self):
+        self._route('GET', '/networks/micro_saas_proxy', payload={'Name': 'micro_saas_proxy'})
+        self.assertTrue(self.client.network_exists('micro_saas_proxy'))
+        self.assertFalse(self.client.network_exists('otra'))
+
+    def test_create_network(self):
+        self._route('POST', '/networks/create', status=201, payload={'Id': 'net'})
+        self.client.create_network('micro_saas_proxy')
+        _method, _path, _query, body = self.server.requests[-1]
+        self.assertEqual(json.loads(body)['Name'], 'micro_saas_proxy')
+
+    def test_container_stats_one_shot(self):
+        stats = {'networks': {'eth0': {'rx_bytes': 100, 'tx_bytes': 50}, 'eth1': {'rx_bytes': 1}}}
+        self._route('GET', '/containers/abc/stats', payload=stats)
+        self.assertEqual(docker_api.network_bytes(self.client.container_stats('abc')), 151)
+        _method, _path, query, _body = self.server.requests[-1]
+        self.assertEqual(query, {'stream': ['false'], 'one-shot': ['true']})
+
+    def test_daemon_unavailable(self):
+        client = docker_api.DockerClient(self.socket_path + '.missing', timeout=1)
+        self.assertFalse(client.is_available())
+        with self.assertRaises(docker_api.DockerAPIError):
+            client.ping()
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestDockerHelpers(BaseCase):
+
+    def test_compose_project_name(self):
+        self.assertEqual(docker_api.compose_project_name('/home/odoo/odoo_docker/Cliente Uno/'), 'clienteuno')
+        self.assertEqual(docker_api.compose_project_name('/data/_mi-instancia.2'), 'mi-instancia2')
+
+    def test_exit_code_from_status(self):
+        self.assertEqual(docker_api.exit_code_from_status('Exited (137) 2 minutes ago'), 137)
+        self.assertIsNone(docker_api.exit_code_from_status('Up 3 hours'))
+
+    def test_network_bytes_without_networks(self):
+        self.assertEqual(docker_api.network_bytes({}), 0)
+        self.assertEqual(docker_api.network_bytes(None), 0)
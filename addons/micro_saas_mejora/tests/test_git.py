@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from odoo.tests import BaseCase, tagged
+
+from ..tools import git as git_tools
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestGit(BaseCase):
+    """Clonado y actualización contra un repositorio bare local (sin red)."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp(prefix='micro_saas_git_')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.remote = os.path.join(self.directory, 'remote.git')
+        self.work = os.path.join(self.directory, 'work')
+        git_tools.run_git(['init', '--bare', '--initial-branch', 'main', self.remote])
+        git_tools.run_git(['clone', self.remote, self.work])
+        self.first_sha = self._commit('primero')
+
+    def _commit(self, message):
+        """Commit con un archivo nuevo en la rama main del remoto; devuelve su SHA."""
+        with open(os.path.join(self.work, f'{message}.txt'), 'w') as handle:
+            handle.write(message)
+        git_tools.run_git(['add', '.'], cwd=self.work)
+        git_tools.run_git(['-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+                           'commit', '-m', message], cwd=self.work)
+        git_tools.run_git(['push', 'origin', 'HEAD:main'], cwd=self.work)
+        return git_tools._rev_parse(self.work)
+
+    def _spec(self, name, **extra):
+        return dict({'url': self.remote, 'branch': 'main', 'path': os.path.join(self.directory, name)}, **extra)
+
+    def test_mirror_name(self):
+        name = git_tools.mirror_name(7, 'https://github.com/OCA/web.git')
+        self.assertTrue(name.startswith('repo_7_web_'))
+        self.assertTrue(name.endswith('.git'))
+        self.assertEqual(name, git_tools.mirror_name(7, 'https://github.com/OCA/web.git'))
+        self.assertNotEqual(name, git_tools.mirror_name(7, 'https://gitlab.com/OCA/web.git'))
+
+    def test_clone(self):
+        result = git_tools.clone(self._spec('checkout', shallow=True))
+        self.assertTrue(result['ok'], result['error'])
+        self.assertFalse(result['from_mirror'])
+        self.assertEqual(git_tools._rev_parse(os.path.join(self.directory, 'checkout')), self.first_sha)
+
+    def test_clone_missing_branch(self):
+        result = git_tools.clone(self._spec('checkout', branch='no-existe'))
+        self.assertFalse(result['ok'])
+        self.assertTrue(result['error'])
+
+    def test_clone_from_mirror(self):
+        mirror = os.path.join(self.directory, 'mirrors', 'remote.git')
+        result = git_tools.clone(self._spec('checkout', mirror=mirror))
+        self.assertTrue(result['ok'], result['error'])
+        self.assertTrue(result['from_mirror'])
+        self.assertTrue(result['mirror_fetched'])
+        # El segundo checkout usa el mirror sin volver a descargarlo.
+        result = git_tools.clone(self._spec('checkout2', mirror=mirror))
+        self.assertTrue(result['from_mirror'])
+        self.assertFalse(result['mirror_fetched'])
+
+    def test_sync_updates_only_when_changed(self):
+        spec = self._spec('checkout')
+        result = git_tools.sync(spec)
+        self.assertFalse(result['updated'])
+        self.assertEqual(result['sha'], self.first_sha)
+
+        result = git_tools.sync(spec)
+        self.assertTrue(result['updated'])
+        self.assertFalse(result['changed'])
+
+        second_sha = self._commit('segundo')
+        result = git_tools.sync(spec)
+        self.assertTrue(result['ok'], result['error'])
+        self.assertTrue(result['changed'])
+        self.assertEqual(result['sha'], second_sha)
+        self.assertTrue(os.path.exists(os.path.join(spec['path'], 'segundo.txt')))
+
+    def test_run_parallel_keeps_order(self):
+        self.assertEqual(git_tools.run_parallel(lambda value: value * 2, [3, 1, 2], max_workers=2), [6, 2, 4])
+        self.assertEqual(git_tools.run_parallel(lambda value: value, [], max_workers=2), [])
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import contextlib
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from ..tools import postgres as pg_tools
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestGoldenSnapshot(TransactionCase):
+    """Base modelo: quién la construye y los caminos que vuelven a la inicialización de cero."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Snapshot = cls.env['micro.saas.golden.snapshot']
+        cls.template = cls.env['docker.compose.template'].create({
+            'name': 'Plantilla base modelo',
+            'template_dc_body': 'services:\n  web:\n    image: odoo:17.0\n',
+        })
+        cls.instance = cls.env['odoo.docker.instance'].create({
+            'name': 'base-modelo',
+            'template_id': cls.template.id,
+        })
+
+    def setUp(self):
+        super().setUp()
+        # Sin cluster compartido: las operaciones de Postgres se registran en self.pg_calls.
+        self.pg_calls = []
+        self.patch(type(self.env['odoo.docker.instance']), '_shared_pg_connection',
+                   lambda instance, dbname='postgres': contextlib.nullcontext(dbname))
+        for name in ('ensure_role', 'drop_database', 'ensure_database', 'set_owner',
+                     'set_allow_connections', 'adopt_objects', 'reset_odoo_identity'):
+            self.patch(pg_tools, name, self._recorder(name))
+        self.patch(pg_tools, 'internalize_attachments', lambda conn, filestore_dir: (0, 0))
+
+    def _recorder(self, name):
+        def record(*args, **kwargs):
+            self.pg_calls.append((name,) + args[1:])
+        return record
+
+    def _snapshot(self, **vals):
+        return self.Snapshot.create(dict({
+            'name': 'Base modelo de prueba',
+            'template_id': self.template.id,
+            'db_name': 'ms_golden_prueba',
+            'db_user': 'ms_golden_rol',
+            'source_hash': 'hash-a',
+            'state': 'ready',
+        }, **vals))
+
+    def _not_called(self, *args):
+        self.fail("La base modelo no debía construirse.")
+
+    def test_acquire_ready(self):
+        snapshot = self._snapshot()
+        self.assertEqual(self.Snapshot._acquire(self.template, 'hash-a', 'base')['state'], 'ready')
+        # Otro hash: este inicio la reconstruye y recuerda la base anterior para borrarla.
+        acquired = self.Snapshot._acquire(self.template, 'hash-b', 'base')
+        self.assertEqual(acquired['state'], 'building')
+        self.assertEqual(acquired['previous_db'], 'ms_golden_prueba')
+        # _acquire, _update y _clone escriben en cursores propios: se relee.
+        snapshot.invalidate_recordset()
+        self.assertEqual((snapshot.state, snapshot.source_hash), ('building', 'hash-b'))
+
+    def test_provision_while_another_start_builds(self):
+        self._snapshot(state='building', build_started_at=fields.Datetime.now())
+        self.assertFalse(self.Snapshot._provision(self.instance, 'ms_cliente', 'ms_cliente',
+                                                  'hash-a', 'base', self._not_called))
+        self.assertFalse(self.pg_calls)
+
+    def test_stale_build_is_taken_over(self):
+        snapshot = self._snapshot(state='building',
+                                  build_started_at=fields.Datetime.now() - timedelta(hours=2))
+        self.assertEqual(self.Snapshot._acquire(self.template, 'hash-a', 'base')['state'], 'building')
+        snapshot.invalidate_recordset()
+        self.assertGreater(snapshot.build_started_at, fields.Datetime.now() - timedelta(minutes=1))
+
+    def test_failed_build_falls_back(self):
+        self.assertFalse(self.Snapshot._provision(self.instance, 'ms_cliente', 'ms_cliente',
+                                                  'hash-a', 'base', lambda db, role, password: None))
+        snapshot = self.Snapshot.search([('template_id', '=', self.template.id)])
+        self.assertEqual(snapshot.state, 'error')
+        self.assertTrue(snapshot.last_error)
+        # La base modelo a medio construir se elimina y la del cliente no se toca.
+        dropped = [call[1] for call in self.pg_calls if call[0] == 'drop_database']
+        self.assertIn(pg_tools.identifier(f"golden_{self.template.id}_hash-a"), dropped)
+        self.assertNotIn('ms_cliente', dropped)
+
+    def test_build_then_clone(self):
+        built = []
+
+        def build(db, role, password):
+            built.append(db)
+            return '/tmp/filestore-inexistente'
+
+        self.assertTrue(self.Snapshot._provision(self.instance, 'ms_cliente', 'ms_cliente', 'hash-a', 'base', build))
+        snapshot = self.Snapshot.search([('template_id', '=', self.template.id)])
+        self.assertEqual((snapshot.state, snapshot.db_name, snapshot.clone_count), ('ready', built[0], 1))
+        self.assertIn(('ensure_database', 'ms_cliente', 'ms_cliente'), [call[:3] for call in self.pg_calls])
+        # Con la base lista, el siguiente inicio solo copia.
+        self.assertTrue(self.Snapshot._provision(self.instance, 'ms_otro', 'ms_otro', 'hash-a', 'base',
+                                                 self._not_called))
+        snapshot.invalidate_recordset()
+        self.assertEqual(snapshot.clone_count, 2)
+
+    def test_failed_clone_recreates_empty_database(self):
+        self._snapshot()
+
+        def adopt_objects(conn, old_role, new_role):
+            raise psycopg2.OperationalError("sin conexión")
+
+        self.patch(pg_tools, 'adopt_objects', adopt_objects)
+        self.assertFalse(self.Snapshot._provision(self.instance, 'ms_cliente', 'ms_cliente',
+                                                  'hash-a', 'base', self._not_called))
+        # La base queda vacía otra vez (sin template) para la inicialización de cero.
+        self.assertEqual(self.pg_calls[-2:], [('drop_database', 'ms_cliente'),
+                                              ('ensure_database', 'ms_cliente', 'ms_cliente')])
+
+    def test_template_change_marks_outdated(self):
+        snapshot = self._snapshot()
+        self.template.db_init_modules = 'base,web'
+        self.assertEqual(snapshot.state, 'outdated')
+
+    def test_disabled_on_template(self):
+        self.template.use_golden_snapshot = False
+        self.assertFalse(self.instance._restore_golden_snapshot())
+        self.assertFalse(self.Snapshot.search([('template_id', '=', self.template.id)]))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from ..tools import readiness
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestInstanceJobClaim(TransactionCase):
+    """_claim: un trabajo por instancia y la concurrencia máxima de cada lote."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Job = cls.env['micro.saas.instance.job']
+        cls.Job.search([('state', 'in', ('pending', 'running'))]).write({'state': 'cancelled'})
+        cls.instances = cls.env['odoo.docker.instance'].create([
+            {'name': f'cola-{index}'} for index in range(4)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        # _claim confirma su transacción para liberar las filas; aquí no.
+        self.patch(type(self.env.cr), 'commit', lambda cr: None)
+
+    def _job(self, instance, operation='start', **vals):
+        return self.Job.create(dict({
+            'instance_id': instance.id,
+            'operation': operation,
+            'scheduled_at': fields.Datetime.now() - timedelta(minutes=1),
+        }, **vals))
+
+    def _claimed_ids(self, limit=10, busy=()):
+        self.env.flush_all()
+        return [job_id for job_id, _instance_id in self.Job._claim(limit, set(busy))]
+
+    def test_claim_one_job_per_instance(self):
+        first = self._job(self.instances[0])
+        second = self._job(self.instances[0], 'probe')
+        other = self._job(self.instances[1])
+        self.assertEqual(self._claimed_ids(), [first.id, other.id])
+        self.assertEqual(first.state, 'running')
+        self.assertEqual(second.state, 'pending')
+        # Mientras el primero corre, la instancia no entrega otro trabajo.
+        self.assertEqual(self._claimed_ids(), [])
+        first.state = 'done'
+        self.assertEqual(self._claimed_ids(), [second.id])
+
+    def test_claim_skips_busy_and_future_jobs(self):
+        busy = self._job(self.instances[0])
+        self._job(self.instances[1], scheduled_at=fields.Datetime.now() + timedelta(hours=1))
+        free = self._job(self.instances[2])
+        self.assertEqual(self._claimed_ids(busy=self.instances[0].ids), [free.id])
+        self.assertEqual(busy.state, 'pending')
+
+    def test_claim_limit(self):
+        jobs = [self._job(instance) for instance in self.instances]
+        self.assertEqual(self._claimed_ids(limit=2), [jobs[0].id, jobs[1].id])
+
+    def test_claim_batch_concurrency(self):
+        batch = self.env['micro.saas.instance.job.batch'].create({
+            'name': 'Lote de prueba',
+            'operation': 'start',
+            'max_concurrency': 1,
+        })
+        batch_jobs = [self._job(instance, batch_id=batch.id) for instance in self.instances[:3]]
+        loose = self._job(self.instances[3])
+        # Con el cupo del lote lleno, el trabajo suelto se toma igual.
+        self.assertEqual(self._claimed_ids(), [batch_jobs[0].id, loose.id])
+        self.assertEqual(self._claimed_ids(), [])
+        batch_jobs[0].state = 'done'
+        self.assertEqual(self._claimed_ids(), [batch_jobs[1].id])
+
+    def test_batch_concurrency_clamped_to_workers(self):
+        batch = self.env['micro.saas.instance.job.batch'].create({
+            'name': 'Lote grande',
+            'operation': 'stop',
+            'max_concurrency': 1000,
+        })
+        self.assertEqual(batch.max_concurrency, self.Job._get_worker_count())
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestReadinessProbeJob(TransactionCase):
+    """La sonda hace un intento por ejecución y se reprograma en lugar de bloquear un hilo."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.instance = cls.env['odoo.docker.instance'].create({'name': 'sonda'})
+
+    def setUp(self):
+        super().setUp()
+        self.attempts = []
+        self.answer = (False, '/web/health: ConnectionRefusedError')
+        self.patch(type(self.instance), '_get_probe_target',
+                   lambda instance: ('127.0.0.1', 8069, None, readiness.HEALTH_PATHS))
+        self.patch(readiness, 'probe', self._probe)
+
+    def _probe(self, host, port, paths=readiness.HEALTH_PATHS, timeout=readiness.REQUEST_TIMEOUT, host_header=None):
+        self.attempts.append(timeout)
+        return self.answer
+
+    def _start(self, seconds_ago):
+        self.instance.write({
+            'state': 'starting',
+            'starting_at': fields.Datetime.now() - timedelta(seconds=seconds_ago),
+        })
+
+    def test_not_ready_reschedules(self):
+        self._start(0)
+        delay = self.instance._do_probe_readiness()
+        self.assertEqual(len(self.attempts), 1)
+        self.assertGreaterEqual(delay, readiness.INITIAL_DELAY)
+        self.assertEqual(self.instance.state, 'starting')
+        # La espera crece con el tiempo desde el inicio, hasta MAX_DELAY.
+        self._start(120)
+        self.assertEqual(self.instance._do_probe_readiness(), readiness.MAX_DELAY)
+
+    def test_ready(self):
+        self._start(10)
+        self.answer = (True, '/web/health: HTTP 200')
+        self.assertIsNone(self.instance._do_probe_readiness())
+        self.assertEqual(self.instance.state, 'ready')
+        self.assertGreaterEqual(self.instance.time_to_ready, 10)
+
+    def test_deadline(self):
+        _host, timeout = self.instance._get_readiness_settings()
+        self._start(timeout + 1)
+        self.assertIsNone(self.instance._do_probe_readiness())
+        self.assertEqual(self.instance.state, 'running')
+
+    def test_schedule_recheck_does_not_count_attempts(self):
+        job = self.env['micro.saas.instance.job'].create({
+            'instance_id': self.instance.id,
+            'operation': 'probe',
+            'state': 'running',
+        })
+        job._schedule_recheck(4)
+        self.assertEqual((job.state, job.attempts), ('pending', 0))
+        self.assertGreater(job.scheduled_at, fields.Datetime.now())
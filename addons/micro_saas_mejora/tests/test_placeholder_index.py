@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+from ..tools import template as template_tools
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestPlaceholderIndex(TransactionCase):
+    """placeholder_index persistido y variables de la plantilla derivadas de él."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.template = cls.env['docker.compose.template'].create({
+            'name': 'Plantilla índice',
+            'template_dc_body': 'ports: ["{{HTTP-PORT}}:8069", "{{LONGPOLLING-PORT}}:8072"]',
+            'template_odoo_conf': '[options]\ndb_host = {{DB_HOST}}\n',
+        })
+
+    def test_index_per_body(self):
+        index = self.template.placeholder_index
+        self.assertEqual(index['dc']['names'], ['{{HTTP-PORT}}', '{{LONGPOLLING-PORT}}'])
+        self.assertEqual(index['dc']['hash'], template_tools.content_hash(self.template.template_dc_body))
+        self.assertEqual(index['odoo_conf']['names'], ['{{DB_HOST}}'])
+        self.assertEqual(index['postgres_conf']['names'], [])
+        self.assertEqual(set(self.template.variable_ids.mapped('name')),
+                         {'{{HTTP-PORT}}', '{{LONGPOLLING-PORT}}', '{{DB_HOST}}'})
+
+    def test_body_change_updates_variables(self):
+        kept = self.template.variable_ids.filtered(lambda v: v.name == '{{DB_HOST}}')
+        kept.demo_value = 'db-compartida'
+        dc_hash = self.template.placeholder_index['dc']['hash']
+        self.template.template_odoo_conf = '[options]\ndb_host = {{DB_HOST}}\ndb_name = {{DB_NAME}}\n'
+        index = self.template.placeholder_index
+        self.assertEqual(index['odoo_conf']['names'], ['{{DB_HOST}}', '{{DB_NAME}}'])
+        self.assertEqual(index['dc']['hash'], dc_hash)
+        # La variable que sigue en el cuerpo conserva su valor de ejemplo.
+        self.assertTrue(kept.exists())
+        self.assertEqual(kept.demo_value, 'db-compartida')
+
+        self.template.template_dc_body = 'ports: ["{{HTTP-PORT}}:8069"]'
+        self.assertEqual(set(self.template.variable_ids.mapped('name')),
+                         {'{{HTTP-PORT}}', '{{DB_HOST}}', '{{DB_NAME}}'})
+
+    def test_instance_variables_survive_template_changes(self):
+        instance = self.env['odoo.docker.instance'].create({
+            'name': 'indice-instancia',
+            'template_id': self.template.id,
+            'template_dc_body': self.template.template_dc_body,
+        })
+        instance_variables = instance.variable_ids
+        self.assertTrue(instance_variables)
+        self.template.template_dc_body = 'image: odoo:17.0'
+        self.assertEqual(instance.variable_ids, instance_variables)
+        self.assertTrue(instance_variables.exists())
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+from ..models.odoo_docker_instance_mejora import _PORT_ALLOCATOR_TABLE
+from ..tools import ports as ports_tools
+
+# Rango propio, lejos del de las instancias, para no depender de los datos de la base.
+_START, _END = 40000, 40009
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestPortAllocator(TransactionCase):
+    """Asignación de puertos: consulta de huecos, puertos del SO y fila del lock."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Instance = cls.env['odoo.docker.instance']
+        cls.Reserved = cls.env['micro.saas.puerto.usado']
+
+    def _reserve(self, *ports, activo=True):
+        self.Reserved.create([
+            {'puerto': port, 'tipo': 'http', 'instancia_nombre': 'reserva', 'activo': activo}
+            for port in ports
+        ])
+
+    def _snapshot(self, busy):
+        self.patch(type(self.Instance), '_get_port_snapshot', lambda self: ports_tools.PortSnapshot(set(busy)))
+
+    def test_find_free_ports_uses_first_gap(self):
+        self._reserve(_START, _START + 2)
+        self._reserve(_START + 3, activo=False)
+        self.assertEqual(self.Instance._find_free_ports(2, _START, _END), [_START + 3, _START + 4])
+        self.assertEqual(self.Instance._find_free_ports(1, _START, _END), [_START + 1])
+        self.assertEqual(self.Instance._find_free_ports(2, _START, _END, exclude=[_START + 4]),
+                         [_START + 5, _START + 6])
+
+    def test_find_free_ports_counts_instance_ports(self):
+        self._snapshot(())
+        instance = self.Instance.create({
+            'name': 'puertos-asignados',
+            'http_port': str(_START),
+            'longpolling_port': str(_START + 1),
+        })
+        if not instance.http_port:
+            self.skipTest("Con el proxy inverso activo las instancias no reservan puertos.")
+        self.assertEqual((instance.http_port, instance.longpolling_port), (str(_START), str(_START + 1)))
+        self.assertEqual(self.Instance._find_free_ports(2, _START, _END), [_START + 2, _START + 3])
+
+    def test_find_free_ports_full_range(self):
+        self._reserve(*range(_START, _END + 1, 2))
+        with self.assertRaises(UserError):
+            self.Instance._find_free_ports(2, _START, _END)
+
+    def test_allocate_skips_ports_busy_in_os(self):
+        self._snapshot({_START + 1, _START + 3})
+        self.assertEqual(self.Instance._allocate_port_pair(start_port=_START, end_port=_END),
+                         (_START + 4, _START + 5))
+        self.assertEqual(self.Instance._allocate_port_pair(exclude={_START + 4}, start_port=_START, end_port=_END),
+                         (_START + 5, _START + 6))
+
+    def test_allocate_gives_up_when_os_ports_are_busy(self):
+        self._snapshot(range(_START, _END + 1))
+        with self.assertRaises(UserError):
+            self.Instance._allocate_port_pair(start_port=_START, end_port=_END)
+
+    def test_create_reassigns_taken_ports(self):
+        self._snapshot(())
+        first = self.Instance.create({'name': 'puertos-a'})
+        if not first.http_port:
+            self.skipTest("Con el proxy inverso activo las instancias no reservan puertos.")
+        second = self.Instance.create({
+            'name': 'puertos-b',
+            'http_port': first.http_port,
+            'longpolling_port': first.longpolling_port,
+        })
+        self.assertTrue(second.http_port)
+        self.assertFalse({first.http_port, first.longpolling_port} & {second.http_port, second.longpolling_port})
+
+    def test_lock_row(self):
+        self.env.cr.execute(f"SELECT seq FROM {_PORT_ALLOCATOR_TABLE} WHERE id = 1")
+        before = self.env.cr.fetchone()[0]
+        self.Instance._lock_port_allocator()
+        self.env.cr.execute(f"SELECT seq FROM {_PORT_ALLOCATOR_TABLE} WHERE id = 1")
+        self.assertEqual(self.env.cr.fetchone()[0], before + 1)
+        # La fila queda bloqueada hasta el final de la transacción.
+        self.env.cr.execute(f"""
+            SELECT 1 FROM pg_locks l JOIN pg_class c ON c.oid = l.relation
+             WHERE c.relname = %s AND l.pid = pg_backend_pid() AND l.mode = 'RowExclusiveLock'
+        """, [_PORT_ALLOCATOR_TABLE])
+        self.assertTrue(self.env.cr.fetchone())
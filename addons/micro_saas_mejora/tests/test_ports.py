@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+from odoo.tests import BaseCase, tagged
+
+from ..tools import ports
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestPorts(BaseCase):
+    """Foto de puertos ocupados a partir de /proc/net/tcp y del API de Docker."""
+
+    TCP = (
+        "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+        "   0: 00000000:1F95 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 1\n"
+        "   1: 0100007F:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 2\n"
+        "   2: 0100007F:A2B4 0100007F:1F90 01 00000000:00000000 00:00000000 00000000     0        0 3\n"
+    )
+    TCP6 = (
+        "  sl  local_address                         remote_address                        st tx_queue\n"
+        "   0: 00000000000000000000000000000000:1FA4 00000000000000000000000000000000:0000 0A 00000000\n"
+    )
+
+    def test_listening_ports(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for name, content in (('tcp', self.TCP), ('tcp6', self.TCP6)):
+                path = os.path.join(directory, name)
+                with open(path, 'w') as handle:
+                    handle.write(content)
+                paths.append(path)
+            # Solo los sockets en LISTEN (0A), no la conexión establecida.
+            self.assertEqual(ports.listening_ports(paths), {8085, 8080, 8100})
+            self.assertIsNone(ports.listening_ports([os.path.join(directory, 'missing')]))
+
+    def test_published_ports(self):
+        containers = [
+            {'Ports': [{'PrivatePort': 8069, 'PublicPort': 8076, 'Type': 'tcp'},
+                       {'PrivatePort': 8072, 'Type': 'tcp'}]},
+            {'Ports': [{'PrivatePort': 53, 'PublicPort': 5353, 'Type': 'udp'}]},
+            {},
+        ]
+        self.assertEqual(ports.published_ports(containers), {8076})
+        self.assertEqual(ports.published_ports(None), set())
+
+    def test_snapshot_free_ports(self):
+        snapshot = ports.PortSnapshot({8070, 8072})
+        self.assertFalse(snapshot.is_free(8070))
+        self.assertTrue(snapshot.is_free(8071))
+        self.assertEqual(snapshot.free_ports(8070, 8076, exclude=(8073,)), [8071, 8074, 8075, 8076])
+        self.assertEqual(snapshot.free_ports(8070, 8076, limit=2), [8071, 8073])
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import BaseCase, tagged
+
+from ..tools import postgres as pg_tools
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestPostgresNames(BaseCase):
+    """Nombres de roles y bases del cluster compartido (sin conexión)."""
+
+    def test_identifier(self):
+        self.assertEqual(pg_tools.identifier('12_Cliente Uno S.A.'), 'ms_12_cliente_uno_s_a')
+        self.assertEqual(pg_tools.identifier('golden_3', prefix=''), 'golden_3')
+        self.assertEqual(len(pg_tools.identifier('x' * 100)), pg_tools.MAX_IDENTIFIER)
+
+    def test_database_label(self):
+        self.assertEqual(pg_tools.database_label('Cliente Uno S.A.', '-12'), 'cliente-uno-s-a-12')
+        self.assertEqual(pg_tools.database_label('  --Ñandú--  '), 'and')
+        # El sufijo (id) nunca se trunca.
+        label = pg_tools.database_label('x' * 100, '-123')
+        self.assertEqual(len(label), pg_tools.MAX_IDENTIFIER)
+        self.assertTrue(label.endswith('-123'))
+
+    def test_new_password(self):
+        first, second = pg_tools.new_password(), pg_tools.new_password()
+        self.assertNotEqual(first, second)
+        self.assertGreaterEqual(len(first), 32)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import sys
+
+from odoo.tests import BaseCase, tagged
+
+from ..tools import process
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestStreamCommand(BaseCase):
+    """Salida en vivo y límites de tiempo de tools.process.stream_command."""
+
+    def _python(self, code):
+        return [sys.executable, '-c', code]
+
+    def test_lines_and_progress(self):
+        lines = []
+        code = ("import sys, time\n"
+                "print('uno'); sys.stderr.write('dos\\n')\n"
+                "sys.stdout.write('10%\\r20%\\r'); sys.stdout.flush()\n"
+                "print('tres')\n")
+        result = process.stream_command(self._python(code), on_line=lambda stream, line: lines.append((stream, line)))
+        self.assertTrue(result.ok)
+        self.assertIn(('stdout', 'uno'), lines)
+        self.assertIn(('stderr', 'dos'), lines)
+        self.assertIn(('stdout', 'tres'), lines)
+        # Las barras de progreso ('\r') se limitan a una cada PROGRESS_INTERVAL.
+        self.assertIn(('stdout', '10%'), lines)
+        self.assertNotIn(('stdout', '20%'), lines)
+
+    def test_exit_code(self):
+        result = process.stream_command(self._python("import sys; sys.stderr.write('falló\\n'); sys.exit(3)"))
+        self.assertFalse(result.ok)
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.error_text(), 'falló')
+
+    def test_idle_timeout(self):
+        result = process.stream_command(self._python("import time; time.sleep(30)"),
+                                        idle_timeout=0.5, poll_interval=0.1)
+        self.assertTrue(result.idle_timed_out)
+        self.assertLess(result.duration, 15)
+
+    def test_timeout_after_closing_pipes(self):
+        # Cierra stdout y stderr y sigue corriendo: el límite total vale igual.
+        code = "import os, time; os.close(1); os.close(2); time.sleep(30)"
+        result = process.stream_command(self._python(code), timeout=0.5, poll_interval=0.1)
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.ok)
+        self.assertLess(result.duration, 15)
+
+    def test_cancel(self):
+        result = process.stream_command(self._python("import time; time.sleep(30)"),
+                                        should_cancel=lambda: True, poll_interval=0.1)
+        self.assertTrue(result.cancelled)
+        self.assertEqual(result.error_text(), 'Comando cancelado')
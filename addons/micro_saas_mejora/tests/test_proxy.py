@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+from odoo.tests import BaseCase, tagged
+
+from ..tools import proxy as proxy_tools
+from ..tools import resources
+
+COMPOSE = """version: '2'
+services:
+  web:
+    image: odoo:17.0
+    ports:
+      - "8076:8069"
+  db:
+    image: postgres:15
+"""
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestProxy(BaseCase):
+    """Rutas de nginx por host y docker-compose en modo proxy."""
+
+    def test_attach_to_network(self):
+        result = proxy_tools.attach_to_network(COMPOSE, 'micro_saas_proxy', 'ms-cliente', resources.is_odoo_service)
+        self.assertNotIn('8076:8069', result)
+        self.assertIn("    networks: {default: {}, micro_saas_proxy: {aliases: [ms-cliente]}}", result)
+        self.assertTrue(result.rstrip().endswith("networks:\n  micro_saas_proxy:\n    external: true"))
+        # La red externa se declara una sola vez.
+        again = proxy_tools.ensure_external_network(result, 'micro_saas_proxy')
+        self.assertEqual(again.count('micro_saas_proxy:\n'), 1)
+
+    def test_conf_workers(self):
+        self.assertEqual(proxy_tools.conf_workers("[options]\nworkers = 3\n"), 3)
+        self.assertEqual(proxy_tools.conf_workers("[options]\n"), 0)
+        self.assertEqual(proxy_tools.conf_workers(None), 0)
+
+    def test_server_block(self):
+        block = proxy_tools.server_block('cliente.example.com', 'ms-cliente', longpolling=False, comment='Cliente')
+        lines = block.split('\n')
+        self.assertEqual(lines[:2], [proxy_tools.MARKER, '# Cliente'])
+        self.assertIn('    server_name cliente.example.com;', lines)
+        self.assertIn(f'    set $odoo_longpolling ms-cliente:{proxy_tools.ODOO_HTTP_PORT};', lines)
+        self.assertNotIn('micro_saas/wake', block)
+
+    def test_server_block_comment_is_one_line(self):
+        block = proxy_tools.server_block('x.example.com', 'ms-x', comment='Cliente\n}\nserver {')
+        self.assertEqual(block.split('\n')[1], '# Cliente } server {')
+        self.assertEqual(block.count('server {'), 2)
+
+    def test_server_block_wake(self):
+        block = proxy_tools.server_block('x.example.com', 'ms-x', wake_upstream='host.docker.internal:8076',
+                                         wake_token='secreto')
+        self.assertIn('    error_page 502 504 = @micro_saas_wake;', block)
+        self.assertIn(f'proxy_set_header {proxy_tools.WAKE_TOKEN_HEADER} "secreto";', block)
+        hibernated = proxy_tools.server_block('x.example.com', 'ms-x', wake_upstream='host.docker.internal:8076',
+                                              wake_token='secreto', hibernated=True)
+        self.assertIn('proxy_pass http://host.docker.internal:8076/micro_saas/wake;', hibernated)
+        self.assertNotIn('$odoo_http', hibernated)
+
+    def test_routes(self):
+        with tempfile.TemporaryDirectory() as conf_dir:
+            content = proxy_tools.server_block('a.example.com', 'ms-a')
+            self.assertTrue(proxy_tools.write_route(conf_dir, 'a.example.com', content))
+            self.assertFalse(proxy_tools.write_route(conf_dir, 'a.example.com', content))
+            with open(os.path.join(conf_dir, 'manual.conf'), 'w') as handle:
+                handle.write('server {}\n')
+            self.assertEqual(proxy_tools.generated_hosts(conf_dir), {'a.example.com'})
+            self.assertTrue(proxy_tools.remove_route(conf_dir, 'a.example.com'))
+            self.assertFalse(proxy_tools.remove_route(conf_dir, 'a.example.com'))
+            self.assertEqual(proxy_tools.generated_hosts(conf_dir), set())
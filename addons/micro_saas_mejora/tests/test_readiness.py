@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from odoo.tests import BaseCase, tagged
+
+from ..tools import ports
+from ..tools import readiness
+
+
+class _StubOdoo(BaseHTTPRequestHandler):
+    """Responde según server.routes {ruta: status}; registra cada pedido."""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Host')))
+        status = self.server.routes.get(self.path, 404)
+        if callable(status):
+            status = status()
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestReadiness(BaseCase):
+    """Sonda de disponibilidad contra un servidor HTTP local."""
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubOdoo)
+        self.server.routes = {}
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.port = self.server.server_address[1]
+
+    def test_probe_health(self):
+        self.server.routes['/web/health'] = 200
+        ready, detail = readiness.probe('127.0.0.1', self.port)
+        self.assertTrue(ready)
+        self.assertEqual(detail, '/web/health: HTTP 200')
+
+    def test_probe_falls_back_to_login(self):
+        # Odoo < 15 no tiene /web/health; un redirect también cuenta.
+        self.server.routes['/web/login'] = 303
+        ready, detail = readiness.probe('127.0.0.1', self.port)
+        self.assertTrue(ready)
+        self.assertEqual([path for path, _host in self.server.requests], ['/web/health', '/web/login'])
+
+    def test_probe_error_status(self):
+        self.server.routes.update({'/web/health': 503, '/web/login': 500})
+        ready, detail = readiness.probe('127.0.0.1', self.port)
+        self.assertFalse(ready)
+        self.assertEqual(detail, '/web/login: HTTP 500')
+
+    def test_probe_host_header(self):
+        self.server.routes['/web/login'] = 200
+        ready, _detail = readiness.probe('127.0.0.1', self.port, paths=('/web/login',),
+                                         host_header='cliente.example.com')
+        self.assertTrue(ready)
+        self.assertEqual(self.server.requests, [('/web/login', 'cliente.example.com')])
+
+    def test_probe_connection_refused(self):
+        self.server.shutdown()
+        self.server.server_close()
+        ready, detail = readiness.probe('127.0.0.1', self.port, timeout=1)
+        self.assertFalse(ready)
+        self.assertTrue(detail.startswith('/web/health: '))
+
+    def test_wait_until_ready(self):
+        answers = iter([503, 503])
+        self.server.routes['/web/health'] = lambda: next(answers, 200)
+        attempts = []
+        result = readiness.wait_until_ready(
+            '127.0.0.1', self.port, timeout=10, paths=('/web/health',),
+            on_attempt=lambda attempt, detail: attempts.append(attempt),
+            initial_delay=0.01, max_delay=0.02,
+        )
+        self.assertTrue(result.ready)
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(attempts, [1, 2])
+
+    def test_wait_until_ready_timeout(self):
+        self.server.routes['/web/health'] = 503
+        result = readiness.wait_until_ready('127.0.0.1', self.port, timeout=0.1, paths=('/web/health',),
+                                            initial_delay=0.02, max_delay=0.02)
+        self.assertFalse(result.ready)
+        self.assertFalse(result.cancelled)
+        self.assertGreater(result.attempts, 1)
+
+    def test_wait_until_ready_cancelled(self):
+        self.server.routes['/web/health'] = 503
+        result = readiness.wait_until_ready('127.0.0.1', self.port, timeout=10, paths=('/web/health',),
+                                            should_cancel=lambda: True, initial_delay=0.01)
+        self.assertTrue(result.cancelled)
+        self.assertEqual(result.attempts, 1)
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestPublishedHost(BaseCase):
+    """Dirección de la sonda: 127.0.0.1 en el host, gateway dentro de un contenedor."""
+
+    ROUTE = (
+        "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT\n"
+        "eth0\t00000000\t010012AC\t0003\t0\t0\t0\t00000000\t0\t0\t0\n"
+        "eth0\t000012AC\t00000000\t0001\t0\t0\t0\t0000FFFF\t0\t0\t0\n"
+    )
+
+    def _write(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return path
+
+    def test_default_gateway(self):
+        with tempfile.TemporaryDirectory() as directory:
+            route = self._write(directory, 'route', self.ROUTE)
+            self.assertEqual(ports.default_gateway(route), '172.18.0.1')
+            self.assertIsNone(ports.default_gateway(os.path.join(directory, 'missing')))
+
+    def test_published_host(self):
+        with tempfile.TemporaryDirectory() as directory:
+            route = self._write(directory, 'route', self.ROUTE)
+            dockerenv = os.path.join(directory, '.dockerenv')
+            self.assertEqual(ports.published_host(dockerenv, route), '127.0.0.1')
+            self._write(directory, '.dockerenv', '')
+            self.assertEqual(ports.published_host(dockerenv, route), '172.18.0.1')
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+from odoo.tests import TransactionCase, tagged
+
+_DC_BODY = (
+    "services:\n"
+    "  web:\n"
+    "    image: odoo:17.0\n"
+    "    container_name: {{NOMBRE}}\n"
+    "    ports:\n"
+    "      - \"{{HTTP-PORT}}:8069\"\n"
+)
+_ODOO_CONF = "[options]\ndb_host = db\nlogfile = /var/log/odoo/odoo.log\n"
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestRenderFiles(TransactionCase):
+    """render_files: mismo contenido que escribe el inicio y variables de tipo 'field'."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.template = cls.env['docker.compose.template'].create({
+            'name': 'Plantilla render_files',
+            'template_dc_body': _DC_BODY,
+            'template_odoo_conf': _ODOO_CONF,
+        })
+        cls.instance = cls.env['odoo.docker.instance'].create({
+            'name': 'render-files',
+            'template_id': cls.template.id,
+            'template_dc_body': _DC_BODY,
+            'template_odoo_conf': _ODOO_CONF,
+        })
+
+    def test_render_files_matches_written_files(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.instance.instance_data_path = path
+            self.instance._update_docker_compose_file()
+            self.instance._create_odoo_conf()
+            files = self.instance.render_files()[self.instance.id]
+            for file_name, relative_path in (('docker-compose.yml', 'docker-compose.yml'),
+                                             ('odoo.conf', os.path.join('etc', 'odoo.conf'))):
+                with open(os.path.join(path, relative_path), 'rb') as handle:
+                    self.assertEqual(handle.read(), files[file_name].encode('utf-8'), file_name)
+        self.assertIn('proxy_mode = True', files['odoo.conf'])
+        self.assertNotIn('logfile', files['odoo.conf'])
+
+    def test_render_files_subset(self):
+        files = self.instance.render_files(file_names=('odoo.conf',))
+        self.assertEqual(list(files[self.instance.id]), ['odoo.conf'])
+
+    def test_field_variables(self):
+        variable = self.template.variable_ids.filtered(lambda v: v.name == '{{NOMBRE}}')
+        variable.write({'field_type': 'field', 'field_name': 'name', 'demo_value': 'ejemplo'})
+        # El render de un registro usa el valor de ejemplo, como el original...
+        self.assertEqual(self.template._get_formatted_body('{{NOMBRE}}', demo_fallback=True), 'ejemplo')
+        # ...y el API por lotes resuelve la cadena de campos.
+        files = self.template.render_files()[self.template.id]
+        self.assertIn('container_name: Plantilla render_files', files['docker-compose.yml'])
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+from odoo.tests import BaseCase, tagged
+
+from ..tools import resources
+
+COMPOSE = """version: '2'
+services:
+  web:
+    image: odoo:17.0
+    depends_on:
+      - db
+    ports:
+      - "8076:8069"
+    mem_limit: 1g
+  db:
+    image: postgres:15
+    environment:
+      - POSTGRES_USER=odoo
+"""
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestResources(BaseCase):
+    """Límites del plan en docker-compose.yml y odoo.conf sin parser YAML."""
+
+    def test_is_odoo_service(self):
+        self.assertTrue(resources.is_odoo_service({'image': 'registry.example.com/odoo-custom:17'}))
+        self.assertTrue(resources.is_odoo_service({'image': 'bitnami/odoo@sha256:abc'}))
+        self.assertTrue(resources.is_odoo_service({'image': 'python:3.11', 'command': 'odoo-bin -c /etc/odoo.conf'}))
+        self.assertFalse(resources.is_odoo_service({'image': 'postgres:15'}))
+        self.assertFalse(resources.is_odoo_service({'image': 'odoo:17',
+                                                    'labels': {resources.ODOO_SERVICE_LABEL: 'false'}}))
+        self.assertTrue(resources.is_odoo_service({'image': 'python:3.11',
+                                                   'labels': {resources.ODOO_SERVICE_LABEL: 'true'}}))
+
+    def test_service_names_and_images(self):
+        self.assertEqual(resources.service_names(COMPOSE, resources.is_odoo_service), ['web'])
+        self.assertEqual(resources.service_images(COMPOSE, lambda service: True), ['odoo:17.0', 'postgres:15'])
+
+    def test_service_labels(self):
+        body = ("services:\n  app:\n    image: python:3.11\n    labels:\n"
+                f"      - {resources.ODOO_SERVICE_LABEL}=true\n  cache:\n    image: redis\n")
+        self.assertEqual(resources.service_names(body, resources.is_odoo_service), ['app'])
+
+    def test_set_service_options(self):
+        options = resources.compose_limits(cpus=1.5, memory_mb=2048, pids=200)
+        result = resources.set_service_options(COMPOSE, options, resources.is_odoo_service)
+        lines = result.split('\n')
+        self.assertEqual(lines[0], "version: '2.4'")
+        self.assertIn("    cpus: '1.5'", lines)
+        self.assertIn("    mem_limit: 2048m", lines)
+        self.assertIn("    memswap_limit: 2048m", lines)
+        self.assertIn("    pids_limit: 200", lines)
+        # El límite anterior se reemplaza y el servicio db no se toca.
+        self.assertNotIn("    mem_limit: 1g", lines)
+        self.assertEqual(result.count('mem_limit'), 1)
+        self.assertIn("      - POSTGRES_USER=odoo", lines)
+
+    def test_remove_service_options(self):
+        result = resources.remove_service_options(COMPOSE, ('ports',), resources.is_odoo_service)
+        self.assertNotIn('8076:8069', result)
+        self.assertIn("      - db", result)
+
+    def test_compose_limits_unlimited(self):
+        self.assertEqual(resources.compose_limits(), {})
+
+    def test_conf_limits(self):
+        self.assertEqual(resources.conf_limits(workers=0), {'workers': 0})
+        options = resources.conf_limits(memory_mb=4096, workers=2)
+        self.assertEqual(options['workers'], 2)
+        self.assertEqual(options['max_cron_threads'], 1)
+        self.assertEqual(options['limit_memory_hard'], 4096 * 1024 * 1024)
+        # Planes chicos no bajan de los valores por defecto de Odoo (VMS).
+        options = resources.conf_limits(memory_mb=512, workers=2)
+        self.assertEqual(options['limit_memory_hard'], resources.DEFAULT_MEMORY_HARD_MB * 1024 * 1024)
+        self.assertEqual(options['limit_memory_soft'], resources.DEFAULT_MEMORY_SOFT_MB * 1024 * 1024)
+
+    def test_set_conf_options(self):
+        conf = "[options]\nworkers = 4\ndb_host = db\n"
+        result = resources.set_conf_options(conf, {'workers': 2, 'proxy_mode': True})
+        self.assertEqual(result, "[options]\nproxy_mode = True\nworkers = 2\ndb_host = db\n")
+        self.assertEqual(resources.set_conf_options('', {'workers': 1}), "[options]\nworkers = 1\n")
+
+    def test_temporary_conf(self):
+        with tempfile.TemporaryDirectory() as directory:
+            etc_dir = os.path.join(directory, 'etc')
+            with resources.temporary_conf(etc_dir, "[options]\ndb_user = odoo\n",
+                                          {'db_user': 'ms_golden_1', 'db_password': 'secreto'}) as conf:
+                self.assertEqual(conf, f"{resources.CONTAINER_CONF_DIR}/build.conf")
+                with open(os.path.join(etc_dir, 'build.conf')) as handle:
+                    content = handle.read()
+                self.assertIn("db_user = ms_golden_1", content)
+                self.assertIn("db_password = secreto", content)
+            self.assertFalse(os.path.exists(os.path.join(etc_dir, 'build.conf')))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import BaseCase, tagged
+
+from ..tools import template as template_tools
+
+
+@tagged('post_install', '-at_install', 'micro_saas')
+class TestTemplate(BaseCase):
+    """Render de plantillas en una pasada y caché de plantillas compiladas."""
+
+    def test_render(self):
+        body = "image: odoo:{{VERSION}}\nports:\n  - \"{{HTTP_PORT}}:8069\"\n  - \"{{HTTP_PORT}}:8072\""
+        result = template_tools.render(body, {'{{VERSION}}': '17.0', '{{HTTP_PORT}}': '8076'})
+        self.assertEqual(result, "image: odoo:17.0\nports:\n  - \"8076:8069\"\n  - \"8076:8072\"")
+
+    def test_render_keeps_unknown_placeholders(self):
+        self.assertEqual(template_tools.render("a={{A}} b={{B}}", {'{{A}}': '1'}), "a=1 b={{B}}")
+        self.assertEqual(template_tools.render("sin variables", {'{{A}}': '1'}), "sin variables")
+        self.assertEqual(template_tools.render(None, {}), '')
+
+    def test_render_does_not_rescan_values(self):
+        # Un valor que contiene otro placeholder no se vuelve a reemplazar.
+        result = template_tools.render("{{A}}-{{B}}", {'{{A}}': '{{B}}', '{{B}}': 'b'})
+        self.assertEqual(result, "{{B}}-b")
+
+    def test_render_variables_literal_names(self):
+        # Variables creadas a mano con un nombre que no es {{...}}.
+        values = {'{{DB}}': 'cliente', 'DOMINIO': 'example.com'}
+        self.assertEqual(template_tools.render_variables("{{DB}}.DOMINIO", values), "cliente.example.com")
+
+    def test_compile_cache(self):
+        body = "x={{X}} y={{Y}} x={{X}}"
+        compiled = template_tools.compile_template(body)
+        self.assertEqual(compiled.placeholders, {'{{X}}', '{{Y}}'})
+        self.assertIs(template_tools.compile_template(body), compiled)
+
+    def test_lru_cache(self):
+        cache = template_tools.LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        # 'b' era la menos usada.
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_content_hash(self):
+        self.assertEqual(template_tools.content_hash('abc'), template_tools.content_hash('abc'))
+        self.assertNotEqual(template_tools.content_hash('abc'), template_tools.content_hash('abd'))
+        self.assertEqual(template_tools.content_hash(None), template_tools.content_hash(''))
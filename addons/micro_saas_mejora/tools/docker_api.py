@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente mínimo del Docker Engine API sobre el socket unix.
+
+Evita lanzar /bin/sh + docker compose (cientos de ms por llamada) para
+operaciones pequeñas: listar, inspeccionar, crear, iniciar, detener y
+escuchar eventos de los contenedores de una instancia. Cada hilo mantiene
+su propia conexión HTTP persistente (keep-alive) contra el daemon.
+
+No usa el ORM, así que se puede llamar desde los hilos de la cola.
+"""
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import threading
+from urllib.parse import quote, urlencode
+
+DEFAULT_SOCKET = '/var/run/docker.sock'
+DEFAULT_TIMEOUT = 30
+API_VERSION = 'v1.41'
+
+COMPOSE_PROJECT_LABEL = 'com.docker.compose.project'
+COMPOSE_SERVICE_LABEL = 'com.docker.compose.service'
+
+
+class DockerAPIError(Exception):
+    """Error devuelto por el daemon (status HTTP >= 400) o de conexión."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection que se conecta a un socket unix en lugar de TCP."""
+
+    def __init__(self, socket_path, timeout=DEFAULT_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def compose_project_name(directory):
+    """
+    Nombre de proyecto que docker compose deriva del directorio del
+    docker-compose.yml (mismo normalizado que compose v2).
+    """
+    name = os.path.basename(os.path.normpath(directory or '')).lower()
+    name = re.sub(r'[^a-z0-9_-]+', '', name)
+    return name.lstrip('_-')
+
+
+class DockerClient:
+    """Cliente del Docker Engine API con una conexión persistente por hilo."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=DEFAULT_TIMEOUT, api_version=API_VERSION):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.api_version = api_version
+        self._local = threading.local()
+
+    # ------------------------------------------
+    #  Transporte
+    # ------------------------------------------
+
+    def is_available(self):
+        return os.path.exists(self.socket_path)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _url(self, path, params=None):
+        url = f"/{self.api_version}{path}"
+        if params:
+            url += '?' + urlencode({k: v for k, v in params.items() if v is not None})
+        return url
+
+    def _request(self, method, path, params=None, body=None, timeout=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        url = self._url(path, params)
+        # Un reintento: el daemon puede haber cerrado la conexión keep-alive.
+        for attempt in (1, 2):
+            conn = self._connection()
+            if timeout is not None:
+                conn.timeout = timeout
+                if conn.sock:
+                    conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, url, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError,
+                    http.client.CannotSendRequest, http.client.ResponseNotReady):
+                self._reset_connection()
+                if attempt == 2:
+                    raise DockerAPIError(f"Conexión perdida con el daemon Docker ({self.socket_path})")
+            except (FileNotFoundError, ConnectionRefusedError, socket.timeout, OSError) as e:
+                self._reset_connection()
+                raise DockerAPIError(f"No se pudo hablar con el daemon Docker: {e}")
+            finally:
+                if timeout is not None and getattr(self._local, 'conn', None) is not None:
+                    self._local.conn.timeout = self.timeout
+                    if self._local.conn.sock:
+                        self._local.conn.sock.settimeout(self.timeout)
+
+        if response.status >= 400:
+            try:
+                message = json.loads(data or b'{}').get('message') or data.decode('utf-8', 'replace')
+            except ValueError:
+                message = data.decode('utf-8', 'replace')
+            raise DockerAPIError(message, status=response.status)
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            return data.decode('utf-8', 'replace')
+
+    # ------------------------------------------
+    #  Contenedores
+    # ------------------------------------------
+
+    def ping(self):
+        return self._request('GET', '/_ping') == 'OK'
+
+    def list_containers(self, all=True, filters=None):
+        params = {'all': 'true' if all else 'false'}
+        if filters:
+            params['filters'] = json.dumps(filters)
+        return self._request('GET', '/containers/json', params=params) or []
+
+    def project_containers(self, project, all=True):
+        """Contenedores de un proyecto docker compose."""
+        return self.list_containers(all=all, filters={'label': [f'{COMPOSE_PROJECT_LABEL}={project}']})
+
+    def inspect_container(self, container_id):
+        return self._request('GET', f'/containers/{quote(container_id)}/json')
+
+    def create_container(self, name, config):
+        """Crea un contenedor con la configuración del API (Image, Env, HostConfig...)."""
+        return self._request('POST', '/containers/create', params={'name': name}, body=config)
+
+    def start_container(self, container_id):
+        # 304 = ya estaba iniciado; no es error.
+        try:
+            self._request('POST', f'/containers/{quote(container_id)}/start')
+        except DockerAPIError as e:
+            if e.status != 304:
+                raise
+
+    def stop_container(self, container_id, timeout=10):
+        try:
+            self._request('POST', f'/containers/{quote(container_id)}/stop', params={'t': timeout},
+                          timeout=self.timeout + timeout)
+        except DockerAPIError as e:
+            if e.status != 304:
+                raise
+
+    def restart_container(self, container_id, timeout=10):
+        self._request('POST', f'/containers/{quote(container_id)}/restart', params={'t': timeout},
+                      timeout=self.timeout + timeout)
+
+    def pause_container(self, container_id):
+        self._request('POST', f'/containers/{quote(container_id)}/pause')
+
+    def unpause_container(self, container_id):
+        self._request('POST', f'/containers/{quote(container_id)}/unpause')
+
+    def container_stats(self, container_id):
+        """
+        Una sola muestra de estadísticas (sin stream). Con one-shot Docker
+        responde al instante en lugar de esperar una segunda muestra para
+        calcular el uso de CPU (precpu_stats queda vacío).
+        """
+        return self._request('GET', f'/containers/{quote(container_id)}/stats',
+                             params={'stream': 'false', 'one-shot': 'true'}) or {}
+
+    # ------------------------------------------
+    #  Redes
+    # ------------------------------------------
+
+    def network_exists(self, name):
+        try:
+            self._request('GET', f'/networks/{quote(name)}')
+        except DockerAPIError as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
+
+    def create_network(self, name, driver='bridge'):
+        return self._request('POST', '/networks/create', body={
+            'Name': name,
+            'Driver': driver,
+            'CheckDuplicate': True,
+        })
+
+    def events(self, filters=None, since=None, until=None):
+        """
+        Itera los eventos del daemon (un dict por evento). Usa una conexión
+        propia porque la respuesta es un stream; con `until` el stream termina.
+        """
+        params = {'since': since, 'until': until}
+        if filters:
+            params['filters'] = json.dumps(filters)
+        conn = UnixHTTPConnection(self.socket_path, timeout=None if until is None else self.timeout)
+        try:
+            conn.request('GET', self._url('/events', params))
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise DockerAPIError(response.read().decode('utf-8', 'replace'), status=response.status)
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        except OSError as e:
+            raise DockerAPIError(f"No se pudo leer eventos del daemon Docker: {e}")
+        finally:
+            conn.close()
+
+
+def network_bytes(stats):
+    """Bytes recibidos + enviados por todas las interfaces de una muestra de container_stats()."""
+    return sum(
+        (net.get('rx_bytes') or 0) + (net.get('tx_bytes') or 0)
+        for net in ((stats or {}).get('networks') or {}).values()
+    )
+
+
+def exit_code_from_status(status):
+    """Código de salida a partir del texto 'Exited (137) 2 minutes ago'."""
+    match = re.search(r'Exited \((-?\d+)\)', status or '')
+    return int(match.group(1)) if match else None
+
+
+def list_containers_cli():
+    """
+    Respaldo de list_containers() con el CLI: 'docker ps -aq' y luego
+    'docker inspect', que da las etiquetas como objeto JSON (el campo
+    Labels de 'docker ps' es texto separado por comas y se rompe con
+    valores que contienen comas). Normaliza la salida al formato del API
+    (Id, State, Status, Labels dict).
+    """
+    ids = subprocess.run(
+        ['docker', 'ps', '-aq', '--no-trunc'],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60,
+    ).stdout.decode('utf-8', 'replace').split()
+    if not ids:
+        return []
+    # Sin check: si un contenedor desaparece entre ps e inspect, inspect
+    # sale con error pero igual devuelve el resto.
+    result = subprocess.run(
+        ['docker', 'inspect', '--type', 'container'] + ids,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60,
+    )
+    containers = []
+    for row in json.loads(result.stdout.decode('utf-8', 'replace') or '[]'):
+        state = row.get('State') or {}
+        status = state.get('Status', '')
+        containers.append({
+            'Id': row.get('Id', ''),
+            'State': status,
+            'Status': f"Exited ({state.get('ExitCode', 0)})" if status == 'exited' else status,
+            'Labels': (row.get('Config') or {}).get('Labels') or {},
+        })
+    return containers
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(socket_path=DEFAULT_SOCKET):
+    """Cliente compartido por socket (las conexiones son por hilo)."""
+    with _clients_lock:
+        client = _clients.get(socket_path)
+        if client is None:
+            client = _clients[socket_path] = DockerClient(socket_path)
+        return client
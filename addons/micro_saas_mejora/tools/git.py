@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Operaciones git para el aprovisionamiento de instancias.
+
+Estas funciones NO usan el ORM: reciben y devuelven datos planos para
+poder ejecutarse desde hilos sin compartir el cursor de Odoo.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import process
+
+DEFAULT_CLONE_TIMEOUT = 600
+# Un clonado/fetch sin ninguna salida durante este tiempo se considera colgado.
+DEFAULT_IDLE_TIMEOUT = 180
+# Un mirror más viejo que esto se actualiza antes de usarlo para un checkout.
+DEFAULT_MIRROR_MAX_AGE = 600
+
+
+def run_git(args, cwd=None, timeout=DEFAULT_CLONE_TIMEOUT, on_line=None):
+    """
+    Ejecuta git sin shell y devuelve el CompletedProcess (lanza si falla).
+    Con `on_line` la salida se entrega línea por línea mientras corre
+    (ver tools.process) y se corta también si git deja de producir salida.
+    """
+    if on_line is None:
+        return subprocess.run(
+            ['git'] + list(args),
+            cwd=cwd,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+    cmd = ['git'] + list(args)
+    result = process.stream_command(cmd, cwd=cwd, on_line=on_line, timeout=timeout,
+                                    idle_timeout=DEFAULT_IDLE_TIMEOUT)
+    if result.timed_out:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    if not result.ok:
+        raise subprocess.CalledProcessError(result.returncode, cmd,
+                                            output=result.stdout.encode(),
+                                            stderr=result.error_text().encode())
+    return subprocess.CompletedProcess(cmd, 0, result.stdout.encode(), result.stderr.encode())
+
+
+def _error_text(exc):
+    stderr = getattr(exc, 'stderr', None)
+    if stderr:
+        return stderr.decode('utf-8', errors='replace').strip()
+    if isinstance(exc, subprocess.TimeoutExpired):
+        return f"git tardó más de {exc.timeout} segundos"
+    return str(exc)
+
+
+# ==========================================
+#  CACHÉ DE MIRRORS
+# ==========================================
+
+def mirror_name(repo_id, url):
+    """Nombre del mirror bare: estable por repository.repo y cambia si cambia la URL."""
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', url.rstrip('/').split('/')[-1]).replace('.git', '')
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return f"repo_{repo_id}_{slug}_{digest}.git"
+
+
+class _FileLock:
+    """Lock exclusivo entre procesos e hilos sobre `<path>.lock`."""
+
+    def __init__(self, path):
+        self.path = path + '.lock'
+        self.fd = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+
+
+def _mirror_age(mirror_path):
+    """Segundos desde el último fetch del mirror (o desde su creación)."""
+    for marker in ('FETCH_HEAD', 'HEAD'):
+        marker_path = os.path.join(mirror_path, marker)
+        if os.path.exists(marker_path):
+            return time.time() - os.path.getmtime(marker_path)
+    return None
+
+
+def fetch_mirror(mirror_path, timeout=DEFAULT_CLONE_TIMEOUT):
+    run_git(['fetch', '--prune', 'origin'], cwd=mirror_path, timeout=timeout)
+
+
+def ensure_mirror(url, mirror_path, max_age=DEFAULT_MIRROR_MAX_AGE, timeout=DEFAULT_CLONE_TIMEOUT):
+    """
+    Crea el mirror bare si no existe, o lo actualiza si es más viejo que
+    `max_age` segundos. Los checkouts comparten sus objetos (alternates), por
+    eso se desactiva el prune de objetos sueltos en el mirror.
+    Devuelve True si el mirror se descargó o actualizó desde el remoto.
+    """
+    with _FileLock(mirror_path):
+        if not os.path.exists(os.path.join(mirror_path, 'HEAD')):
+            run_git(['clone', '--mirror', url, mirror_path], timeout=timeout)
+            run_git(['config', 'gc.pruneExpire', 'never'], cwd=mirror_path)
+            return True
+        age = _mirror_age(mirror_path)
+        if max_age is not None and (age is None or age > max_age):
+            fetch_mirror(mirror_path, timeout=timeout)
+            return True
+        return False
+
+
+def refresh_mirror(mirror_path, timeout=DEFAULT_CLONE_TIMEOUT):
+    """Actualiza un mirror existente. Devuelve {'ok', 'duration', 'error'}."""
+    started = time.monotonic()
+    try:
+        with _FileLock(mirror_path):
+            fetch_mirror(mirror_path, timeout=timeout)
+        error = False
+    except Exception as e:
+        error = _error_text(e)
+    return {
+        'ok': not error,
+        'duration': round(time.monotonic() - started, 2),
+        'error': error,
+    }
+
+
+# ==========================================
+#  CLONADO
+# ==========================================
+
+def clone(spec):
+    """
+    Clona una rama. `spec` es un dict con url, branch, path y opcionalmente
+    shallow (--depth 1 --single-branch), mirror (ruta del mirror bare local),
+    timeout y on_line (callback para la salida en vivo de git).
+
+    Con mirror, el checkout se hace con --shared desde el mirror: no hay
+    tráfico de red y los objetos no se duplican en disco. Si el mirror falla
+    se vuelve al clonado por red.
+    Devuelve {'ok', 'duration', 'error', 'from_mirror', 'mirror_fetched'};
+    nunca lanza excepción.
+    """
+    timeout = spec.get('timeout') or DEFAULT_CLONE_TIMEOUT
+    on_line = spec.get('on_line')
+    started = time.monotonic()
+    mirror_error = False
+    mirror_fetched = False
+    if spec.get('mirror'):
+        try:
+            mirror_fetched = ensure_mirror(spec['url'], spec['mirror'],
+                                           max_age=spec.get('mirror_max_age', DEFAULT_MIRROR_MAX_AGE),
+                                           timeout=timeout)
+            run_git(['clone', '--shared', '--branch', spec['branch'], spec['mirror'], spec['path']],
+                    timeout=timeout)
+            return {
+                'ok': True,
+                'duration': round(time.monotonic() - started, 2),
+                'error': False,
+                'from_mirror': True,
+                'mirror_fetched': mirror_fetched,
+            }
+        except Exception as e:
+            mirror_error = _error_text(e)
+
+    args = ['clone', '--branch', spec['branch']]
+    if spec.get('shallow'):
+        args += ['--depth', '1', '--single-branch']
+    if on_line:
+        args.append('--progress')
+    args += [spec['url'], spec['path']]
+    try:
+        run_git(args, timeout=timeout, on_line=on_line)
+        error = False
+    except Exception as e:
+        error = _error_text(e)
+    return {
+        'ok': not error,
+        'duration': round(time.monotonic() - started, 2),
+        'error': error or (mirror_error and f"(mirror, se clonó por red) {mirror_error}"),
+        'from_mirror': False,
+        'mirror_fetched': mirror_fetched,
+    }
+
+
+def _rev_parse(path, ref='HEAD'):
+    return run_git(['rev-parse', ref], cwd=path, timeout=60).stdout.decode().strip()
+
+
+def _remote_head(path, branch, timeout):
+    """SHA de la rama en el remoto 'origin' del checkout, sin descargar objetos."""
+    result = run_git(['ls-remote', 'origin', f'refs/heads/{branch}'], cwd=path, timeout=timeout)
+    line = result.stdout.decode().strip()
+    if not line:
+        raise ValueError(f"La rama {branch} no existe en el remoto")
+    return line.split()[0]
+
+
+def update(spec):
+    """
+    Actualiza un checkout existente: compara el HEAD local con la rama remota
+    (ls-remote, sin descargar nada) y solo si difieren hace fetch + reset
+    --hard al commit remoto. Si el checkout sale de un mirror, primero se
+    asegura que el mirror esté al día.
+    Devuelve {'ok', 'duration', 'error', 'from_mirror', 'mirror_fetched',
+    'sha', 'changed'}.
+    """
+    timeout = spec.get('timeout') or DEFAULT_CLONE_TIMEOUT
+    path = spec['path']
+    started = time.monotonic()
+    from_mirror = False
+    mirror_fetched = False
+    try:
+        origin = run_git(['config', '--get', 'remote.origin.url'], cwd=path, timeout=60).stdout.decode().strip()
+        if spec.get('mirror') and os.path.abspath(origin) == os.path.abspath(spec['mirror']):
+            from_mirror = True
+            mirror_fetched = ensure_mirror(spec['url'], spec['mirror'],
+                                           max_age=spec.get('mirror_max_age', DEFAULT_MIRROR_MAX_AGE),
+                                           timeout=timeout)
+        remote_sha = _remote_head(path, spec['branch'], timeout)
+        local_sha = _rev_parse(path)
+        changed = remote_sha != local_sha
+        if changed:
+            args = ['fetch', 'origin', spec['branch']]
+            if spec.get('shallow') and not from_mirror:
+                args[1:1] = ['--depth', '1']
+            if spec.get('on_line'):
+                args.insert(1, '--progress')
+            run_git(args, cwd=path, timeout=timeout, on_line=spec.get('on_line'))
+            run_git(['reset', '--hard', 'FETCH_HEAD'], cwd=path, timeout=timeout)
+        return {
+            'ok': True,
+            'duration': round(time.monotonic() - started, 2),
+            'error': False,
+            'from_mirror': from_mirror,
+            'mirror_fetched': mirror_fetched,
+            'sha': _rev_parse(path) if changed else local_sha,
+            'changed': changed,
+        }
+    except Exception as e:
+        return {
+            'ok': False,
+            'duration': round(time.monotonic() - started, 2),
+            'error': _error_text(e),
+            'from_mirror': from_mirror,
+            'mirror_fetched': mirror_fetched,
+            'sha': False,
+            'changed': False,
+        }
+
+
+def sync(spec):
+    """
+    Clona o actualiza según el estado del checkout en disco: si spec['path']
+    ya es un repositorio git se hace una actualización incremental (aunque
+    la línea no figure como clonada); si no, un clonado completo.
+    Devuelve además 'updated' (True si fue una actualización).
+    """
+    if os.path.isdir(os.path.join(spec['path'], '.git')):
+        result = update(spec)
+        result['updated'] = True
+        return result
+    result = clone(spec)
+    result['updated'] = False
+    result['changed'] = result['ok']
+    result['sha'] = False
+    if result['ok']:
+        try:
+            result['sha'] = _rev_parse(spec['path'])
+        except Exception:
+            pass
+    return result
+
+
+def run_parallel(func, specs, max_workers):
+    """Aplica `func` a cada spec con un pool acotado, conservando el orden."""
+    specs = list(specs)
+    if not specs:
+        return []
+    workers = max(1, min(max_workers, len(specs)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='micro_saas_git') as executor:
+        return list(executor.map(func, specs))
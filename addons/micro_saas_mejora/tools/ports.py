@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Foto de los puertos TCP en escucha del host.
+
+En lugar de intentar bind() puerto por puerto (una syscall por candidato),
+se lee una sola vez /proc/net/tcp y /proc/net/tcp6 y se arma el conjunto de
+puertos en estado LISTEN. Si Odoo corre dentro de un contenedor (otro
+namespace de red), los puertos publicados por Docker se agregan desde el
+API del daemon, y para llegar a ellos se usa el gateway de la red del
+contenedor (published_host).
+
+No usa el ORM.
+"""
+import os
+import socket
+import struct
+
+PROC_NET_FILES = ('/proc/net/tcp', '/proc/net/tcp6')
+PROC_NET_ROUTE = '/proc/net/route'
+# Archivo que Docker crea en la raíz de todo contenedor.
+DOCKERENV = '/.dockerenv'
+# Columna 'st' de /proc/net/tcp: 0A = TCP_LISTEN.
+TCP_LISTEN = '0A'
+
+
+def listening_ports(paths=PROC_NET_FILES):
+    """
+    Puertos locales en LISTEN según /proc/net/tcp{,6}, o None si no se
+    pudo leer ninguno de los archivos (sistema sin /proc).
+    """
+    ports = set()
+    read_any = False
+    for path in paths:
+        try:
+            with open(path, 'r') as handle:
+                lines = handle.readlines()[1:]
+        except OSError:
+            continue
+        read_any = True
+        for line in lines:
+            parts = line.split()
+            if len(parts) < 4 or parts[3] != TCP_LISTEN:
+                continue
+            ports.add(int(parts[1].rsplit(':', 1)[1], 16))
+    return ports if read_any else None
+
+
+def default_gateway(path=PROC_NET_ROUTE):
+    """IP del gateway de la ruta por defecto según /proc/net/route, o None."""
+    try:
+        with open(path, 'r') as handle:
+            lines = handle.readlines()[1:]
+    except OSError:
+        return None
+    for line in lines:
+        parts = line.split()
+        # Iface Destination Gateway ...: destino 0.0.0.0 = ruta por defecto (hex little-endian).
+        if len(parts) >= 3 and parts[1] == '00000000' and parts[2] != '00000000':
+            return socket.inet_ntoa(struct.pack('<L', int(parts[2], 16)))
+    return None
+
+
+def published_host(dockerenv=DOCKERENV, route_path=PROC_NET_ROUTE):
+    """
+    Dirección desde la que este proceso llega a los puertos publicados en
+    el host: 127.0.0.1 si corre en el host; dentro de un contenedor (el
+    servicio web del docker-compose del repositorio), el gateway de su red,
+    que es el host visto desde el contenedor.
+    """
+    if os.path.exists(dockerenv):
+        return default_gateway(route_path) or '127.0.0.1'
+    return '127.0.0.1'
+
+
+def published_ports(containers):
+    """Puertos del host publicados por contenedores (formato de /containers/json)."""
+    ports = set()
+    for container in containers or []:
+        for port in container.get('Ports') or []:
+            if port.get('PublicPort') and port.get('Type', 'tcp') == 'tcp':
+                ports.add(int(port['PublicPort']))
+    return ports
+
+
+def is_bindable(port):
+    """Respaldo cuando no hay /proc: True si el puerto se puede abrir."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(1)
+    try:
+        sock.bind(("0.0.0.0", port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class PortSnapshot:
+    """
+    Puertos ocupados en un momento dado. `busy` es None cuando no hubo
+    forma de leer el estado del host; en ese caso is_free() prueba con bind.
+    """
+
+    def __init__(self, busy=None):
+        self.busy = busy
+
+    def is_free(self, port):
+        if self.busy is None:
+            return is_bindable(port)
+        return port not in self.busy
+
+    def free_ports(self, start, end, exclude=(), limit=None):
+        """Puertos libres del rango [start, end] que no estén en `exclude`."""
+        exclude = set(exclude)
+        found = []
+        for port in range(start, end + 1):
+            if port in exclude or not self.is_free(port):
+                continue
+            found.append(port)
+            if limit and len(found) >= limit:
+                break
+        return found
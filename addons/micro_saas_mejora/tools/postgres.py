@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Administración de roles y bases en un cluster PostgreSQL compartido.
+
+En el modo 'cluster compartido' las instancias no levantan su propio
+contenedor postgres: cada una recibe un rol y una base en un Postgres del
+host. Aquí se crean y eliminan con una conexión de administración (rol con
+CREATEROLE y CREATEDB), en autocommit porque CREATE/DROP DATABASE no se
+pueden ejecutar dentro de una transacción.
+
+No usa el ORM (ni la base de Odoo del maestro).
+"""
+import os
+import re
+import secrets
+import uuid
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import sql
+
+CONNECT_TIMEOUT = 10
+# Los identificadores de Postgres se truncan a 63 bytes.
+MAX_IDENTIFIER = 63
+
+
+def identifier(name, prefix='ms_'):
+    """Nombre válido de rol/base a partir de un texto libre (minúsculas, a-z0-9_)."""
+    slug = re.sub(r'[^a-z0-9_]+', '_', (name or '').lower()).strip('_')
+    return (prefix + slug)[:MAX_IDENTIFIER]
+
+
+def database_label(name, suffix=''):
+    """
+    Nombre de base que también es una etiqueta DNS válida (a-z0-9 y '-'),
+    para que dbfilter = ^%d$ la elija por el subdominio. `suffix` (p. ej.
+    el id) no se trunca.
+    """
+    slug = re.sub(r'[^a-z0-9]+', '-', (name or '').lower()).strip('-')
+    return (slug[:MAX_IDENTIFIER - len(suffix)] + suffix).strip('-')
+
+
+def new_password():
+    return secrets.token_urlsafe(24)
+
+
+@contextmanager
+def admin_connection(host, port, user, password, dbname='postgres'):
+    """Conexión de administración en autocommit (a `dbname`); se cierra al salir."""
+    conn = psycopg2.connect(
+        host=host, port=port, user=user, password=password, dbname=dbname,
+        connect_timeout=CONNECT_TIMEOUT,
+    )
+    conn.autocommit = True
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def role_exists(conn, role):
+    with conn.cursor() as cr:
+        cr.execute("SELECT 1 FROM pg_roles WHERE rolname = %s", [role])
+        return bool(cr.fetchone())
+
+
+def database_exists(conn, dbname):
+    with conn.cursor() as cr:
+        cr.execute("SELECT 1 FROM pg_database WHERE datname = %s", [dbname])
+        return bool(cr.fetchone())
+
+
+def ensure_role(conn, role, password):
+    """Crea el rol (LOGIN, sin privilegios de cluster) o actualiza su contraseña."""
+    statement = "ALTER ROLE {} WITH LOGIN PASSWORD {}" if role_exists(conn, role) else \
+        "CREATE ROLE {} WITH LOGIN NOSUPERUSER NOCREATEDB NOCREATEROLE PASSWORD {}"
+    with conn.cursor() as cr:
+        cr.execute(sql.SQL(statement).format(sql.Identifier(role), sql.Literal(password)))
+
+
+def ensure_database(conn, dbname, owner, template=None):
+    """
+    Crea la base `dbname` con dueño `owner` si no existe (opcionalmente a
+    partir de la base `template`) y le quita CONNECT a PUBLIC para que
+    ningún otro inquilino pueda conectarse. Devuelve True si la creó.
+    """
+    if database_exists(conn, dbname):
+        return False
+    query = "CREATE DATABASE {} OWNER {} ENCODING 'UTF8'"
+    args = [sql.Identifier(dbname), sql.Identifier(owner)]
+    if template:
+        query += " TEMPLATE {}"
+        args.append(sql.Identifier(template))
+    with conn.cursor() as cr:
+        # OWNER exige ser miembro del rol dueño cuando el admin no es superusuario.
+        cr.execute(sql.SQL("GRANT {} TO CURRENT_USER").format(sql.Identifier(owner)))
+        cr.execute(sql.SQL(query).format(*args))
+        cr.execute(sql.SQL("REVOKE CONNECT ON DATABASE {} FROM PUBLIC").format(sql.Identifier(dbname)))
+    return True
+
+
+def terminate_connections(conn, dbname):
+    with conn.cursor() as cr:
+        cr.execute(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()",
+            [dbname],
+        )
+
+
+def signal_registry_reload(conn):
+    """
+    En una conexión a una base de Odoo: avanza la secuencia de
+    señalización del registro (base_registry_signaling). Cada proceso de
+    Odoo que sirve esa base la compara al empezar cada pedido y, al verla
+    cambiada, vuelve a cargar el registro y vacía sus cachés: es el reinicio
+    de una sola base sin reiniciar el servidor. False si la base todavía no
+    tiene la secuencia (no se inicializó).
+    """
+    with conn.cursor() as cr:
+        cr.execute("SELECT to_regclass('base_registry_signaling')")
+        if cr.fetchone()[0] is None:
+            return False
+        cr.execute("SELECT nextval('base_registry_signaling')")
+    return True
+
+
+def set_allow_connections(conn, dbname, allow):
+    """Habilita o bloquea nuevas conexiones a la base; al bloquear corta las abiertas."""
+    with conn.cursor() as cr:
+        cr.execute(sql.SQL("ALTER DATABASE {} WITH ALLOW_CONNECTIONS {}").format(
+            sql.Identifier(dbname), sql.SQL('true' if allow else 'false')))
+    if not allow:
+        terminate_connections(conn, dbname)
+
+
+def set_owner(conn, dbname, owner=None):
+    """Cambia el dueño de la base a `owner` (o al rol de la conexión)."""
+    target = sql.Identifier(owner) if owner else sql.SQL('CURRENT_USER')
+    with conn.cursor() as cr:
+        cr.execute(sql.SQL("ALTER DATABASE {} OWNER TO {}").format(sql.Identifier(dbname), target))
+
+
+def rename_database(conn, dbname, new_name):
+    """Renombra la base; Postgres lo exige sin conexiones abiertas, así que se cortan antes."""
+    terminate_connections(conn, dbname)
+    with conn.cursor() as cr:
+        cr.execute(sql.SQL("ALTER DATABASE {} RENAME TO {}").format(sql.Identifier(dbname), sql.Identifier(new_name)))
+
+
+def adopt_objects(conn, old_role, new_role):
+    """
+    En la base de `conn`: pasa a `new_role` los objetos de `old_role` y le
+    quita sus permisos. La base copiada de una base modelo queda así
+    enteramente en manos de su rol. `old_role` no debe ser dueño de ninguna
+    base: REASSIGN OWNED también las traspasa.
+    """
+    if old_role == new_role:
+        return
+    with conn.cursor() as cr:
+        cr.execute(sql.SQL("REASSIGN OWNED BY {} TO {}").format(sql.Identifier(old_role), sql.Identifier(new_role)))
+        cr.execute(sql.SQL("DROP OWNED BY {}").format(sql.Identifier(old_role)))
+
+
+def reset_odoo_identity(conn):
+    """
+    Identidad propia para una copia de una base de Odoo: database.uuid,
+    database.secret (firma sesiones y tokens) y database.create_date nuevos.
+    """
+    with conn.cursor() as cr:
+        for key, value in (('database.uuid', str(uuid.uuid1())), ('database.secret', str(uuid.uuid4()))):
+            cr.execute("UPDATE ir_config_parameter SET value = %s WHERE key = %s", [value, key])
+        cr.execute("UPDATE ir_config_parameter SET value = to_char(now() at time zone 'UTC', "
+                   "'YYYY-MM-DD HH24:MI:SS') WHERE key = 'database.create_date'")
+
+
+def internalize_attachments(conn, filestore_dir):
+    """
+    Mueve a ir_attachment.db_datas los adjuntos de la base de `conn` que
+    están en `filestore_dir`, para que las copias de la base no dependan
+    de ese filestore (Odoo lee db_datas cuando store_fname es NULL).
+    Devuelve (movidos, faltantes).
+    """
+    moved = missing = 0
+    with conn.cursor() as cr:
+        cr.execute("SELECT id, store_fname FROM ir_attachment WHERE store_fname IS NOT NULL")
+        for attachment_id, store_fname in cr.fetchall():
+            try:
+                with open(os.path.join(filestore_dir, store_fname), 'rb') as handle:
+                    data = handle.read()
+            except OSError:
+                missing += 1
+                continue
+            cr.execute("UPDATE ir_attachment SET db_datas = %s, store_fname = NULL WHERE id = %s",
+                       [psycopg2.Binary(data), attachment_id])
+            moved += 1
+    return moved, missing
+
+
+def drop_database(conn, dbname):
+    """Elimina la base (cortando antes las conexiones abiertas) si existe."""
+    if not database_exists(conn, dbname):
+        return False
+    terminate_connections(conn, dbname)
+    with conn.cursor() as cr:
+        cr.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(dbname)))
+    return True
+
+
+def drop_role(conn, role):
+    if not role_exists(conn, role):
+        return False
+    with conn.cursor() as cr:
+        cr.execute(sql.SQL("DROP ROLE IF EXISTS {}").format(sql.Identifier(role)))
+    return True
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Ejecución de comandos largos (docker pull, docker-compose up, git clone)
+leyendo stdout y stderr línea por línea mientras el proceso corre.
+
+A diferencia de subprocess.run(stdout=PIPE), la salida no se acumula hasta
+el final: cada línea se entrega a un callback (para el log de la instancia)
+y se controlan dos límites de tiempo:
+  - timeout: tiempo total máximo.
+  - idle_timeout: tiempo máximo sin ninguna salida (proceso colgado).
+Una descarga de 900 MB que sigue imprimiendo progreso no se corta por el
+idle_timeout; un proceso mudo sí.
+
+No usa el ORM, así que se puede llamar desde los hilos de la cola.
+"""
+import os
+import selectors
+import signal
+import subprocess
+import time
+from collections import deque
+
+# Espera entre SIGTERM y SIGKILL al cortar un proceso.
+KILL_GRACE_SECONDS = 10
+# Segmentos terminados en '\r' (barras de progreso): como mucho uno cada N segundos.
+PROGRESS_INTERVAL = 2.0
+
+
+class CommandResult:
+    """Resultado de stream_command()."""
+
+    def __init__(self, args):
+        self.args = args
+        self.returncode = None
+        self.duration = 0.0
+        self.timed_out = False
+        self.idle_timed_out = False
+        self.cancelled = False
+        self.stdout_tail = deque(maxlen=200)
+        self.stderr_tail = deque(maxlen=200)
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not (self.timed_out or self.idle_timed_out or self.cancelled)
+
+    @property
+    def stdout(self):
+        return '\n'.join(self.stdout_tail)
+
+    @property
+    def stderr(self):
+        return '\n'.join(self.stderr_tail)
+
+    def error_text(self):
+        """Descripción corta del fallo, en el mismo tono que los logs de la instancia."""
+        if self.cancelled:
+            return "Comando cancelado"
+        if self.timed_out:
+            return f"El comando tardó más del tiempo máximo ({round(self.duration)}s)"
+        if self.idle_timed_out:
+            return "El comando dejó de producir salida (sin actividad) y se detuvo"
+        if self.returncode:
+            return self.stderr or self.stdout or f"El comando terminó con código {self.returncode}"
+        return ''
+
+
+def _kill(proc):
+    """SIGTERM al grupo del proceso y SIGKILL si no termina a tiempo."""
+    for sig, wait in ((signal.SIGTERM, KILL_GRACE_SECONDS), (signal.SIGKILL, None)):
+        try:
+            os.killpg(proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        try:
+            proc.wait(timeout=wait)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def stream_command(args, cwd=None, env=None, on_line=None, timeout=None, idle_timeout=None,
+                   should_cancel=None, poll_interval=1.0):
+    """
+    Ejecuta `args` (lista, sin shell) y entrega cada línea de salida a
+    on_line(stream, line), con stream 'stdout' o 'stderr'.
+
+    should_cancel() se consulta cada `poll_interval` segundos; si devuelve
+    True el proceso (y sus hijos) se detiene. Nunca lanza por timeout o
+    cancelación: el resultado lo indica (CommandResult.ok / error_text()).
+    """
+    result = CommandResult(args)
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        args,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,  # para poder matar también a los hijos
+    )
+    streams = {proc.stdout.fileno(): 'stdout', proc.stderr.fileno(): 'stderr'}
+    partial = {'stdout': b'', 'stderr': b''}
+    last_progress = {'stdout': 0.0, 'stderr': 0.0}
+    tails = {'stdout': result.stdout_tail, 'stderr': result.stderr_tail}
+
+    def emit(stream, raw, progress=False):
+        line = raw.decode('utf-8', errors='replace').rstrip()
+        if not line:
+            return
+        if progress:
+            now = time.monotonic()
+            if now - last_progress[stream] < PROGRESS_INTERVAL:
+                return
+            last_progress[stream] = now
+        tails[stream].append(line)
+        if on_line:
+            on_line(stream, line)
+
+    def feed(stream, data):
+        buf = partial[stream] + data
+        while True:
+            positions = [p for p in (buf.find(b'\n'), buf.find(b'\r')) if p >= 0]
+            if not positions:
+                break
+            pos = min(positions)
+            if buf[pos:pos + 2] == b'\r\n':
+                emit(stream, buf[:pos])
+                buf = buf[pos + 2:]
+                continue
+            emit(stream, buf[:pos], progress=buf[pos:pos + 1] == b'\r')
+            buf = buf[pos + 1:]
+        partial[stream] = buf
+
+    selector = selectors.DefaultSelector()
+    for fileobj in (proc.stdout, proc.stderr):
+        selector.register(fileobj, selectors.EVENT_READ)
+    last_output = started
+    last_cancel_check = started
+
+    def must_stop():
+        """Marca en `result` el límite vencido o la cancelación; True si hay que cortar."""
+        nonlocal last_cancel_check
+        now = time.monotonic()
+        if timeout and now - started > timeout:
+            result.timed_out = True
+        elif idle_timeout and now - last_output > idle_timeout:
+            result.idle_timed_out = True
+        elif should_cancel and now - last_cancel_check >= poll_interval:
+            last_cancel_check = now
+            result.cancelled = bool(should_cancel())
+        return result.timed_out or result.idle_timed_out or result.cancelled
+
+    try:
+        stopped = False
+        while selector.get_map():
+            for key, _mask in selector.select(timeout=poll_interval):
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                last_output = time.monotonic()
+                feed(streams[key.fd], data)
+            if must_stop():
+                _kill(proc)
+                stopped = True
+                break
+        # Con los pipes cerrados el proceso puede seguir vivo (los cerró o
+        # los soltó a un hijo): los mismos límites valen mientras termina.
+        while not stopped:
+            try:
+                proc.wait(timeout=poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if must_stop():
+                _kill(proc)
+                break
+    finally:
+        selector.close()
+        for stream, rest in partial.items():
+            emit(stream, rest)
+        proc.stdout.close()
+        proc.stderr.close()
+        if proc.poll() is None:
+            _kill(proc)
+        result.returncode = proc.wait()
+        result.duration = round(time.monotonic() - started, 2)
+    return result
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Proxy inverso por nombre de host (nginx) en lugar de un puerto publicado
+por instancia.
+
+Cada instancia se publica como <subdominio>.<dominio base>: el servicio de
+Odoo deja de publicar puertos en el host y se une a una red docker externa
+compartida con un contenedor nginx, con un alias propio en esa red. Aquí
+se genera un archivo de servidor por host (conf.d/<host>.conf) que envía
+/ al puerto 8069 del alias y /websocket y /longpolling al 8072 cuando Odoo
+corre con workers (con workers = 0 todo lo atiende el 8069).
+
+El contenedor nginx debe estar en la red y montar el directorio de rutas
+en /etc/nginx/conf.d. Las rutas usan el DNS interno de Docker con
+variables, así nginx arranca y recarga aunque una instancia esté detenida
+(responde 502 hasta que vuelva, o la página de "despertando" del
+maestro si se configuró el upstream de activación).
+
+No usa el ORM.
+"""
+import os
+import re
+import subprocess
+
+from . import resources
+
+# Primera línea de los archivos generados: solo esos se limpian al sincronizar.
+MARKER = '# micro_saas: ruta generada, no editar a mano'
+# DNS embebido de Docker (visible desde los contenedores de redes definidas por el usuario).
+DOCKER_RESOLVER = '127.0.0.11'
+ODOO_HTTP_PORT = 8069
+ODOO_LONGPOLLING_PORT = 8072
+COMMAND_TIMEOUT = 60
+# Cabecera con el host pedido que nginx agrega al enviar a /micro_saas/wake.
+WAKE_HOST_HEADER = 'X-Micro-Saas-Host'
+# Cabecera con el secreto compartido que solo nginx conoce: sin ella el
+# controlador no acepta el host pedido.
+WAKE_TOKEN_HEADER = 'X-Micro-Saas-Wake-Token'
+
+_WORKERS_RE = re.compile(r'^\s*workers\s*=\s*(\d+)\s*$', re.MULTILINE)
+_CONTROL_RE = re.compile(r'[\x00-\x1f\x7f]+')
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip(' '))
+
+
+def ensure_external_network(body, network):
+    """`body` con la red `network` declarada como externa en 'networks:' de primer nivel."""
+    lines = (body or '').split('\n')
+    try:
+        start = next(i for i, line in enumerate(lines) if line.rstrip() == 'networks:')
+    except StopIteration:
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines += ['', 'networks:', f'  {network}:', '    external: true', '']
+        return '\n'.join(lines)
+    child_indent = None
+    for line in lines[start + 1:]:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if _indent(line) == 0:
+            break
+        child_indent = child_indent or _indent(line)
+        if _indent(line) == child_indent and line.strip().rstrip(':') == network:
+            return body
+    child_indent = child_indent or 2
+    lines[start + 1:start + 1] = [' ' * child_indent + f'{network}:', ' ' * child_indent * 2 + 'external: true']
+    return '\n'.join(lines)
+
+
+def attach_to_network(body, network, alias, match):
+    """
+    docker-compose.yml para el modo proxy: los servicios para los que
+    match(servicio) es verdadero dejan de publicar puertos y se unen
+    a `network` con el alias `alias` (sin salir de la red por defecto del
+    proyecto, donde está su base de datos).
+    """
+    body = resources.remove_service_options(body, ('ports',), match)
+    options = {'networks': '{default: {}, %s: {aliases: [%s]}}' % (network, alias)}
+    body = resources.set_service_options(body, options, match)
+    return ensure_external_network(body, network)
+
+
+def conf_workers(conf_content):
+    """Valor de 'workers' de un odoo.conf (0 si no está)."""
+    match = _WORKERS_RE.search(conf_content or '')
+    return int(match.group(1)) if match else 0
+
+
+def _wake_location(wake_upstream, wake_token, name='/'):
+    """Location que envía el pedido al controlador /micro_saas/wake del maestro."""
+    return f"""    location {name} {{
+        proxy_pass http://{wake_upstream}/micro_saas/wake;
+        proxy_set_header Host $proxy_host;
+        proxy_set_header {WAKE_HOST_HEADER} $host;
+        proxy_set_header {WAKE_TOKEN_HEADER} "{wake_token}";
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+    }}
+"""
+
+
+def server_block(host, upstream, longpolling=True, comment='', access_log=None, wake_upstream=None,
+                 wake_token='', hibernated=False):
+    """
+    Bloque server de nginx que envía `host` al alias `upstream` de la red
+    docker. Con `wake_upstream` (host:puerto del Odoo maestro), una
+    instancia hibernada responde con la página de "despertando" del
+    maestro, que encola su inicio; si el contenedor no responde (502/504)
+    se usa la misma página. `wake_token` es el secreto que nginx envía al
+    maestro para que este confíe en el host del pedido. `access_log` es la ruta (dentro del contenedor
+    nginx) del log de pedidos del host, que sirve para detectar inactividad.
+    """
+    # El comentario (nombre de la instancia) va en una sola línea: un salto
+    # de línea en el nombre agregaría directivas a la configuración de nginx.
+    comment = ' '.join(_CONTROL_RE.sub(' ', comment or '').split())
+    header = [MARKER] + ([f"# {comment}"] if comment else [])
+    log_line = f"    access_log {access_log};\n" if access_log else ''
+    if hibernated and wake_upstream:
+        return '\n'.join(header) + f"""
+server {{
+    listen 80;
+    server_name {host};
+{log_line}
+{_wake_location(wake_upstream, wake_token)}}}
+"""
+    longpolling_target = f"{upstream}:{ODOO_LONGPOLLING_PORT if longpolling else ODOO_HTTP_PORT}"
+    wake = ''
+    if wake_upstream:
+        wake = "\n    error_page 502 504 = @micro_saas_wake;\n\n" + _wake_location(wake_upstream, wake_token, '@micro_saas_wake')
+    return '\n'.join(header) + f"""
+server {{
+    listen 80;
+    server_name {host};
+{log_line}
+    resolver {DOCKER_RESOLVER} valid=10s;
+    set $odoo_http {upstream}:{ODOO_HTTP_PORT};
+    set $odoo_longpolling {longpolling_target};
+
+    client_max_body_size 128m;
+    proxy_read_timeout 720s;
+    proxy_connect_timeout 720s;
+    proxy_send_timeout 720s;
+
+    proxy_set_header Host $host;
+    proxy_set_header X-Forwarded-Host $host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+
+    location /websocket {{
+        proxy_pass http://$odoo_longpolling;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+    }}
+
+    location /longpolling {{
+        proxy_pass http://$odoo_longpolling;
+    }}
+
+    location / {{
+        proxy_pass http://$odoo_http;
+        proxy_redirect off;
+    }}
+{wake}}}
+"""
+
+
+def route_path(conf_dir, host):
+    return os.path.join(conf_dir, f"{host}.conf")
+
+
+def write_route(conf_dir, host, content):
+    """Escribe la ruta de `host` solo si cambió. Devuelve True si la escribió."""
+    path = route_path(conf_dir, host)
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as current:
+            if current.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(conf_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(data)
+    # nginx nunca ve un archivo a medio escribir.
+    os.replace(tmp_path, path)
+    return True
+
+
+def remove_route(conf_dir, host):
+    """Elimina la ruta de `host`. Devuelve True si existía."""
+    try:
+        os.remove(route_path(conf_dir, host))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def generated_hosts(conf_dir):
+    """Hosts con una ruta generada por micro_saas en `conf_dir`."""
+    hosts = set()
+    try:
+        names = os.listdir(conf_dir)
+    except OSError:
+        return hosts
+    for name in names:
+        if not name.endswith('.conf'):
+            continue
+        try:
+            with open(os.path.join(conf_dir, name), 'r') as handle:
+                if handle.readline().rstrip('\n') == MARKER:
+                    hosts.add(name[:-len('.conf')])
+        except OSError:
+            continue
+    return hosts
+
+
+def _nginx_command(container, *args):
+    base = ['docker', 'exec', container, 'nginx'] if container else ['nginx']
+    return base + list(args)
+
+
+def reload_nginx(container=None):
+    """
+    Valida la configuración (nginx -t) y recarga nginx (dentro de
+    `container` si se indica). Con una configuración inválida no recarga:
+    nginx sigue con la anterior. Devuelve (ok, detalle).
+    """
+    for args in (('-t',), ('-s', 'reload')):
+        try:
+            result = subprocess.run(_nginx_command(container, *args), check=False,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=COMMAND_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            return False, f"nginx {' '.join(args)}: {e}"
+        if result.returncode != 0:
+            return False, f"nginx {' '.join(args)}: {result.stderr.decode('utf-8', 'replace').strip()[-1000:]}"
+    return True, 'nginx recargado'
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Sonda de disponibilidad de una instancia Odoo por HTTP.
+
+docker-compose up -d termina en cuanto los contenedores existen, pero Odoo
+puede tardar uno o dos minutos en cargar el registro. Aquí se consulta
+/web/health (Odoo >= 15) y, si no existe, /web/login, con espera
+exponencial entre intentos y un plazo máximo.
+
+No usa el ORM, así que se puede llamar desde los hilos de la cola (y
+probar contra un servidor HTTP local cualquiera).
+"""
+import http.client
+import time
+
+HEALTH_PATHS = ('/web/health', '/web/login')
+# Espera antes del segundo intento; se duplica hasta MAX_DELAY.
+INITIAL_DELAY = 1.0
+MAX_DELAY = 15.0
+REQUEST_TIMEOUT = 5
+
+
+class ReadinessResult:
+    """Resultado de wait_until_ready()."""
+
+    def __init__(self):
+        self.ready = False
+        self.cancelled = False
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.detail = ''
+
+
+def probe(host, port, paths=HEALTH_PATHS, timeout=REQUEST_TIMEOUT, host_header=None):
+    """
+    Un intento: (True, detalle) si alguna ruta responde 2xx/3xx (un redirect
+    al selector de bases también es Odoo respondiendo), (False, detalle) si no.
+    `host_header` reemplaza la cabecera Host (runtime compartido: dbfilter
+    elige la base por el nombre de host).
+    """
+    detail = ''
+    headers = {'User-Agent': 'micro_saas-readiness'}
+    if host_header:
+        headers['Host'] = host_header
+    for path in paths:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        try:
+            conn.request('GET', path, headers=headers)
+            status = conn.getresponse().status
+        except (OSError, http.client.HTTPException) as e:
+            # Sin conexión las demás rutas tampoco van a responder.
+            return False, f"{path}: {e.__class__.__name__}: {e}"
+        finally:
+            conn.close()
+        if 200 <= status < 400:
+            return True, f"{path}: HTTP {status}"
+        detail = f"{path}: HTTP {status}"
+    return False, detail
+
+
+def wait_until_ready(host, port, timeout, paths=HEALTH_PATHS, should_cancel=None, on_attempt=None,
+                     initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY, request_timeout=REQUEST_TIMEOUT,
+                     host_header=None):
+    """
+    Repite probe() con espera exponencial hasta que responda o pasen
+    `timeout` segundos. on_attempt(intento, detalle) se llama tras cada
+    intento fallido; should_cancel() antes de cada espera.
+    """
+    result = ReadinessResult()
+    started = time.monotonic()
+    deadline = started + timeout
+    delay = initial_delay
+    while True:
+        result.attempts += 1
+        result.ready, result.detail = probe(host, port, paths, request_timeout, host_header)
+        result.elapsed = round(time.monotonic() - started, 2)
+        if result.ready:
+            return result
+        if on_attempt:
+            on_attempt(result.attempts, result.detail)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return result
+        if should_cancel and should_cancel():
+            result.cancelled = True
+            return result
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
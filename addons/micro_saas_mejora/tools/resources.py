@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Límites de recursos por plan en los archivos ya renderizados.
+
+docker-compose.yml: se agregan (o reemplazan) claves a nivel de servicio
+(cpus, mem_limit, pids_limit) sin parser YAML, que Odoo no trae: los
+templates usan el formato por bloques con sangría de espacios y aquí solo
+se tocan claves escalares de primer nivel de cada servicio.
+
+odoo.conf: workers y max_cron_threads del plan. limit_memory_* de Odoo
+mide memoria virtual (VMS, con limit_memory_hard como RLIMIT_AS), no RSS:
+se dejan en la escala de los valores por defecto de Odoo y el tope real de
+memoria residente es el mem_limit del contenedor (cgroup). Una copia
+temporal de odoo.conf con otras opciones (temporary_conf) sirve para correr
+odoo con otro rol sin poner su contraseña en la línea de comandos.
+
+No usa el ORM.
+"""
+import os
+import re
+from contextlib import contextmanager
+
+_VERSION_RE = re.compile(r"""^version:\s*['"]?(\d+)(?:\.(\d+))?['"]?\s*$""")
+# cpus (2.2) y pids_limit (2.1) no existen en el formato '2' de docker-compose v1.
+MIN_V2_FORMAT = (2, 4)
+# Valores por defecto de Odoo 17 para limit_memory_hard / _soft (MB de VMS).
+DEFAULT_MEMORY_HARD_MB = 2560
+DEFAULT_MEMORY_SOFT_MB = 2048
+# Fracción de la memoria del plan a partir de la cual se recicla el worker
+# (solo pesa en planes más grandes que los valores por defecto).
+SOFT_MEMORY_RATIO = 0.8
+# Etiqueta con la que una plantilla marca (o descarta, con 'false') su
+# servicio de Odoo cuando ni la imagen ni el comando lo delatan.
+ODOO_SERVICE_LABEL = 'micro_saas.odoo'
+# Carpeta de odoo.conf dentro del contenedor de Odoo (./etc:/etc/odoo en las plantillas).
+CONTAINER_CONF_DIR = '/etc/odoo'
+_ODOO_COMMAND_RE = re.compile(r'(?:^|[\s/\'"\[,])(?:odoo|odoo-bin)(?:$|[\s\'"\],])')
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip(' '))
+
+
+def _key_lines(lines, block, key):
+    """
+    (valor en la línea de la clave, líneas anidadas sin sangría) de la
+    clave `key` del servicio, o None si no la tiene.
+    """
+    key_indent = block['key_indent']
+    if key_indent is None:
+        return None
+    for index in range(block['start'] + 1, block['end'] + 1):
+        stripped = lines[index].strip()
+        if stripped and _indent(lines[index]) == key_indent and stripped.split(':', 1)[0] == key:
+            nested = []
+            stop = index + 1
+            while stop <= block['end'] and (not lines[stop].strip() or _indent(lines[stop]) > key_indent
+                                            or lines[stop].strip().startswith('- ')):
+                if lines[stop].strip() and not lines[stop].strip().startswith('#'):
+                    nested.append(lines[stop].strip())
+                stop += 1
+            return stripped.split(':', 1)[1].strip(), nested
+    return None
+
+
+def _unquote(value):
+    return value.strip().strip('\'"')
+
+
+def _labels(lines, block):
+    """Etiquetas del servicio, en forma de lista ('- clave=valor') o de mapa ('clave: valor')."""
+    found = _key_lines(lines, block, 'labels')
+    labels = {}
+    for item in (found[1] if found else []):
+        if item.startswith('- '):
+            key, _sep, value = _unquote(item[2:]).partition('=')
+        else:
+            key, _sep, value = item.partition(':')
+        labels[_unquote(key)] = _unquote(value)
+    return labels
+
+
+def _command(lines, block):
+    """entrypoint y command del servicio como texto, en una línea."""
+    parts = []
+    for key in ('entrypoint', 'command'):
+        found = _key_lines(lines, block, key)
+        if found:
+            parts.append(found[0])
+            parts.extend(item[2:] if item.startswith('- ') else item for item in found[1])
+    return ' '.join(part for part in parts if part)
+
+
+def is_odoo_service(service):
+    """
+    True si `service` (dict con name, image, command y labels, como los de
+    _service_blocks o los que se arman desde un contenedor) es el servicio
+    de Odoo: la etiqueta micro_saas.odoo decide si está; si no, un comando
+    que lanza odoo / odoo-bin o una imagen cuyo nombre contiene 'odoo'
+    (odoo, bitnami/odoo, registro/odoo-custom).
+    """
+    labels = service.get('labels') or {}
+    if ODOO_SERVICE_LABEL in labels:
+        return str(labels[ODOO_SERVICE_LABEL]).strip().lower() not in ('0', 'false', 'no', '')
+    if _ODOO_COMMAND_RE.search(service.get('command') or ''):
+        return True
+    image = (service.get('image') or '').split('@', 1)[0].rsplit('/', 1)[-1].split(':', 1)[0]
+    return 'odoo' in image.lower()
+
+
+def _service_blocks(lines):
+    """
+    Servicios bajo 'services:' como dicts con nombre, imagen, comando,
+    etiquetas, primera y última línea del bloque y sangría de sus claves.
+    """
+    try:
+        start = next(i for i, line in enumerate(lines) if line.rstrip() == 'services:')
+    except StopIteration:
+        return []
+    blocks = []
+    service_indent = None
+    current = None
+    for index in range(start + 1, len(lines)):
+        line = lines[index]
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        indent = _indent(line)
+        if indent == 0:
+            break
+        if service_indent is None:
+            service_indent = indent
+        if indent == service_indent:
+            current = {'name': stripped.rstrip(':'), 'start': index, 'end': index, 'key_indent': None, 'image': ''}
+            blocks.append(current)
+        elif current is not None:
+            if current['key_indent'] is None:
+                current['key_indent'] = indent
+            if indent == current['key_indent'] and stripped.startswith('image:'):
+                current['image'] = stripped.split(':', 1)[1].strip().strip('\'"')
+            current['end'] = index
+    for block in blocks:
+        block['command'] = _command(lines, block)
+        block['labels'] = _labels(lines, block)
+    return blocks
+
+
+def _ensure_v2_format(lines):
+    for index, line in enumerate(lines):
+        match = _VERSION_RE.match(line.strip()) if _indent(line) == 0 else None
+        if match and int(match.group(1)) == 2 and (2, int(match.group(2) or 0)) < MIN_V2_FORMAT:
+            lines[index] = "version: '%s.%s'" % MIN_V2_FORMAT
+            return
+
+
+def service_names(body, match):
+    """Nombres de los servicios de `body` para los que match(servicio) es verdadero."""
+    return [b['name'] for b in _service_blocks((body or '').split('\n')) if match(b)]
+
+
+def service_images(body, match):
+    """Imágenes de los servicios de `body` para los que match(servicio) es verdadero."""
+    return [b['image'] for b in _service_blocks((body or '').split('\n')) if match(b)]
+
+
+def _drop_keys(lines, block, keys):
+    """
+    Quita del bloque del servicio las claves `keys` junto con sus líneas
+    anidadas (listas como 'ports:'). Devuelve la nueva última línea del bloque.
+    """
+    key_indent = block['key_indent'] or (_indent(lines[block['start']]) + 2)
+    end = block['end']
+    index = block['start'] + 1
+    while index <= end:
+        line = lines[index]
+        if line.strip() and _indent(line) == key_indent and line.strip().split(':', 1)[0] in keys:
+            stop = index + 1
+            # Las listas pueden ir a la misma sangría que la clave ('- ...').
+            while stop <= end and (not lines[stop].strip() or _indent(lines[stop]) > key_indent
+                                   or lines[stop].strip().startswith('- ')):
+                stop += 1
+            del lines[index:stop]
+            end -= stop - index
+        else:
+            index += 1
+    return end
+
+
+def remove_service_options(body, keys, match):
+    """`body` sin las claves `keys` en los servicios para los que match(servicio) es verdadero."""
+    if not body or not keys:
+        return body
+    lines = body.split('\n')
+    for block in reversed([b for b in _service_blocks(lines) if match(b)]):
+        _drop_keys(lines, block, keys)
+    return '\n'.join(lines)
+
+
+def set_service_options(body, options, match):
+    """
+    `body` con las claves `options` ({clave: valor YAML}) en cada servicio
+    para el que match(servicio) sea verdadero. Las claves que ya
+    existían en el servicio se reemplazan (con sus líneas anidadas). Sube
+    'version: 2' a 2.4, el primer formato 2.x que acepta todas las claves
+    de límites.
+    """
+    if not body or not options:
+        return body
+    lines = body.split('\n')
+    blocks = [b for b in _service_blocks(lines) if match(b)]
+    # De abajo hacia arriba para que los índices de los bloques sigan valiendo.
+    for block in reversed(blocks):
+        key_indent = block['key_indent'] or (_indent(lines[block['start']]) + 2)
+        end = _drop_keys(lines, block, options)
+        new_lines = [' ' * key_indent + f"{key}: {value}" for key, value in options.items()]
+        lines[end + 1:end + 1] = new_lines
+    if blocks:
+        _ensure_v2_format(lines)
+    return '\n'.join(lines)
+
+
+def compose_limits(cpus=0.0, memory_mb=0, pids=0):
+    """Claves de docker compose para los límites definidos (0 = sin límite)."""
+    options = {}
+    if cpus:
+        options['cpus'] = "'%s'" % ('%g' % cpus)
+    if memory_mb:
+        options['mem_limit'] = f"{int(memory_mb)}m"
+        # Sin swap extra: el límite de memoria es el límite real.
+        options['memswap_limit'] = f"{int(memory_mb)}m"
+    if pids:
+        options['pids_limit'] = int(pids)
+    return options
+
+
+def conf_limits(memory_mb=0, workers=None):
+    """
+    Opciones de odoo.conf para `workers` procesos en un contenedor de
+    `memory_mb` MB. limit_memory_hard es el RLIMIT_AS (memoria virtual) de
+    cada worker y limit_memory_soft se compara con su VMS, que en Odoo 17
+    ronda los 500 MB con el worker vacío: repartir el mem_limit entre los
+    workers los dejaría sin poder reservar (MemoryError). Se usan los
+    valores por defecto de Odoo (2560 / 2048 MB), o la memoria del plan si
+    es mayor, y el mem_limit del contenedor pone el tope de RSS. Sin
+    workers (modo hilos) Odoo ignora limit_memory_*.
+    """
+    options = {}
+    if workers is not None:
+        options['workers'] = int(workers)
+    if memory_mb and workers:
+        options['max_cron_threads'] = 1
+        hard_mb = max(DEFAULT_MEMORY_HARD_MB, int(memory_mb))
+        soft_mb = max(DEFAULT_MEMORY_SOFT_MB, int(int(memory_mb) * SOFT_MEMORY_RATIO))
+        options['limit_memory_hard'] = hard_mb * 1024 * 1024
+        options['limit_memory_soft'] = soft_mb * 1024 * 1024
+    return options
+
+
+def set_conf_options(content, options):
+    """
+    `content` (odoo.conf) con `options` en la sección [options]: reemplaza
+    las líneas 'clave = ...' existentes y agrega las que falten.
+    """
+    if not options:
+        return content
+    lines = (content or '').split('\n')
+    pending = dict(options)
+    for index, line in enumerate(lines):
+        key = line.split('=', 1)[0].strip() if '=' in line else None
+        if key in pending:
+            lines[index] = f"{key} = {pending.pop(key)}"
+    if pending:
+        if '[options]' not in (line.strip() for line in lines):
+            lines.insert(0, '[options]')
+        position = next(i for i, line in enumerate(lines) if line.strip() == '[options]') + 1
+        lines[position:position] = [f"{key} = {value}" for key, value in pending.items()]
+    return '\n'.join(lines)
+
+
+@contextmanager
+def temporary_conf(etc_dir, content, options, name='build.conf'):
+    """
+    Escribe en `etc_dir` (montada en CONTAINER_CONF_DIR) una copia de
+    `content` con `options` y entrega su ruta dentro del contenedor; el
+    archivo se borra al salir. Con ODOO_RC apuntando a ella, odoo (y el
+    entrypoint de la imagen oficial) toma esas opciones sin que aparezcan
+    en los argumentos de docker-compose.
+    """
+    path = os.path.join(etc_dir, name)
+    os.makedirs(etc_dir, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write(set_conf_options(content, options))
+    try:
+        yield f"{CONTAINER_CONF_DIR}/{name}"
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Render de las plantillas docker-compose / odoo.conf / postgres.conf.
+
+Una plantilla se compila una sola vez en una lista de segmentos literales
+y huecos ({{VARIABLE}}), cacheada por el propio texto del cuerpo (Python
+guarda el hash de cada str, así que el mismo cuerpo leído del caché del
+ORM se encuentra sin recorrerlo). El render recorre esa lista una vez y
+arma el resultado con ''.join: el costo es O(cuerpo) y no
+O(cuerpo × variables) como con un str.replace por variable.
+
+Los resultados no se memorizan: armar la clave (hash del cuerpo y de los
+valores) costaría lo mismo que el render.
+
+Los placeholders sin valor se dejan tal cual (igual que str.replace).
+No usa el ORM.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+PLACEHOLDER_RE = re.compile(r'{{[^{}]+}}')
+# Plantillas compiladas en memoria por proceso (LRU).
+MAX_COMPILED = 512
+
+
+class CompiledTemplate:
+    """Plantilla compilada: literals[i] + slots[i] + ... + literals[-1]."""
+    __slots__ = ('literals', 'slots')
+
+    def __init__(self, literals, slots):
+        self.literals = literals
+        self.slots = slots
+
+    @property
+    def placeholders(self):
+        return set(self.slots)
+
+    def render(self, values):
+        parts = []
+        append = parts.append
+        for literal, slot in zip(self.literals, self.slots):
+            append(literal)
+            append(values.get(slot, slot))
+        append(self.literals[-1])
+        return ''.join(parts)
+
+
+def content_hash(body):
+    return hashlib.sha1((body or '').encode('utf-8')).hexdigest()
+
+
+def _compile(body):
+    literals = []
+    slots = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(body):
+        literals.append(body[position:match.start()])
+        slots.append(match.group(0))
+        position = match.end()
+    literals.append(body[position:])
+    return CompiledTemplate(literals, slots)
+
+
+def compile_template(body):
+    """Plantilla compilada para `body`, desde la caché si ya se compiló."""
+    body = body or ''
+    compiled = _compiled.get(body)
+    if compiled is None:
+        compiled = _compile(body)
+        _compiled.put(body, compiled)
+    return compiled
+
+
+class LRUCache:
+    """Caché LRU acotada y segura entre hilos."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_compiled = LRUCache(MAX_COMPILED)
+
+
+def render(body, values):
+    """
+    Reemplaza cada {{VARIABLE}} de `body` por values[VARIABLE] en una sola
+    pasada.
+    """
+    if not body:
+        return body or ''
+    compiled = compile_template(body)
+    if not compiled.slots:
+        return body
+    return compiled.render(values)
+
+
+def render_variables(body, values):
+    """
+    Render con los valores de las variables de una plantilla: los
+    {{VARIABLE}} en una sola pasada y, después, las variables creadas a mano
+    con un nombre que no es {{...}} por reemplazo literal (como el
+    _get_formatted_body original).
+    """
+    result = render(body, values)
+    for name, value in values.items():
+        if name and not PLACEHOLDER_RE.fullmatch(name) and name in result:
+            result = result.replace(name, value)
+    return result
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import socket
 import logging
 
 from odoo import models, fields, api
@@ -78,75 +77,38 @@ class WizardPuertosDisponibles(models.TransientModel):
         Un puerto es 'disponible' si:
           - No está registrado como activo en micro.saas.puerto.usado
           - No está en uso por ninguna instancia activa en BD
-          - No está ocupado a nivel de SO (socket bind)
+          - No está en escucha en el host (/proc/net/tcp o puertos publicados por Docker)
           - No es reservado del Odoo maestro (8069, 8071, 8072)
+        Las reservas salen de una consulta y el estado del host de una sola
+        foto, sin abrir un socket por puerto.
         """
         self.ensure_one()
         inicio = self.puerto_inicio or _DEFAULT_PORT_START
         fin = self.puerto_fin or _DEFAULT_PORT_END
         max_res = self.max_resultados or _MAX_PUERTOS_MOSTRAR
 
-        # 1. Puertos de instancias en BD
-        instances = self.env['odoo.docker.instance'].search([])
-        ports_en_uso = set()
-        for inst in instances:
-            for pf in ('http_port', 'longpolling_port'):
-                val = getattr(inst, pf, None)
-                if val:
-                    try:
-                        ports_en_uso.add(int(val))
-                    except (ValueError, TypeError):
-                        pass
-
-        # 2. Puertos reservados en historial
-        puertos_reservados = self.env['micro.saas.puerto.usado'].search([
-            ('activo', '=', True)
-        ])
-        for p in puertos_reservados:
-            ports_en_uso.add(p.puerto)
-
-        # 3. Reservados del Odoo maestro
-        ports_en_uso.update({8069, 8071, 8072})
-
-        # 4. Borrar líneas anteriores
+        # 1. Puertos de instancias, historial activo y Odoo maestro (una consulta)
+        Instance = self.env['odoo.docker.instance']
+        ports_en_uso = Instance._get_reserved_ports(inicio, fin)
+
+        # 2. Borrar líneas anteriores
         self.puerto_ids.unlink()
 
-        # 5. Escanear
-        disponibles = []
-        escaneados = 0
-        encontrados = 0
-
-        for port in range(inicio, fin + 1):
-            escaneados += 1
-            if port in ports_en_uso:
-                continue
-
-            # Verificar a nivel SO
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(0.3)
-            try:
-                sock.bind(("0.0.0.0", port))
-                disponibles.append({
-                    'wizard_id': self.id,
-                    'puerto': port,
-                    'disponible': True,
-                    'nota': 'Libre',
-                })
-                encontrados += 1
-            except (OSError, socket.error):
-                # Puerto ocupado a nivel SO, saltar
-                pass
-            finally:
-                sock.close()
-
-            if encontrados >= max_res:
-                break
-
-        # 6. Crear líneas
-        for data in disponibles:
-            self.env['micro.saas.linea.puerto.disponible'].create(data)
-
-        # 7. Resumen HTML
+        # 3. Escanear contra la foto de puertos del host
+        snapshot = Instance._get_port_snapshot()
+        libres = snapshot.free_ports(inicio, fin, exclude=ports_en_uso, limit=max_res)
+        encontrados = len(libres)
+        escaneados = (libres[-1] - inicio + 1) if encontrados >= max_res else (fin - inicio + 1)
+
+        # 4. Crear líneas en un solo create
+        self.env['micro.saas.linea.puerto.disponible'].create([{
+            'wizard_id': self.id,
+            'puerto': port,
+            'disponible': True,
+            'nota': 'Libre',
+        } for port in libres])
+
+        # 5. Resumen HTML
         resumen_html = (
             f"<p>✅ <strong>{encontrados}</strong> puertos disponibles encontrados "
             f"(escaneados: <strong>{escaneados}</strong> del rango "
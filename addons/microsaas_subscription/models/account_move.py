@@ -95,6 +95,11 @@ class AccountMove(models.Model):
             ('factura_id', '=', self.id)
         ], limit=1)
 
+        # Si no hay, intenta tomar una instancia ya iniciada del pool de la
+        # plantilla del plan (requiere micro_saas_mejora).
+        if not instancia:
+            instancia = self._tomar_instancia_del_pool(linea_plan.product_id.product_tmpl_id)
+
         # Crea la suscripción en estado 'draft' con los datos obtenidos.
         suscripcion = self.env['microsaas.subscription'].create({
             'partner_id': self.partner_id.id,
@@ -104,6 +109,9 @@ class AccountMove(models.Model):
             'state': 'draft',
         })
 
+        # Una instancia del pool se reinicia tras el commit (ya con esta
+        # suscripción) y toma ahí los límites del plan.
+
         # Redirige al formulario de la suscripción recién creada.
         return {
             'type': 'ir.actions.act_window',
@@ -114,6 +122,22 @@ class AccountMove(models.Model):
             'target': 'current',
         }
 
+    def _tomar_instancia_del_pool(self, plan):
+        """
+        Toma una instancia precalentada del pool de la plantilla del plan y
+        la asigna al cliente y a esta factura. Retorna la instancia o un
+        recordset vacío si el plan no tiene plantilla, el pool está vacío o
+        micro_saas_mejora no está instalado.
+        """
+        Instancia = self.env['odoo.docker.instance']
+        if not plan.plantilla_instancia_id or not hasattr(Instancia, '_claim_pool_instance'):
+            return Instancia
+        return Instancia.sudo()._claim_pool_instance(plan.plantilla_instancia_id, {
+            'name': f'Instancia - {self.partner_id.name} - {self.name}',
+            'partner_id': self.partner_id.id,
+            'factura_id': self.id,
+        }).sudo(False)
+
     def action_renovar_suscripcion(self):
         """
         Renueva la suscripción existente del cliente desde esta factura.
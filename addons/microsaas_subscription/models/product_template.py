@@ -26,4 +26,39 @@ class ProductTemplate(models.Model):
     es_plan_microsaas = fields.Boolean(
         string='Es Plan MicroSaaS',
         default=False,
-    )
\ No newline at end of file
+    )
+    # Plantilla con la que se aprovisionan las instancias del plan. Con
+    # micro_saas_mejora, si la plantilla tiene pool precalentado, la
+    # instancia se toma de ahí en lugar de crearse desde cero.
+    plantilla_instancia_id = fields.Many2one(
+        'docker.compose.template',
+        string='Plantilla de Instancia',
+        help='Plantilla Docker de las instancias de este plan. Si tiene instancias '
+             'precalentadas, al crear la suscripción se asigna una ya iniciada.',
+    )
+    # Límites de recursos de las instancias del plan. micro_saas_mejora los
+    # aplica al docker-compose.yml (servicio de Odoo) y al odoo.conf de las
+    # instancias vinculadas a una suscripción. 0 = sin límite.
+    limite_cpu = fields.Float(
+        string='Límite de CPU (núcleos)',
+        digits=(4, 2),
+        default=0.0,
+        help='Núcleos de CPU que puede usar el contenedor de Odoo (ej: 1.5). 0 = sin límite.',
+    )
+    limite_memoria_mb = fields.Integer(
+        string='Límite de Memoria (MB)',
+        default=0,
+        help='Memoria máxima del contenedor de Odoo (mem_limit: tope de RSS de todos sus '
+             'procesos). limit_memory_hard/soft de odoo.conf miden memoria virtual y quedan en '
+             'los valores por defecto de Odoo (o esta memoria, si es mayor). 0 = sin límite.',
+    )
+    limite_procesos = fields.Integer(
+        string='Límite de Procesos (PIDs)',
+        default=0,
+        help='Cantidad máxima de procesos/hilos del contenedor de Odoo. 0 = sin límite.',
+    )
+    odoo_workers = fields.Integer(
+        string='Workers de Odoo',
+        default=0,
+        help='Valor de "workers" en odoo.conf. 0 = se respeta el del template.',
+    )
@@ -7,6 +7,11 @@ import logging
 
 _logger = logging.getLogger(__name__)
 
+# Estados de odoo.docker.instance en servicio. 'starting' y 'ready' los
+# agrega micro_saas_mejora (sonda HTTP tras el inicio), igual que
+# 'hibernated' (detenida por falta de uso, despierta con el primer pedido).
+ESTADOS_INSTANCIA_ACTIVA = ('starting', 'running', 'ready', 'hibernated')
+
 
 class MicrosaasSubscription(models.Model):
     """
@@ -69,6 +74,11 @@ class MicrosaasSubscription(models.Model):
         string='Estado Instancia',
         readonly=True
     )
+    instancia_lista = fields.Boolean(
+        string='Instancia Lista',
+        compute='_compute_instancia_lista',
+        help='La instancia responde y su URL se puede mostrar al cliente.'
+    )
 
 
 
@@ -117,6 +127,18 @@ class MicrosaasSubscription(models.Model):
             else:
                 rec.dias_restantes = 0
 
+    @api.depends('instancia_id.state')
+    def _compute_instancia_lista(self):
+        """
+        Con micro_saas_mejora la instancia está lista solo en 'ready' (Odoo ya
+        respondió por HTTP); sin él no hay sonda y se usa 'running'. Una
+        instancia hibernada también cuenta: despierta con el primer pedido.
+        """
+        estados = dict(self.env['odoo.docker.instance']._fields['state'].selection)
+        estado_listo = 'ready' if 'ready' in estados else 'running'
+        for rec in self:
+            rec.instancia_lista = rec.instancia_id.state in (estado_listo, 'hibernated')
+
     @api.depends('renovacion_ids')
     def _compute_renovacion_count(self):
         """
@@ -160,7 +182,7 @@ class MicrosaasSubscription(models.Model):
 
         for rec in self:
             rec.state = 'active'
-            if rec.instancia_id and rec.instancia_id.state != 'running':
+            if rec.instancia_id and rec.instancia_id.state not in ESTADOS_INSTANCIA_ACTIVA:
                 rec.instancia_id.start_instance()
             rec.message_post(body=_('Suscripción activada.'))
 
@@ -172,7 +194,7 @@ class MicrosaasSubscription(models.Model):
         """
         for rec in self:
             rec.state = 'cancelled'
-            if rec.instancia_id and rec.instancia_id.state == 'running':
+            if rec.instancia_id and rec.instancia_id.state in ESTADOS_INSTANCIA_ACTIVA:
                 rec.instancia_id.stop_instance()
             rec.message_post(body=_('Suscripción cancelada.'))
 
@@ -237,7 +259,7 @@ class MicrosaasSubscription(models.Model):
         vencidas = self.search([('state', 'in', ('active', 'expiring_soon')), ('fecha_fin', '<', today)])
         for sub in vencidas:
             sub.state = 'expired'
-            if sub.instancia_id and sub.instancia_id.state == 'running':
+            if sub.instancia_id and sub.instancia_id.state in ESTADOS_INSTANCIA_ACTIVA:
                 sub.instancia_id.stop_instance()
             sub.message_post(body=_('Suscripción vencida. Instancia detenida automáticamente.'))
 